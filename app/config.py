@@ -7,6 +7,107 @@ from dotenv import load_dotenv
 # Load environment variables from .env file if it exists
 load_dotenv()
 
+# Defaults for optional config sections; values in config.yaml override these
+DEFAULT_RATE_LIMIT_CONFIG: Dict[str, Any] = {
+    "enabled": True,
+    "rate": 10.0,
+    "burst": 20,
+    "max_keys": 10000,
+    "address_rate": 50.0,
+    "address_burst": 100,
+    "exempt_paths": ["/health", "/health/ready", "/docs", "/redoc", "/openapi.json"],
+    "routes": {},
+}
+
+DEFAULT_LOAD_SHEDDING_CONFIG: Dict[str, Any] = {
+    "enabled": True,
+    "default_timeout": 30,
+    "max_timeout": 300,
+    # Routes that may list a whole library section get the longest deadline,
+    # so a large section can be snapshotted at all
+    "routes": {
+        "/admin/profile": 0,
+        "/collections/smart": 300,
+        "/collections/evaluate": 300,
+        "/server/libraries/{key}/items": 300,
+        "/server/libraries/{key}/changes": 300,
+        "/integrity/scans": 300,
+        "/metadata/bulk-edits": 300,
+    },
+    "max_in_flight": 256,
+    "max_loop_lag_ms": 500,
+    "lag_interval_ms": 100,
+    "cache_max_entries": 1000,
+    "cache_max_body_bytes": 1048576,
+    "exempt_paths": ["/health", "/health/ready", "/docs", "/redoc", "/openapi.json"],
+}
+
+DEFAULT_HEALTH_CONFIG: Dict[str, Any] = {
+    "probe_interval_seconds": 15,
+    "probe_timeout_seconds": 2,
+    "max_loop_lag_ms": 250,
+    "max_upstream_latency_ms": 2000,
+    "max_pool_waiting": 32,
+}
+
+DEFAULT_UPSTREAM_CONFIG: Dict[str, Any] = {
+    "max_concurrency": 16,
+    "page_size": 5000,
+}
+
+DEFAULT_CHANGES_CONFIG: Dict[str, Any] = {
+    "max_log_entries": 100000,
+    "max_age_seconds": 300,
+    "max_snapshots": 64,
+    # Items held across all snapshots; least recently used snapshots are dropped beyond it
+    "max_items": 1000000,
+}
+
+DEFAULT_INTEGRITY_CONFIG: Dict[str, Any] = {
+    "path_mappings": {},
+    "stat_workers": 32,
+    "hash_workers": 0,
+    "max_in_flight": 64,
+    "max_files_per_second": 0,
+    "header_bytes": 65536,
+    "max_jobs": 20,
+}
+
+DEFAULT_SMART_COLLECTIONS_CONFIG: Dict[str, Any] = {
+    "batch_size": 500,
+}
+
+DEFAULT_BULK_EDIT_CONFIG: Dict[str, Any] = {
+    "max_batch_size": 100,
+    "initial_concurrency": 4,
+    "max_concurrency": 16,
+    "target_latency_ms": 1000,
+    "max_retries": 2,
+    "max_jobs": 20,
+}
+
+DEFAULT_HOME_CONFIG: Dict[str, Any] = {
+    "servers": {},
+    "row_size": 20,
+    "refresh_interval_seconds": 60,
+    "refresh_concurrency": 4,
+    "idle_seconds": 86400,
+    "max_users": 1000,
+}
+
+DEFAULT_RECORDING_CONFIG: Dict[str, Any] = {
+    "mode": "off",
+    "path": "recordings/plex.jsonl.gz",
+    "speed": 1.0,
+}
+
+DEFAULT_PROFILING_CONFIG: Dict[str, Any] = {
+    "server_timing": False,
+    "admin_enabled": False,
+    "max_seconds": 60,
+    "sample_interval_ms": 5,
+}
+
 class Config:
     def __init__(self, config_path: str | Path | None = None):
         # Use provided config path or default to config/config.yaml
@@ -32,6 +133,72 @@ class Config:
         # Plex client configuration
         self.plex_client_config: Dict[str, str] = config_data["plex"]["client"]
         
+        # Rate limiting configuration
+        self.rate_limit_config: Dict[str, Any] = {
+            **DEFAULT_RATE_LIMIT_CONFIG,
+            **(config_data.get("rate_limit") or {})
+        }
+        
+        # Deadline and load shedding configuration
+        self.load_shedding_config: Dict[str, Any] = {
+            **DEFAULT_LOAD_SHEDDING_CONFIG,
+            **(config_data.get("load_shedding") or {})
+        }
+        
+        # Readiness check configuration
+        self.health_config: Dict[str, Any] = {
+            **DEFAULT_HEALTH_CONFIG,
+            **(config_data.get("health") or {})
+        }
+        
+        # Upstream (Plex) request configuration
+        self.upstream_config: Dict[str, Any] = {
+            **DEFAULT_UPSTREAM_CONFIG,
+            **(config_data.get("upstream") or {})
+        }
+        
+        # Library change feed configuration
+        self.changes_config: Dict[str, Any] = {
+            **DEFAULT_CHANGES_CONFIG,
+            **(config_data.get("changes") or {})
+        }
+        
+        # Media file integrity scan configuration
+        self.integrity_config: Dict[str, Any] = {
+            **DEFAULT_INTEGRITY_CONFIG,
+            **(config_data.get("integrity") or {})
+        }
+        
+        # Smart collection builder configuration
+        self.smart_collections_config: Dict[str, Any] = {
+            **DEFAULT_SMART_COLLECTIONS_CONFIG,
+            **(config_data.get("smart_collections") or {})
+        }
+        
+        # Bulk metadata edit configuration
+        self.bulk_edit_config: Dict[str, Any] = {
+            **DEFAULT_BULK_EDIT_CONFIG,
+            **(config_data.get("bulk_edit") or {})
+        }
+        
+        # Home screen rows configuration
+        self.home_config: Dict[str, Any] = {
+            **DEFAULT_HOME_CONFIG,
+            **(config_data.get("home") or {})
+        }
+        
+        # Upstream traffic recording and replay configuration
+        self.recording_config: Dict[str, Any] = {
+            **DEFAULT_RECORDING_CONFIG,
+            **(config_data.get("recording") or {})
+        }
+        
+        # Profiling and timing instrumentation configuration
+        self.profiling_config: Dict[str, Any] = {
+            **DEFAULT_PROFILING_CONFIG,
+            **(config_data.get("profiling") or {})
+        }
+        
         # Logging configuration
         self.logging_config: Dict[str, Any] = config_data["logging"].copy()
         # Override log level from environment if set
@@ -42,5 +209,5 @@ class Config:
         log_dir = Path(self.logging_config["file_path"]).parent
         log_dir.mkdir(parents=True, exist_ok=True)
 
-# Create default config instance
-config = Config() 
\ No newline at end of file
+# Create default config instance, honouring the same override as the routers
+config = Config(os.getenv("PLEX_MANAGER_CONFIG")) 
\ No newline at end of file
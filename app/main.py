@@ -1,18 +1,44 @@
 import os
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.security import APIKeyHeader
+from contextlib import asynccontextmanager
+from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-import httpx
-from .models import ServerInfo
+from fastapi.responses import JSONResponse
+from .models import ReadinessReport
 from .config import Config
-from .routers import server
+from .routers import admin, collections, home, integrity, metadata, server
 from .logging import setup_logger
+from .middleware.load_shedding import LoadShedder, LoadSheddingMiddleware, ResponseCache
+from .middleware.rate_limit import RateLimiter, RateLimitMiddleware
+from .services.bulk_edit import bulk_editor
+from .services.change_feed import change_feed
+from .services.health import ReadinessCheck, upstream_probe
+from .services.home import home_rows
+from .services.integrity import integrity_scanner
+from .services.loop_monitor import loop_monitor
+from .services.plex import plex_service
+from .services.profiling import ServerTimingMiddleware
 
 # Set up logger for the main application
 logger = setup_logger(__name__)
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start and stop background services with the application"""
+    loop_monitor.start()
+    upstream_probe.start()
+    home_rows.start()
+    yield
+    await home_rows.stop()
+    await upstream_probe.stop()
+    await loop_monitor.stop()
+    integrity_scanner.shutdown()
+    bulk_editor.shutdown()
+    if plex_service.transport is not None:
+        await plex_service.transport.close()
+
 # Initialize FastAPI app
 app = FastAPI(
+    lifespan=lifespan,
     title="Clebarr",
     description="A FastAPI-based Plex Media Server management application",
     version="1.0.0",
@@ -20,6 +46,47 @@ app = FastAPI(
     redoc_url="/redoc",
 )
 
+# Initialize config with optional path from environment
+config_path = os.getenv("PLEX_MANAGER_CONFIG")
+config = Config(config_path)
+
+# Give requests deadlines and shed load when overloaded
+load_shedder = LoadShedder.from_config(config.load_shedding_config, loop_monitor)
+response_cache = ResponseCache(
+    max_entries=config.load_shedding_config["cache_max_entries"],
+    max_body_bytes=config.load_shedding_config["cache_max_body_bytes"],
+)
+if config.load_shedding_config["enabled"]:
+    app.add_middleware(
+        LoadSheddingMiddleware,
+        shedder=load_shedder,
+        cache=response_cache,
+        exempt_paths=config.load_shedding_config["exempt_paths"],
+    )
+
+# Readiness is assembled from the state the services above maintain
+readiness_check = ReadinessCheck(
+    loop_monitor,
+    upstream_probe,
+    plex_service,
+    change_feed,
+    config.health_config,
+    shedder=load_shedder if config.load_shedding_config["enabled"] else None,
+    response_cache=response_cache if config.load_shedding_config["enabled"] else None,
+)
+
+# Configure per-token, per-route admission control
+if config.rate_limit_config["enabled"]:
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=RateLimiter.from_config(config.rate_limit_config),
+        exempt_paths=config.rate_limit_config["exempt_paths"],
+    )
+
+# Report per-phase request timings in a Server-Timing header
+if config.profiling_config["server_timing"]:
+    app.add_middleware(ServerTimingMiddleware)
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -29,25 +96,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize config with optional path from environment
-config_path = os.getenv("PLEX_MANAGER_CONFIG")
-config = Config(config_path)
-
-# Define the X-Plex-Token header scheme
-plex_token_header = APIKeyHeader(name="X-Plex-Token", auto_error=False)
-
-async def verify_token(token: str = Depends(plex_token_header)):
-    """Dependency to verify the Plex token"""
-    if not token:
-        logger.warning("Request received without X-Plex-Token header")
-        raise HTTPException(
-            status_code=401,
-            detail="X-Plex-Token header is required"
-        )
-    return token
-
 # Include routers
 app.include_router(server.router)
+app.include_router(admin.router)
+app.include_router(integrity.router)
+app.include_router(collections.router)
+app.include_router(home.router)
+app.include_router(metadata.router)
 
 @app.get("/health")
 async def health_check():
@@ -55,64 +110,19 @@ async def health_check():
     logger.debug("Health check requested")
     return {"status": "healthy"}
 
-@app.get("/server/info", response_model=ServerInfo)
-async def get_server_info(token: str = Depends(verify_token)):
+@app.get("/health/ready", response_model=ReadinessReport, responses={503: {"model": ReadinessReport}})
+async def readiness():
     """
-    Get Plex server information using the provided token.
-    This verifies the token is valid and returns basic server information.
-    """
-    logger.info("Fetching server information")
-    headers = {
-        "X-Plex-Token": token,
-        "X-Plex-Client-Identifier": config.plex_client_config["identifier"],
-        "X-Plex-Product": config.plex_client_config["product"],
-        "X-Plex-Version": config.plex_client_config["version"],
-        "X-Plex-Device": config.plex_client_config["device"],
-        "X-Plex-Device-Name": config.plex_client_config["device_name"],
-        "Accept": "application/json"
-    }
+    Readiness check for load balancers. Reports event loop lag, the cached
+    result of the background Plex probe, upstream pool saturation and cache
+    warmth. Returns 503 when the worker is degraded.
     
-    try:
-        async with httpx.AsyncClient() as client:
-            logger.debug(f"Making request to {config.plex_base_url}/identity")
-            response = await client.get(
-                f"{config.plex_base_url}/identity",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                data = response.json()["MediaContainer"]
-                logger.info("Successfully retrieved server information")
-                return ServerInfo(
-                    machine_identifier=data["machineIdentifier"],
-                    version=data["version"],
-                    claimed=data["claimed"],
-                    server_url=config.plex_base_url
-                )
-            elif response.status_code == 401:
-                logger.error("Invalid Plex token provided")
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid Plex token"
-                )
-            else:
-                logger.error(f"Failed to get server info. Status code: {response.status_code}")
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail="Failed to connect to Plex server"
-                )
-                
-    except httpx.RequestError as e:
-        logger.error(f"Request error while fetching server info: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to connect to Plex server: {str(e)}"
-        )
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error while fetching server info: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Failed to connect to Plex server"
-        ) 
\ No newline at end of file
+    The report is built from in-memory state, so checks never call Plex.
+    """
+    report = readiness_check.report()
+    if report.status != "ready":
+        logger.warning(f"Readiness degraded: {'; '.join(report.reasons)}")
+    return JSONResponse(
+        status_code=200 if report.status == "ready" else 503,
+        content=report.model_dump()
+    )
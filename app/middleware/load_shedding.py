@@ -0,0 +1,285 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from ..logging import setup_logger
+from ..services import deadlines
+from ..services.loop_monitor import LoopLagMonitor
+from .rate_limit import hash_token, resolve_route
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+
+class CachedResponse:
+    """A complete response kept to be served while shedding load"""
+    __slots__ = ("status", "headers", "body", "stored_at")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes, stored_at: float):
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.stored_at = stored_at
+
+    async def send_stale(self, send: Send, now: float):
+        """Send the cached response, marked as stale"""
+        headers = [
+            *self.headers,
+            (b"age", str(int(now - self.stored_at)).encode()),
+            (b"warning", b'110 - "Response is Stale"'),
+        ]
+        await send({"type": "http.response.start", "status": self.status, "headers": headers})
+        await send({"type": "http.response.body", "body": self.body})
+
+
+class ResponseCache:
+    """
+    LRU cache of recent successful JSON GET responses, keyed by hashed
+    token, path and query string. Bounded by entry count and body size.
+    """
+
+    def __init__(self, max_entries: int, max_body_bytes: int):
+        self.max_entries = max_entries
+        self.max_body_bytes = max_body_bytes
+        self._entries: "OrderedDict[Tuple[str, str, bytes], CachedResponse]" = OrderedDict()
+
+    def get(self, key: Tuple[str, str, bytes]) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: Tuple[str, str, bytes], response: CachedResponse):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = response
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class LoadShedder:
+    """
+    Admission policy for requests: the deadline each request gets, and
+    whether the service is too overloaded (too many requests in flight, or
+    too much event-loop lag) to take on more work.
+    """
+
+    def __init__(self, default_timeout: float, max_timeout: float, routes: Dict[str, float],
+                 max_in_flight: int, max_loop_lag_ms: float, monitor: LoopLagMonitor):
+        self.default_timeout = float(default_timeout)
+        self.max_timeout = float(max_timeout)
+        self.routes = routes or {}
+        self.max_in_flight = max_in_flight
+        self.max_loop_lag = max_loop_lag_ms / 1000
+        self.monitor = monitor
+        self.in_flight = 0
+        self.shed_count = 0
+
+    @classmethod
+    def from_config(cls, load_shedding_config: Dict[str, Any], monitor: LoopLagMonitor) -> "LoadShedder":
+        """Build a shedder from the `load_shedding` section of config.yaml"""
+        return cls(
+            default_timeout=load_shedding_config["default_timeout"],
+            max_timeout=load_shedding_config["max_timeout"],
+            routes=load_shedding_config.get("routes") or {},
+            max_in_flight=load_shedding_config["max_in_flight"],
+            max_loop_lag_ms=load_shedding_config["max_loop_lag_ms"],
+            monitor=monitor,
+        )
+
+    def timeout_for(self, route: str, requested: Optional[str] = None) -> Optional[float]:
+        """
+        Get the timeout in seconds for a request: the X-Request-Timeout value
+        if valid (capped at `max_timeout`), otherwise the route default.
+        Returns None when the request has no deadline.
+        """
+        if requested is not None:
+            try:
+                timeout = float(requested)
+                if timeout > 0:
+                    return min(timeout, self.max_timeout)
+            except ValueError:
+                logger.debug(f"Ignoring invalid X-Request-Timeout: {requested}")
+        timeout = float(self.routes.get(route, self.default_timeout))
+        return timeout if timeout > 0 else None
+
+    def overload_reason(self) -> Optional[str]:
+        """Describe why new work should be shed, or None if it can be admitted"""
+        if self.max_in_flight and self.in_flight >= self.max_in_flight:
+            return f"{self.in_flight} requests in flight"
+        if self.max_loop_lag and self.monitor.lag >= self.max_loop_lag:
+            return f"event loop lag {self.monitor.lag * 1000:.0f}ms"
+        return None
+
+
+class LoadSheddingMiddleware:
+    """
+    ASGI middleware that gives each request a deadline, cancels its work
+    when the deadline passes or the client disconnects, and sheds load
+    under overload. Shed or timed-out GET requests are answered from the
+    cache of recent responses when possible, and otherwise with 503/504.
+    """
+
+    def __init__(self, app: ASGIApp, shedder: LoadShedder, cache: ResponseCache,
+                 exempt_paths: Optional[list] = None):
+        self.app = app
+        self.shedder = shedder
+        self.cache = cache
+        self.exempt_paths = frozenset(exempt_paths or ())
+
+    def cache_key(self, scope: Scope, token: Optional[str]) -> Optional[Tuple[str, str, bytes]]:
+        if scope["method"] != "GET":
+            return None
+        return (hash_token(token) if token else "", scope["path"], scope.get("query_string", b""))
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        headers = {
+            name: value.decode("latin-1") for name, value in scope.get("headers", ())
+            if name in (b"x-plex-token", b"x-request-timeout")
+        }
+        cache_key = self.cache_key(scope, headers.get(b"x-plex-token"))
+
+        reason = self.shedder.overload_reason()
+        if reason:
+            self.shedder.shed_count += 1
+            logger.warning(f"Shedding {scope['method']} {scope['path']}: {reason}")
+            cached = self.cache.get(cache_key) if cache_key else None
+            if cached is not None:
+                await cached.send_stale(send, time.time())
+                return
+            response = JSONResponse(
+                status_code=503,
+                content={"detail": "Server overloaded"},
+                headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+
+        timeout = self.shedder.timeout_for(resolve_route(scope), headers.get(b"x-request-timeout"))
+        deadline = time.monotonic() + timeout if timeout is not None else None
+        reset_token = deadlines.set_deadline(deadline)
+        self.shedder.in_flight += 1
+        try:
+            await RequestExchange(self, scope, receive, send, cache_key).run(deadline)
+        finally:
+            self.shedder.in_flight -= 1
+            deadlines.reset_deadline(reset_token)
+
+
+class RequestExchange:
+    """
+    A single request running under LoadSheddingMiddleware. The application
+    runs in its own task so it can be cancelled on deadline or disconnect.
+    """
+
+    def __init__(self, middleware: LoadSheddingMiddleware, scope: Scope, receive: Receive,
+                 send: Send, cache_key: Optional[Tuple[str, str, bytes]]):
+        self.middleware = middleware
+        self.scope = scope
+        self.receive = receive
+        self.send = send
+        self.cache_key = cache_key
+        self.inbox: asyncio.Queue = asyncio.Queue()
+        self.started = False
+        self.complete = False
+        self.replaced = False
+        self.capture: Optional[CachedResponse] = None
+        self.chunks: List[bytes] = []
+        self.size = 0
+
+    async def listen(self):
+        """Forward client messages to the application until the client disconnects"""
+        while True:
+            message = await self.receive()
+            self.inbox.put_nowait(message)
+            if message["type"] == "http.disconnect":
+                return
+
+    async def send_wrapper(self, message: Message):
+        cache = self.middleware.cache
+        if message["type"] == "http.response.start":
+            status = message["status"]
+            if status == 504 and self.cache_key is not None:
+                cached = cache.get(self.cache_key)
+                if cached is not None:
+                    logger.warning(f"Deadline exceeded for {self.scope['path']}; serving stale response")
+                    self.replaced = self.started = self.complete = True
+                    await cached.send_stale(self.send, time.time())
+                    return
+            self.started = True
+            content_type = next(
+                (value for name, value in message.get("headers", ()) if name == b"content-type"), b""
+            )
+            if self.cache_key is not None and status == 200 and content_type.startswith(b"application/json"):
+                self.capture = CachedResponse(status, list(message.get("headers", ())), b"", 0.0)
+        elif message["type"] == "http.response.body":
+            if self.replaced:
+                return
+            if self.capture is not None:
+                body = message.get("body", b"")
+                self.size += len(body)
+                if self.size > cache.max_body_bytes:
+                    self.capture = None
+                    self.chunks = []
+                else:
+                    self.chunks.append(body)
+            if not message.get("more_body", False):
+                self.complete = True
+                if self.capture is not None:
+                    self.capture.body = b"".join(self.chunks)
+                    self.capture.stored_at = time.time()
+                    cache.put(self.cache_key, self.capture)
+        await self.send(message)
+
+    async def run(self, deadline: Optional[float]):
+        app_task = asyncio.ensure_future(self.middleware.app(self.scope, self.inbox.get, self.send_wrapper))
+        listener = asyncio.ensure_future(self.listen())
+        try:
+            waiting = {app_task, listener}
+            while not app_task.done():
+                timeout = None
+                if deadline is not None and not self.started:
+                    timeout = max(0.0, deadline - time.monotonic())
+                done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if listener in done:
+                    waiting.discard(listener)
+                    if not self.complete and not app_task.done():
+                        logger.info(f"Client disconnected; cancelling {self.scope['method']} {self.scope['path']}")
+                        await self.cancel(app_task)
+                        return
+                elif not done and not self.started:
+                    logger.warning(f"Deadline exceeded for {self.scope['method']} {self.scope['path']}")
+                    await self.cancel(app_task)
+                    response = JSONResponse(
+                        status_code=504,
+                        content={"detail": "Request deadline exceeded"}
+                    )
+                    await response(self.scope, self.inbox.get, self.send_wrapper)
+                    return
+
+            app_task.result()
+        finally:
+            for task in (app_task, listener):
+                if not task.done():
+                    task.cancel()
+
+    @staticmethod
+    async def cancel(task: asyncio.Task):
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,232 @@
+import hashlib
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi.responses import JSONResponse
+from starlette.routing import Match
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from ..logging import setup_logger
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+
+class TokenBucket:
+    """
+    A single token bucket. Tokens refill continuously at `rate` per second
+    up to `burst`; each admitted request consumes one token.
+    """
+    __slots__ = ("tokens", "updated_at")
+
+    def __init__(self, burst: float, now: float):
+        self.tokens = float(burst)
+        self.updated_at = now
+
+    def take(self, rate: float, burst: float, now: float) -> float:
+        """
+        Try to consume a token.
+
+        Returns:
+            float: 0.0 if the request is admitted, otherwise the number of
+            seconds until a token will be available.
+        """
+        elapsed = now - self.updated_at
+        if elapsed > 0:
+            self.tokens = min(burst, self.tokens + elapsed * rate)
+            self.updated_at = now
+
+        if self.tokens >= 1.0:
+            self.tokens -= 1.0
+            return 0.0
+        return (1.0 - self.tokens) / rate
+
+
+class RateLimiter:
+    """
+    Token-bucket rate limiter keyed by (client key, route), plus an optional
+    bucket per client address that every request also draws from.
+
+    The address bucket stops a client from escaping its limits by sending a
+    new token on every request, and caps how fast one address can create
+    new buckets. Since a bucket left idle for burst/rate seconds is full
+    again anyway, that keeps such churn from resetting the buckets of
+    clients that are actually active.
+
+    Bucket state lives in LRU-ordered dicts capped at `max_keys`, so both
+    the per-request cost and the memory footprint are bounded.
+    """
+
+    def __init__(self, rate: float, burst: float, max_keys: int,
+                 routes: Optional[Dict[str, Dict[str, float]]] = None,
+                 address_rate: float = 0, address_burst: float = 0):
+        if rate <= 0 or burst < 1:
+            raise ValueError("Rate limit rate must be positive and burst at least 1")
+        if address_rate and (address_rate < 0 or address_burst < 1):
+            raise ValueError("Address rate limit rate must be positive and burst at least 1")
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.max_keys = max_keys
+        self.routes = routes or {}
+        self.address_rate = float(address_rate)
+        self.address_burst = float(address_burst)
+        self._buckets: "OrderedDict[Tuple[str, str], TokenBucket]" = OrderedDict()
+        self._address_buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    @classmethod
+    def from_config(cls, rate_limit_config: Dict[str, Any]) -> "RateLimiter":
+        """Build a limiter from the `rate_limit` section of config.yaml"""
+        return cls(
+            rate=rate_limit_config["rate"],
+            burst=rate_limit_config["burst"],
+            max_keys=rate_limit_config["max_keys"],
+            routes=rate_limit_config.get("routes") or {},
+            address_rate=rate_limit_config["address_rate"],
+            address_burst=rate_limit_config["address_burst"],
+        )
+
+    def limits_for(self, route: str) -> Tuple[float, float]:
+        """Get the (rate, burst) pair for a route, falling back to the defaults"""
+        limits = self.routes.get(route)
+        if not limits:
+            return self.rate, self.burst
+        return float(limits.get("rate", self.rate)), float(limits.get("burst", self.burst))
+
+    def acquire(self, client_key: str, route: str, now: Optional[float] = None) -> float:
+        """
+        Consume a token for the given client and route.
+
+        Returns:
+            float: 0.0 if admitted, otherwise seconds to wait before retrying.
+        """
+        now = time.monotonic() if now is None else now
+        rate, burst = self.limits_for(route)
+        return self._take(self._buckets, (client_key, route), rate, burst, now)
+
+    def acquire_address(self, address: str, now: Optional[float] = None) -> float:
+        """
+        Consume a token from a client address's bucket, shared by all of its
+        requests whatever token they send. Always admits when disabled.
+
+        Returns:
+            float: 0.0 if admitted, otherwise seconds to wait before retrying.
+        """
+        if not self.address_rate:
+            return 0.0
+        now = time.monotonic() if now is None else now
+        return self._take(self._address_buckets, address, self.address_rate, self.address_burst, now)
+
+    def _take(self, buckets: OrderedDict, key: Any, rate: float, burst: float, now: float) -> float:
+        bucket = buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(burst, now)
+            buckets[key] = bucket
+            if len(buckets) > self.max_keys:
+                buckets.popitem(last=False)
+        else:
+            buckets.move_to_end(key)
+
+        return bucket.take(rate, burst, now)
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+def hash_token(token: str) -> str:
+    """Hash a Plex token so raw credentials are never kept as limiter keys"""
+    return hashlib.blake2b(token.encode(), digest_size=12).hexdigest()
+
+
+# Route key shared by every request that matches no route, so random
+# paths can't each claim a bucket of their own
+UNMATCHED_ROUTE = "<unmatched>"
+
+# Scope key the resolved route is stored under, for later middleware
+ROUTE_SCOPE_KEY = "clebarr.route"
+
+# Resolved routes cached per app, keyed by (method, path)
+ROUTE_CACHE_SIZE = 4096
+
+
+def resolve_route(scope: Scope) -> str:
+    """
+    Resolve the route template (e.g. /server/libraries/{key}) for a request.
+
+    The result is stored in the scope, and cached per method and path, so
+    route matching runs at most once per distinct request path.
+    """
+    route = scope.get(ROUTE_SCOPE_KEY)
+    if route is not None:
+        return route
+
+    app = scope.get("app")
+    router = getattr(app, "router", None)
+    if router is None:
+        route = UNMATCHED_ROUTE
+    else:
+        cache = getattr(app.state, "route_cache", None)
+        if cache is None:
+            cache = app.state.route_cache = OrderedDict()
+        key = (scope.get("method", ""), scope["path"])
+        route = cache.get(key)
+        if route is None:
+            route = next(
+                (getattr(candidate, "path", UNMATCHED_ROUTE) for candidate in router.routes
+                 if candidate.matches(scope)[0] == Match.FULL),
+                UNMATCHED_ROUTE
+            )
+            cache[key] = route
+            if len(cache) > ROUTE_CACHE_SIZE:
+                cache.popitem(last=False)
+        else:
+            cache.move_to_end(key)
+    scope[ROUTE_SCOPE_KEY] = route
+    return route
+
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying token-bucket admission control per X-Plex-Token
+    and route. Rejected requests get a 429 with a Retry-After header.
+    """
+
+    def __init__(self, app: ASGIApp, limiter: RateLimiter, exempt_paths: Optional[list] = None):
+        self.app = app
+        self.limiter = limiter
+        self.exempt_paths = frozenset(exempt_paths or ())
+
+    @staticmethod
+    def client_address(scope: Scope) -> str:
+        client = scope.get("client")
+        return client[0] if client else "unknown"
+
+    def client_key(self, scope: Scope) -> str:
+        """Key requests by hashed token, or by client address when no token is sent"""
+        for name, value in scope.get("headers", ()):
+            if name == b"x-plex-token":
+                return hash_token(value.decode("latin-1"))
+        return f"anonymous:{self.client_address(scope)}"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["path"] in self.exempt_paths:
+            await self.app(scope, receive, send)
+            return
+
+        route = resolve_route(scope)
+        retry_after = (
+            self.limiter.acquire_address(self.client_address(scope))
+            or self.limiter.acquire(self.client_key(scope), route)
+        )
+        if retry_after:
+            logger.warning(f"Rate limit exceeded for route {route}")
+            response = JSONResponse(
+                status_code=429,
+                content={"detail": "Rate limit exceeded"},
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        await self.app(scope, receive, send)
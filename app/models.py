@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field, field_validator
-from typing import Optional, Union, List
+from typing import Any, Dict, Literal, Optional, Union, List
 
 class PlexCredentials(BaseModel):
     username: str
@@ -129,4 +129,437 @@ class Library(BaseModel):
                 "scanned_at": "2024-03-20T12:00:00Z"
             }
         }
-    } 
\ No newline at end of file
+    } 
+
+class MediaPart(BaseModel):
+    """
+    Represents a file backing a Plex media item.
+    """
+    file: str = Field(
+        ...,
+        description="Path of the file on the Plex server"
+    )
+    size: Optional[int] = Field(
+        None,
+        description="File size in bytes as last seen by Plex"
+    )
+
+class MediaItem(BaseModel):
+    """
+    Represents an item (movie, show, episode, track...) in a Plex library.
+    """
+    rating_key: str = Field(
+        ...,
+        description="Unique key for the item on the Plex server"
+    )
+    title: str = Field(
+        ...,
+        description="Display title of the item"
+    )
+    type: str = Field(
+        ...,
+        description="Type of item (e.g., 'movie', 'show', 'episode')"
+    )
+    title_sort: Optional[str] = Field(
+        None,
+        description="Title used for sorting"
+    )
+    library_section_id: Optional[str] = Field(
+        None,
+        description="Key of the library the item belongs to"
+    )
+    year: Optional[int] = Field(
+        None,
+        description="Release year"
+    )
+    rating: Optional[float] = Field(
+        None,
+        description="Critic rating"
+    )
+    audience_rating: Optional[float] = Field(
+        None,
+        description="Audience rating"
+    )
+    content_rating: Optional[str] = Field(
+        None,
+        description="Content rating (e.g., 'PG-13')"
+    )
+    view_count: int = Field(
+        0,
+        description="Number of times the item has been watched"
+    )
+    duration: Optional[int] = Field(
+        None,
+        description="Duration in milliseconds"
+    )
+    added_at: Optional[int] = Field(
+        None,
+        description="Unix timestamp when the item was added"
+    )
+    updated_at: Optional[int] = Field(
+        None,
+        description="Unix timestamp of the last metadata update"
+    )
+    video_resolution: Optional[str] = Field(
+        None,
+        description="Video resolution of the primary media (e.g., '1080', '4k')"
+    )
+    video_codec: Optional[str] = Field(
+        None,
+        description="Video codec of the primary media"
+    )
+    audio_codec: Optional[str] = Field(
+        None,
+        description="Audio codec of the primary media"
+    )
+    genres: List[str] = Field(
+        default_factory=list,
+        description="Genre tags"
+    )
+    parts: List[MediaPart] = Field(
+        default_factory=list,
+        description="Files backing the item"
+    )
+
+    @field_validator('rating_key', 'title', 'type')
+    @classmethod
+    def validate_not_empty(cls, v):
+        if not v.strip():
+            raise ValueError('Field cannot be empty')
+        return v
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "rating_key": "1234",
+                "title": "Inception",
+                "type": "movie",
+                "title_sort": "Inception",
+                "library_section_id": "1",
+                "year": 2010,
+                "rating": 8.7,
+                "audience_rating": 9.1,
+                "content_rating": "PG-13",
+                "view_count": 2,
+                "duration": 8880000,
+                "added_at": 1710936000,
+                "updated_at": 1710936000,
+                "video_resolution": "1080",
+                "video_codec": "h264",
+                "audio_codec": "aac",
+                "genres": ["Action", "Science Fiction"],
+                "parts": [{"file": "/data/movies/Inception (2010).mkv", "size": 4294967296}]
+            }
+        }
+    }
+
+class IntegrityScanRequest(BaseModel):
+    """
+    Request to check the files of a library on local storage.
+    """
+    library_key: str = Field(
+        ...,
+        description="Key of the library to scan"
+    )
+    validate_headers: bool = Field(
+        False,
+        description="Also read and validate each file's container header"
+    )
+
+    @field_validator('library_key')
+    @classmethod
+    def validate_not_empty(cls, v):
+        if not v.strip():
+            raise ValueError('Field cannot be empty')
+        return v
+
+class FileCheckResult(BaseModel):
+    """
+    Result of checking a single media file.
+    """
+    rating_key: str = Field(..., description="Item the file belongs to")
+    file: str = Field(..., description="Path of the file on the Plex server")
+    local_path: str = Field(..., description="Path that was checked locally")
+    status: str = Field(
+        ...,
+        description="One of 'ok', 'missing', 'empty', 'truncated', 'unreadable', 'invalid_header'"
+    )
+    expected_size: Optional[int] = Field(None, description="Size reported by Plex")
+    actual_size: Optional[int] = Field(None, description="Size found on disk")
+    detail: Optional[str] = Field(None, description="Partial hash or error description")
+
+class IntegrityScanSummary(BaseModel):
+    """
+    Progress and outcome counts of an integrity scan.
+    """
+    id: str = Field(..., description="Scan identifier")
+    library_key: str = Field(..., description="Key of the scanned library")
+    status: str = Field(..., description="One of 'running', 'completed', 'cancelled', 'failed'")
+    validate_headers: bool = Field(..., description="Whether headers are validated")
+    total: int = Field(..., description="Number of files to check")
+    checked: int = Field(..., description="Number of files checked so far")
+    counts: Dict[str, int] = Field(default_factory=dict, description="Files checked per status")
+    started_at: float = Field(..., description="Unix timestamp when the scan started")
+    finished_at: Optional[float] = Field(None, description="Unix timestamp when the scan ended")
+    error: Optional[str] = Field(None, description="Error that stopped the scan")
+
+class IntegrityScanReport(IntegrityScanSummary):
+    """
+    An integrity scan with a page of its file results.
+    """
+    results: List[FileCheckResult] = Field(default_factory=list, description="Matching file results")
+
+class SmartRuleRequest(BaseModel):
+    """
+    A rule evaluated against the local index of one or more libraries.
+    """
+    libraries: List[str] = Field(
+        ...,
+        min_length=1,
+        description="Keys of the libraries to search"
+    )
+    rule: Dict[str, Any] = Field(
+        ...,
+        description="Rule tree built from {'all': [...]}, {'any': [...]}, {'not': rule} "
+                    "and {'field': ..., 'op': ..., 'value': ...} conditions"
+    )
+    sort: Optional[str] = Field(
+        None,
+        description="Numeric field to sort by, optionally suffixed with ':asc' or ':desc'"
+    )
+    limit: Optional[int] = Field(
+        None,
+        ge=1,
+        description="Maximum number of items to return"
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "libraries": ["1"],
+                "rule": {
+                    "all": [
+                        {"field": "video_resolution", "op": "eq", "value": "4k"},
+                        {"field": "added_at", "op": "gte", "value": "-30d"},
+                        {"field": "view_count", "op": "eq", "value": 0},
+                        {"field": "audience_rating", "op": "gt", "value": 7}
+                    ]
+                },
+                "sort": "added_at:desc",
+                "limit": 100
+            }
+        }
+    }
+
+class SmartRuleResult(BaseModel):
+    """
+    Items matching a smart rule.
+    """
+    count: int = Field(..., description="Number of matching items")
+    rating_keys: List[str] = Field(..., description="Rating keys of the matching items, in order")
+    evaluation_ms: float = Field(..., description="Time spent evaluating the rule against the index")
+
+class SmartCollectionRequest(SmartRuleRequest):
+    """
+    A smart rule whose matches are pushed to Plex as a collection or playlist.
+    """
+    target: Literal["collection", "playlist"] = Field(
+        "collection",
+        description="Create a collection (one per library) or a single playlist"
+    )
+    title: str = Field(
+        ...,
+        description="Title of the collection or playlist"
+    )
+
+    @field_validator('title')
+    @classmethod
+    def validate_not_empty(cls, v):
+        if not v.strip():
+            raise ValueError('Field cannot be empty')
+        return v
+
+class PlexCollectionRef(BaseModel):
+    """
+    A collection or playlist created on the Plex server.
+    """
+    library_key: Optional[str] = Field(None, description="Library of the collection; None for playlists")
+    rating_key: str = Field(..., description="Rating key of the created collection or playlist")
+    item_count: int = Field(..., description="Number of items added")
+
+class SmartCollectionResult(BaseModel):
+    """
+    Outcome of pushing a smart rule to Plex.
+    """
+    target: str = Field(..., description="'collection' or 'playlist'")
+    title: str = Field(..., description="Title of the collection or playlist")
+    count: int = Field(..., description="Number of matching items")
+    evaluation_ms: float = Field(..., description="Time spent evaluating the rule against the index")
+    created: List[PlexCollectionRef] = Field(..., description="Collections or playlists created on Plex")
+
+class LoopHealth(BaseModel):
+    """
+    Event loop responsiveness.
+    """
+    lag_ms: float = Field(..., description="Most recent event loop lag")
+    max_lag_ms: float = Field(..., description="Largest event loop lag since startup")
+    sampling: bool = Field(..., description="Whether the lag sampler is running")
+
+class UpstreamHealth(BaseModel):
+    """
+    Result of the most recent background probe of the Plex server.
+    """
+    reachable: Optional[bool] = Field(None, description="None until the first probe completes")
+    latency_ms: Optional[float] = Field(None, description="Round-trip time of the last probe")
+    checked_at: Optional[float] = Field(None, description="Unix time of the last probe")
+    stale: bool = Field(False, description="Whether the last probe is older than expected")
+    error: Optional[str] = Field(None, description="Why the last probe failed")
+
+class PoolHealth(BaseModel):
+    """
+    Saturation of the upstream request pool and of request admission.
+    """
+    max_concurrency: int = Field(..., description="Upstream slots available")
+    in_use: int = Field(..., description="Upstream slots in use")
+    waiting: int = Field(..., description="Requests waiting for an upstream slot")
+    in_flight: Optional[int] = Field(None, description="Requests in progress; None when load shedding is disabled")
+    max_in_flight: Optional[int] = Field(None, description="Requests in progress before load is shed")
+    shed: Optional[int] = Field(None, description="Requests shed since startup")
+
+class CacheHealth(BaseModel):
+    """
+    How much cached state the worker holds.
+    """
+    library_snapshots: int = Field(..., description="Libraries with a loaded snapshot")
+    response_cache_entries: Optional[int] = Field(None, description="Responses cached for load shedding")
+    response_cache_max_entries: Optional[int] = Field(None, description="Capacity of the response cache")
+
+class ReadinessReport(BaseModel):
+    """
+    Detailed readiness of this worker to take traffic.
+    """
+    status: Literal["ready", "degraded"] = Field(..., description="'degraded' is returned with a 503")
+    reasons: List[str] = Field(..., description="Why the worker is degraded")
+    loop: LoopHealth
+    upstream: UpstreamHealth
+    pool: PoolHealth
+    cache: CacheHealth
+
+class HomeItem(MediaItem):
+    """
+    An item in a home screen row, with the per-user playback state needed
+    to render "continue watching".
+    """
+    view_offset: Optional[int] = Field(
+        None,
+        description="Playback position in milliseconds for the user"
+    )
+    grandparent_title: Optional[str] = Field(
+        None,
+        description="Show title, for episodes"
+    )
+    parent_index: Optional[int] = Field(
+        None,
+        description="Season number, for episodes"
+    )
+    index: Optional[int] = Field(
+        None,
+        description="Episode number, for episodes"
+    )
+    thumb: Optional[str] = Field(
+        None,
+        description="Path of the item's artwork on the Plex server"
+    )
+
+class HomeServerRows(BaseModel):
+    """
+    Home screen rows for one user on one Plex server.
+    """
+    server: str = Field(..., description="Name of the Plex server")
+    on_deck: List[HomeItem] = Field(default_factory=list, description="Items to continue watching")
+    recently_added: List[HomeItem] = Field(default_factory=list, description="Most recently added items")
+    refreshed_at: Optional[float] = Field(None, description="Unix time the rows were last refreshed")
+    error: Optional[str] = Field(None, description="Why the last refresh failed; the previous rows are kept")
+
+class HomeScreen(BaseModel):
+    """
+    Home screen rows for a user across every configured Plex server.
+    """
+    servers: List[HomeServerRows]
+
+class MetadataEdit(BaseModel):
+    """
+    Changes to one item's metadata. Fields left unset are not changed.
+    """
+    rating_key: str = Field(..., description="Item to edit")
+    title: Optional[str] = Field(None, description="New title")
+    title_sort: Optional[str] = Field(None, description="New sort title")
+    add_labels: List[str] = Field(default_factory=list, description="Labels to add")
+    remove_labels: List[str] = Field(default_factory=list, description="Labels to remove")
+    add_genres: List[str] = Field(default_factory=list, description="Genres to add")
+    remove_genres: List[str] = Field(default_factory=list, description="Genres to remove")
+
+    @field_validator('rating_key')
+    @classmethod
+    def validate_not_empty(cls, v):
+        if not v.strip():
+            raise ValueError('Field cannot be empty')
+        return v
+
+class BulkEditRequest(BaseModel):
+    """
+    A batch of metadata edits to items in one library.
+    """
+    library_key: str = Field(..., description="Library the items belong to")
+    edits: List[MetadataEdit] = Field(
+        ...,
+        min_length=1,
+        description="Edits to apply; several edits to the same item are merged in order"
+    )
+    lock: bool = Field(
+        True,
+        description="Lock edited fields so Plex agents don't overwrite them on refresh"
+    )
+
+    model_config = {
+        "json_schema_extra": {
+            "example": {
+                "library_key": "1",
+                "edits": [
+                    {"rating_key": "1234", "title_sort": "Matrix, The"},
+                    {"rating_key": "1234", "add_labels": ["4K Remaster"]},
+                    {"rating_key": "5678", "add_genres": ["Cyberpunk"], "remove_genres": ["Action"]}
+                ]
+            }
+        }
+    }
+
+class EditResult(BaseModel):
+    """
+    Outcome of editing a single item.
+    """
+    rating_key: str = Field(..., description="Edited item")
+    status: str = Field(..., description="One of 'applied', 'failed', 'not_found'")
+    error: Optional[str] = Field(None, description="Why the edit failed")
+
+class BulkEditSummary(BaseModel):
+    """
+    Progress of a bulk metadata edit.
+    """
+    id: str = Field(..., description="Job identifier")
+    library_key: str = Field(..., description="Library being edited")
+    status: str = Field(..., description="One of 'running', 'completed', 'cancelled', 'failed'")
+    total: int = Field(..., description="Number of distinct items to edit")
+    completed: int = Field(..., description="Number of items with a result so far")
+    counts: Dict[str, int] = Field(default_factory=dict, description="Items per result status")
+    requests: int = Field(..., description="Requests sent to Plex so far, tag reads and writes")
+    concurrency: float = Field(..., description="Current adaptive concurrency limit")
+    started_at: float = Field(..., description="Unix timestamp when the job started")
+    finished_at: Optional[float] = Field(None, description="Unix timestamp when the job ended")
+    error: Optional[str] = Field(None, description="Error that stopped the job")
+
+class BulkEditReport(BulkEditSummary):
+    """
+    A bulk metadata edit with a page of its per-item results.
+    """
+    results: List[EditResult] = Field(default_factory=list, description="Matching item results")
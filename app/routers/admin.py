@@ -0,0 +1,66 @@
+import asyncio
+import os
+import secrets
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from ..config import Config
+from ..logging import setup_logger
+from ..services.profiling import profiler
+from .server import verify_token
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+# Initialize router
+router = APIRouter(
+    prefix="/admin",
+    tags=["admin"],
+    responses={404: {"description": "Not found"}}
+)
+
+# Initialize config with optional path from environment
+config_path = os.getenv("PLEX_MANAGER_CONFIG")
+config = Config(config_path)
+
+@router.post("/profile", response_class=PlainTextResponse)
+async def profile(
+    seconds: float = Query(5.0, gt=0, description="How long to sample for"),
+    interval_ms: float | None = Query(None, ge=1, description="Sampling interval in milliseconds"),
+    token: str = Depends(verify_token)
+):
+    """
+    Run the sampling profiler for the given number of seconds and return the
+    collected stacks in folded format (one `frame;frame;frame count` per line),
+    ready for flamegraph.pl or speedscope. Requires the server's own Plex token.
+    """
+    if not config.profiling_config["admin_enabled"]:
+        raise HTTPException(
+            status_code=404,
+            detail="Profiling is disabled"
+        )
+    if not secrets.compare_digest(token.encode(), config.plex_token.encode()):
+        raise HTTPException(
+            status_code=403,
+            detail="Profiling requires the server's Plex token"
+        )
+    if seconds > config.profiling_config["max_seconds"]:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Profiling duration cannot exceed {config.profiling_config['max_seconds']} seconds"
+        )
+    if profiler.running:
+        raise HTTPException(
+            status_code=409,
+            detail="A profiling session is already running"
+        )
+
+    logger.info(f"Starting sampling profiler for {seconds} seconds")
+    profiler.interval = (interval_ms or config.profiling_config["sample_interval_ms"]) / 1000
+    profiler.start()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profiler.stop()
+    logger.info(f"Profiling finished with {sum(profiler.samples.values())} samples")
+    return profiler.folded()
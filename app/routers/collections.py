@@ -0,0 +1,68 @@
+import time
+from fastapi import APIRouter, Depends, HTTPException
+
+from ..models import SmartCollectionRequest, SmartCollectionResult, SmartRuleRequest, SmartRuleResult
+from ..logging import setup_logger
+from ..services.smart_collections import smart_collection_service
+from ..services.smart_index import RuleError
+from .server import verify_token
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+# Initialize router
+router = APIRouter(
+    prefix="/collections",
+    tags=["collections"],
+    responses={404: {"description": "Not found"}}
+)
+
+async def evaluate(request: SmartRuleRequest, token: str):
+    """Evaluate a rule, returning the matches and the evaluation time in ms"""
+    indexes = await smart_collection_service.indexes_for(token, request.libraries)
+    started = time.perf_counter()
+    try:
+        matches = smart_collection_service.evaluate(indexes, request.rule, request.sort, request.limit)
+    except RuleError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid rule: {str(e)}"
+        )
+    evaluation_ms = (time.perf_counter() - started) * 1000
+    logger.info(f"Smart rule matched {len(matches)} items in {evaluation_ms:.1f}ms")
+    return matches, evaluation_ms
+
+@router.post("/evaluate", response_model=SmartRuleResult)
+async def evaluate_rule(request: SmartRuleRequest, token: str = Depends(verify_token)):
+    """
+    Evaluate a smart rule against the local index without changing anything on Plex.
+    """
+    matches, evaluation_ms = await evaluate(request, token)
+    return SmartRuleResult(
+        count=len(matches),
+        rating_keys=[rating_key for _, rating_key, _ in matches],
+        evaluation_ms=evaluation_ms
+    )
+
+@router.post("/smart", response_model=SmartCollectionResult, status_code=201)
+async def create_smart_collection(request: SmartCollectionRequest, token: str = Depends(verify_token)):
+    """
+    Evaluate a smart rule and create a Plex collection (one per library) or
+    playlist holding the matching items. Items are added in batches.
+    """
+    matches, evaluation_ms = await evaluate(request, token)
+    if not matches:
+        raise HTTPException(
+            status_code=400,
+            detail="Rule matched no items"
+        )
+
+    logger.info(f"Creating {request.target} '{request.title}' with {len(matches)} items")
+    created = await smart_collection_service.push(token, request.target, request.title, matches)
+    return SmartCollectionResult(
+        target=request.target,
+        title=request.title,
+        count=len(matches),
+        evaluation_ms=evaluation_ms,
+        created=created
+    )
@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
+from typing import Optional
+
+from ..models import HomeScreen
+from ..logging import setup_logger
+from ..services.home import home_rows
+from .server import verify_token
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+# Initialize router
+router = APIRouter(
+    prefix="/home",
+    tags=["home"],
+    responses={404: {"description": "Not found"}}
+)
+
+@router.get("", response_model=HomeScreen, responses={304: {"description": "Rows unchanged"}})
+async def get_home_screen(
+    response: Response,
+    if_none_match: Optional[str] = Header(None),
+    token: str = Depends(verify_token)
+):
+    """
+    Get the on-deck and recently-added rows of the token's user on every
+    configured Plex server.
+    
+    Rows are kept up to date in the background and served from memory, so
+    only a user's first view calls Plex. The ETag is a hash of the rows and
+    any refresh errors; send it back in If-None-Match to get a 304 when
+    nothing changed.
+    """
+    screen, tag = await home_rows.screen(token)
+    etag = f'"{tag}"'
+    if if_none_match == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
+    return screen
+
+@router.delete("", status_code=204)
+async def forget_home_screen(token: str = Depends(verify_token)):
+    """
+    Stop keeping home screen rows for the token's user.
+    """
+    if not home_rows.forget(token):
+        raise HTTPException(
+            status_code=404,
+            detail="No home screen rows are kept for this user"
+        )
+    logger.info("Stopped keeping home rows for a user")
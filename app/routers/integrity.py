@@ -0,0 +1,99 @@
+from dataclasses import asdict
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from ..models import FileCheckResult, IntegrityScanReport, IntegrityScanRequest, IntegrityScanSummary
+from ..logging import setup_logger
+from ..middleware.rate_limit import hash_token
+from ..services.integrity import ScanJob, integrity_scanner
+from ..services.plex import plex_service
+from .server import verify_token
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+# Initialize router
+router = APIRouter(
+    prefix="/integrity",
+    tags=["integrity"],
+    responses={404: {"description": "Not found"}}
+)
+
+def summarize(job: ScanJob) -> IntegrityScanSummary:
+    return IntegrityScanSummary(
+        id=job.id,
+        library_key=job.library_key,
+        status=job.status,
+        validate_headers=job.validate_headers,
+        total=job.total,
+        checked=job.checked,
+        counts=dict(job.counts),
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error
+    )
+
+def get_job(job_id: str, token: str) -> ScanJob:
+    """Get a scan started with `token`; other callers' scans are reported as missing"""
+    job = integrity_scanner.jobs.get(job_id)
+    if job is None or job.owner != hash_token(token):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Integrity scan {job_id} not found"
+        )
+    return job
+
+@router.post("/scans", response_model=IntegrityScanSummary, status_code=202)
+async def start_scan(request: IntegrityScanRequest, token: str = Depends(verify_token)):
+    """
+    Start checking the files of a library on locally mounted storage.
+    The scan runs in the background; poll it with GET /integrity/scans/{id}.
+    """
+    logger.info(f"Starting integrity scan of library {request.library_key}")
+    items = await plex_service.get_section_items(token, request.library_key)
+    job = integrity_scanner.start(request.library_key, items, request.validate_headers, owner=hash_token(token))
+    return summarize(job)
+
+@router.get("/scans", response_model=list[IntegrityScanSummary])
+async def list_scans(token: str = Depends(verify_token)):
+    """
+    List the caller's recent integrity scans, oldest first.
+    """
+    owner = hash_token(token)
+    return [summarize(job) for job in integrity_scanner.jobs.values() if job.owner == owner]
+
+@router.get("/scans/{job_id}", response_model=IntegrityScanReport)
+async def get_scan(
+    job_id: str,
+    status: Optional[str] = Query(None, description="Only return files with this status"),
+    include_ok: bool = Query(False, description="Include files that passed every check"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    token: str = Depends(verify_token)
+):
+    """
+    Get an integrity scan and a page of its file results.
+    By default only problem files are returned.
+    """
+    job = get_job(job_id, token)
+    if status is not None:
+        matches = [result for result in job.results if result.status == status]
+    elif include_ok:
+        matches = job.results
+    else:
+        matches = [result for result in job.results if result.status != "ok"]
+
+    return IntegrityScanReport(
+        **summarize(job).model_dump(),
+        results=[FileCheckResult(**asdict(result)) for result in matches[offset:offset + limit]]
+    )
+
+@router.delete("/scans/{job_id}", response_model=IntegrityScanSummary)
+async def cancel_scan(job_id: str, token: str = Depends(verify_token)):
+    """
+    Cancel a running integrity scan.
+    """
+    job = get_job(job_id, token)
+    integrity_scanner.cancel(job_id)
+    logger.info(f"Cancelled integrity scan {job_id}")
+    return summarize(job)
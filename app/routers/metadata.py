@@ -0,0 +1,93 @@
+from dataclasses import asdict
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+
+from ..models import BulkEditReport, BulkEditRequest, BulkEditSummary, EditResult
+from ..logging import setup_logger
+from ..middleware.rate_limit import hash_token
+from ..services.bulk_edit import BulkEditJob, bulk_editor
+from .server import verify_token
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+# Initialize router
+router = APIRouter(
+    prefix="/metadata",
+    tags=["metadata"],
+    responses={404: {"description": "Not found"}}
+)
+
+def summarize(job: BulkEditJob) -> BulkEditSummary:
+    return BulkEditSummary(
+        id=job.id,
+        library_key=job.library_key,
+        status=job.status,
+        total=job.total,
+        completed=len(job.results),
+        counts=dict(job.counts),
+        requests=job.requests,
+        concurrency=job.limiter.limit,
+        started_at=job.started_at,
+        finished_at=job.finished_at,
+        error=job.error
+    )
+
+def get_job(job_id: str, token: str) -> BulkEditJob:
+    """Get a bulk edit started with `token`; other callers' jobs are reported as missing"""
+    job = bulk_editor.jobs.get(job_id)
+    if job is None or job.owner != hash_token(token):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Bulk edit {job_id} not found"
+        )
+    return job
+
+@router.post("/bulk-edits", response_model=BulkEditSummary, status_code=202)
+async def start_bulk_edit(request: BulkEditRequest, token: str = Depends(verify_token)):
+    """
+    Apply metadata edits (titles, sort titles, labels, genres) to many items.
+    Edits to the same item are merged, and items whose writes are identical
+    (including their resulting tag lists) are written to Plex together. The job runs in the background; poll it
+    with GET /metadata/bulk-edits/{id}.
+    """
+    logger.info(f"Starting bulk edit of {len(request.edits)} edits in library {request.library_key}")
+    store = await bulk_editor.library_store(token, request.library_key)
+    job = bulk_editor.start(token, request.library_key, request.edits, store, lock=request.lock)
+    return summarize(job)
+
+@router.get("/bulk-edits", response_model=list[BulkEditSummary])
+async def list_bulk_edits(token: str = Depends(verify_token)):
+    """
+    List the caller's recent bulk edits, oldest first.
+    """
+    owner = hash_token(token)
+    return [summarize(job) for job in bulk_editor.jobs.values() if job.owner == owner]
+
+@router.get("/bulk-edits/{job_id}", response_model=BulkEditReport)
+async def get_bulk_edit(
+    job_id: str,
+    status: Optional[str] = Query(None, description="Only return items with this status"),
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=10000),
+    token: str = Depends(verify_token)
+):
+    """
+    Get a bulk edit and a page of its per-item results.
+    """
+    job = get_job(job_id, token)
+    matches = job.results if status is None else [result for result in job.results if result.status == status]
+    return BulkEditReport(
+        **summarize(job).model_dump(),
+        results=[EditResult(**asdict(result)) for result in matches[offset:offset + limit]]
+    )
+
+@router.delete("/bulk-edits/{job_id}", response_model=BulkEditSummary)
+async def cancel_bulk_edit(job_id: str, token: str = Depends(verify_token)):
+    """
+    Cancel a running bulk edit. Writes already sent to Plex are not undone.
+    """
+    job = get_job(job_id, token)
+    bulk_editor.cancel(job_id)
+    logger.info(f"Cancelled bulk edit {job_id}")
+    return summarize(job)
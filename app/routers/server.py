@@ -1,12 +1,18 @@
+import json
 import os
-from fastapi import APIRouter, Depends, HTTPException
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import APIKeyHeader
 import httpx
-import xml.etree.ElementTree as ET
 
-from ..models import ServerInfo, Library
+from ..models import ServerInfo, Library, MediaItem
 from ..config import Config
 from ..logging import setup_logger
+from ..services.change_feed import ChangeSet, change_feed
+from ..services.decoding import PlexDecodeError, parse_library, parse_server_info
+from ..services.plex import plex_service
+from ..services.profiling import TimedJSONResponse, span
 
 # Set up logger for this module
 logger = setup_logger(__name__)
@@ -15,6 +21,7 @@ logger = setup_logger(__name__)
 router = APIRouter(
     prefix="/server",
     tags=["server"],
+    default_response_class=TimedJSONResponse,
     responses={404: {"description": "Not found"}}
 )
 
@@ -42,58 +49,37 @@ async def get_server_info(token: str = Depends(verify_token)):
     This verifies the token is valid and returns basic server information.
     """
     logger.info("Fetching server information")
-    headers = {
-        "X-Plex-Token": token,
-        "X-Plex-Client-Identifier": config.plex_client_config["identifier"],
-        "X-Plex-Product": config.plex_client_config["product"],
-        "X-Plex-Version": config.plex_client_config["version"],
-        "X-Plex-Device": config.plex_client_config["device"],
-        "X-Plex-Device-Name": config.plex_client_config["device_name"],
-        "Accept": "application/xml"
-    }
-    
     try:
-        async with httpx.AsyncClient() as client:
-            logger.debug(f"Making request to {config.plex_base_url}/identity")
-            response = await client.get(
-                f"{config.plex_base_url}/identity",
-                headers=headers
-            )
-            
-            if response.status_code == 200:
-                # Parse XML response
-                logger.debug(f"Received XML response: {response.text}")
-                root = ET.fromstring(response.text)
-                logger.debug(f"XML root tag: {root.tag}")
-                
-                # The root element itself is the MediaContainer
-                if root.tag != "MediaContainer":
-                    logger.error("Invalid response format: Root element is not MediaContainer")
-                    raise HTTPException(
-                        status_code=500,
-                        detail="Invalid response format from Plex server"
-                    )
-                
-                logger.info("Successfully retrieved server information")
-                return ServerInfo(
-                    machine_identifier=root.get("machineIdentifier", ""),
-                    version=root.get("version", ""),
-                    claimed=root.get("claimed", "0") == "1",
-                    server_url=config.plex_base_url
-                )
-            elif response.status_code == 401:
-                logger.error("Invalid Plex token provided")
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid Plex token"
-                )
-            else:
-                logger.error(f"Failed to get server info. Status code: {response.status_code}")
+        logger.debug(f"Making request to {config.plex_base_url}/identity")
+        response = await plex_service.get("/identity", token)
+        
+        if response.status_code == 200:
+            try:
+                container = plex_service.decode(response)
+            except PlexDecodeError as e:
+                logger.error(f"Invalid response format: {str(e)}")
                 raise HTTPException(
                     status_code=500,
-                    detail="Failed to get server info"
+                    detail="Invalid response format from Plex server"
                 )
-                
+            
+            logger.info("Successfully retrieved server information")
+            with span("model"):
+                server_info = parse_server_info(container, config.plex_base_url)
+            return server_info
+        elif response.status_code == 401:
+            logger.error("Invalid Plex token provided")
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid Plex token"
+            )
+        else:
+            logger.error(f"Failed to get server info. Status code: {response.status_code}")
+            raise HTTPException(
+                status_code=500,
+                detail="Failed to get server info"
+            )
+            
     except httpx.RequestError as e:
         logger.error(f"Request error while fetching server info: {str(e)}")
         raise HTTPException(
@@ -115,76 +101,49 @@ async def get_libraries(token: str = Depends(verify_token)):
     Get a list of all libraries from the Plex server.
     """
     logger.info("Fetching library list")
-    headers = {
-        "X-Plex-Token": token,
-        "X-Plex-Client-Identifier": config.plex_client_config["identifier"],
-        "X-Plex-Product": config.plex_client_config["product"],
-        "X-Plex-Version": config.plex_client_config["version"],
-        "X-Plex-Device": config.plex_client_config["device"],
-        "X-Plex-Device-Name": config.plex_client_config["device_name"],
-        "Accept": "application/xml"
-    }
-    
     try:
-        async with httpx.AsyncClient() as client:
-            logger.debug(f"Making request to {config.plex_base_url}/library/sections")
-            response = await client.get(
-                f"{config.plex_base_url}/library/sections",
-                headers=headers
-            )
+        logger.debug(f"Making request to {config.plex_base_url}/library/sections")
+        response = await plex_service.get("/library/sections", token)
+        
+        if response.status_code == 200:
+            container = plex_service.decode(response)
             
-            if response.status_code == 200:
-                # Parse XML response
-                root = ET.fromstring(response.text)
-                
-                # Find all Directory elements
-                directories = root.findall(".//Directory")
-                if not directories:
-                    logger.warning("No libraries found in response")
-                    return []
-                
-                libraries = []
+            directories = container.get("Directory") or []
+            if not directories:
+                logger.warning("No libraries found in response")
+                return []
+            
+            libraries = []
+            with span("model"):
                 for directory in directories:
                     try:
-                        library = Library(
-                            key=str(directory.get("key", "")),
-                            title=str(directory.get("title", "")),
-                            type=str(directory.get("type", "")),
-                            agent=str(directory.get("agent", "")),
-                            scanner=str(directory.get("scanner", "")),
-                            language=str(directory.get("language", "")),
-                            uuid=str(directory.get("uuid", "")),
-                            updated_at=str(directory.get("updatedAt", "")),
-                            created_at=str(directory.get("createdAt", "")),
-                            scanned_at=str(directory.get("scannedAt", ""))
-                        )
-                        libraries.append(library)
+                        libraries.append(parse_library(directory))
                     except Exception as e:
                         logger.error(f"Error processing library section: {str(e)}")
                         continue
-                
-                logger.info(f"Successfully retrieved {len(libraries)} libraries")
-                return libraries
-            elif response.status_code == 401:
-                logger.error("Invalid Plex token provided")
-                raise HTTPException(
-                    status_code=401,
-                    detail="Invalid Plex token"
-                )
-            else:
-                error_detail = f"Failed to connect to Plex server (Status: {response.status_code})"
-                try:
-                    error_data = response.json()
-                    if "MediaContainer" in error_data and "error" in error_data["MediaContainer"]:
-                        error_detail = error_data["MediaContainer"]["error"]
-                except:
-                    pass
-                logger.error(f"Failed to get libraries: {error_detail}")
-                raise HTTPException(
-                    status_code=response.status_code,
-                    detail=error_detail
-                )
-                
+            
+            logger.info(f"Successfully retrieved {len(libraries)} libraries")
+            return libraries
+        elif response.status_code == 401:
+            logger.error("Invalid Plex token provided")
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid Plex token"
+            )
+        else:
+            error_detail = f"Failed to connect to Plex server (Status: {response.status_code})"
+            try:
+                error_data = response.json()
+                if "MediaContainer" in error_data and "error" in error_data["MediaContainer"]:
+                    error_detail = error_data["MediaContainer"]["error"]
+            except:
+                pass
+            logger.error(f"Failed to get libraries: {error_detail}")
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=error_detail
+            )
+            
     except httpx.RequestError as e:
         logger.error(f"Request error while fetching libraries: {str(e)}")
         raise HTTPException(
@@ -198,4 +157,59 @@ async def get_libraries(token: str = Depends(verify_token)):
         raise HTTPException(
             status_code=500,
             detail=f"Failed to process libraries: {str(e)}"
-        ) 
\ No newline at end of file
+        ) 
+
+@router.get("/libraries/{key}/items", response_model=list[MediaItem])
+async def get_library_items(key: str, token: str = Depends(verify_token)):
+    """
+    Get all items in a library from the Plex server.
+    """
+    logger.info(f"Fetching items for library {key}")
+    items = await plex_service.get_section_items(token, key)
+    logger.info(f"Successfully retrieved {len(items)} items from library {key}")
+    return items
+
+def stream_changes(changes: ChangeSet):
+    """Render a change set as newline-delimited JSON, one change per line"""
+    if changes.reset:
+        yield json.dumps({"op": "reset"}) + "\n"
+    for op, rating_keys in (("added", changes.added), ("updated", changes.updated)):
+        for item in changes.items(rating_keys):
+            yield f'{{"op":"{op}","item":{item.model_dump_json()}}}\n'
+    for rating_key in changes.removed:
+        yield json.dumps({"op": "removed", "rating_key": rating_key}) + "\n"
+    yield json.dumps({"cursor": changes.cursor}) + "\n"
+
+@router.get("/libraries/{key}/changes")
+async def get_library_changes(
+    key: str,
+    since: Optional[str] = Query(None, description="Cursor returned by a previous call"),
+    token: str = Depends(verify_token)
+):
+    """
+    Stream the items added, updated and removed in a library since `since`,
+    as newline-delimited JSON. The last line holds the cursor for the next call.
+    
+    Without a cursor every item is returned as added. Expired or unknown
+    cursors get a `{"op": "reset"}` line first, followed by the full library.
+    """
+    logger.info(f"Fetching changes for library {key} since {since}")
+    libraries = await plex_service.get_libraries(token)
+    library = next((library for library in libraries if library.key == key), None)
+    if library is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Library {key} not found"
+        )
+    
+    snapshot = await change_feed.refresh(
+        library,
+        token,
+        lambda: plex_service.get_section_items(token, key)
+    )
+    changes = change_feed.changes_since(snapshot, since)
+    logger.info(
+        f"Library {key}: {len(changes.added)} added, {len(changes.updated)} updated, "
+        f"{len(changes.removed)} removed"
+    )
+    return StreamingResponse(stream_changes(changes), media_type="application/x-ndjson")
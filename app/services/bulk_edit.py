@@ -0,0 +1,430 @@
+import asyncio
+import secrets
+import time
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from ..config import config
+from ..logging import setup_logger
+from ..middleware.rate_limit import hash_token
+from ..models import MetadataEdit
+from . import deadlines, decoding
+from .change_feed import ChangeFeed, change_feed
+from .item_store import ItemStore
+from .plex import PlexService, plex_service
+from .smart_collections import PLEX_TYPES
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+APPLIED = "applied"
+FAILED = "failed"
+NOT_FOUND = "not_found"
+
+# Plex metadata keys holding each editable tag kind
+TAG_KEYS = {"label": "Label", "genre": "Genre"}
+
+# An item's current tags, by tag kind
+CurrentTags = Dict[str, Tuple[str, ...]]
+
+
+@dataclass(slots=True)
+class ItemChanges:
+    """The net changes to one item after merging all of its edits in order"""
+    title: Optional[str] = None
+    title_sort: Optional[str] = None
+    add_labels: Set[str] = field(default_factory=set)
+    remove_labels: Set[str] = field(default_factory=set)
+    add_genres: Set[str] = field(default_factory=set)
+    remove_genres: Set[str] = field(default_factory=set)
+
+    def merge(self, edit: MetadataEdit):
+        if edit.title is not None:
+            self.title = edit.title
+        if edit.title_sort is not None:
+            self.title_sort = edit.title_sort
+        for added, removed, add, remove in (
+            (self.add_labels, self.remove_labels, edit.add_labels, edit.remove_labels),
+            (self.add_genres, self.remove_genres, edit.add_genres, edit.remove_genres),
+        ):
+            # A later add cancels an earlier remove of the same tag, and vice versa
+            added.update(add)
+            removed.difference_update(add)
+            removed.update(remove)
+            added.difference_update(remove)
+
+    @property
+    def adds_tags(self) -> bool:
+        """Whether writing these changes needs the item's current tags"""
+        return bool(self.add_labels or self.add_genres)
+
+    def params(self, lock: bool, current: Optional[CurrentTags] = None) -> Tuple[Tuple[str, str], ...]:
+        """
+        Plex edit parameters for these changes, in a stable (groupable) order.
+
+        Plex treats indexed tag parameters (`label[0].tag.tag`) as the item's
+        complete tag list, so adding tags sends the item's `current` tags
+        along with the new ones.
+        """
+        current = current or {}
+        params: List[Tuple[str, str]] = []
+        for name, value in (("title", self.title), ("titleSort", self.title_sort)):
+            if value is not None:
+                params.append((f"{name}.value", value))
+                if lock:
+                    params.append((f"{name}.locked", "1"))
+        for tag, added, removed in (("label", self.add_labels, self.remove_labels),
+                                    ("genre", self.add_genres, self.remove_genres)):
+            if added:
+                tags = (set(current.get(tag, ())) | added) - removed
+                for index, value in enumerate(sorted(tags)):
+                    params.append((f"{tag}[{index}].tag.tag", value))
+            if removed:
+                params.append((f"{tag}[].tag.tag-", ",".join(sorted(removed))))
+            if lock and (added or removed):
+                params.append((f"{tag}.locked", "1"))
+        return tuple(params)
+
+
+def coalesce(edits: Iterable[MetadataEdit]) -> Dict[str, ItemChanges]:
+    """Merge edits per item, keeping the order in which items first appear"""
+    changes: Dict[str, ItemChanges] = {}
+    for edit in edits:
+        item = changes.get(edit.rating_key)
+        if item is None:
+            item = changes[edit.rating_key] = ItemChanges()
+        item.merge(edit)
+    return changes
+
+
+@dataclass(slots=True)
+class EditBatch:
+    """Items of one type receiving identical changes, written in one request"""
+    item_type: int
+    params: Tuple[Tuple[str, str], ...]
+    rating_keys: List[str]
+
+
+def plan_batches(changes: Dict[str, ItemChanges], types: Dict[str, int], lock: bool,
+                 max_batch_size: int, current: Optional[Dict[str, CurrentTags]] = None) -> List[EditBatch]:
+    """
+    Group items whose writes are identical into batches of at most
+    `max_batch_size`. Tag additions only batch items whose resulting tag
+    lists, given their `current` tags, are the same.
+    """
+    current = current or {}
+    groups: Dict[Tuple[int, Tuple[Tuple[str, str], ...]], List[str]] = {}
+    for rating_key, item in changes.items():
+        params = item.params(lock, current.get(rating_key))
+        if params:
+            groups.setdefault((types[rating_key], params), []).append(rating_key)
+    return [
+        EditBatch(item_type, params, rating_keys[i:i + max_batch_size])
+        for (item_type, params), rating_keys in groups.items()
+        for i in range(0, len(rating_keys), max_batch_size)
+    ]
+
+
+class AdaptiveConcurrencyLimit:
+    """
+    Additive-increase/multiplicative-decrease concurrency limit driven by
+    observed latency. Each fast response raises the limit by 1/limit (about
+    +1 per round trip); a response slower than `target_latency`, or an
+    overload error, halves it, at most once per round trip.
+    """
+
+    def __init__(self, initial: int, maximum: int, target_latency: float, minimum: int = 1):
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.in_flight = 0
+        self.decreased_at = 0.0
+        self.condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+
+    async def release(self):
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def record(self, latency: float, overloaded: bool = False, now: Optional[float] = None):
+        now = time.monotonic() if now is None else now
+        if overloaded or latency > self.target_latency:
+            if now - self.decreased_at >= latency:
+                self.limit = max(float(self.minimum), self.limit / 2)
+                self.decreased_at = now
+        else:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+
+@dataclass(slots=True)
+class ItemResult:
+    """Outcome of editing a single item"""
+    rating_key: str
+    status: str
+    error: Optional[str] = None
+
+
+@dataclass
+class BulkEditJob:
+    """A bulk metadata edit of items in one library"""
+    id: str
+    library_key: str
+    total: int
+    limiter: AdaptiveConcurrencyLimit
+    # Hashed token of the caller who started the job
+    owner: str = ""
+    status: str = "running"
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    requests: int = 0
+    counts: Counter = field(default_factory=Counter)
+    results: List[ItemResult] = field(default_factory=list)
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+
+    def finish(self, rating_keys: Iterable[str], status: str, error: Optional[str] = None):
+        for rating_key in rating_keys:
+            self.results.append(ItemResult(rating_key, status, error))
+            self.counts[status] += 1
+
+
+class BulkEditor:
+    """
+    Applies bulk metadata edits in the background.
+
+    Edits are merged per item. Adding tags replaces an item's whole tag
+    list in Plex, so the current tags of items gaining tags are read first.
+    Items whose writes are identical are then written together: Plex's
+    section edit endpoint accepts a list of ids.
+    Writes share one pooled client, and their concurrency adapts to Plex's
+    observed write latency (AIMD), so a large job runs as fast as Plex
+    allows without degrading it for everyone else.
+    """
+
+    def __init__(self, bulk_edit_config: Dict, plex: PlexService, feed: ChangeFeed):
+        self.plex = plex
+        self.feed = feed
+        self.max_batch_size = bulk_edit_config["max_batch_size"]
+        self.initial_concurrency = bulk_edit_config["initial_concurrency"]
+        self.max_concurrency = bulk_edit_config["max_concurrency"]
+        self.target_latency = bulk_edit_config["target_latency_ms"] / 1000
+        self.max_retries = bulk_edit_config["max_retries"]
+        # Seconds before the first retry, doubling for each further one
+        self.retry_backoff = 0.5
+        self.max_jobs = bulk_edit_config["max_jobs"]
+        self.jobs: "OrderedDict[str, BulkEditJob]" = OrderedDict()
+
+    def shutdown(self):
+        """Cancel running jobs"""
+        for job in self.jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+
+    async def library_store(self, token: str, library_key: str) -> ItemStore:
+        """Get the cached items of a library, to resolve item types"""
+        libraries = await self.plex.get_libraries(token)
+        library = next((library for library in libraries if library.key == library_key), None)
+        if library is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Library {library_key} not found"
+            )
+        snapshot = await self.feed.refresh(library, token, lambda: self.plex.get_section_items(token, library_key))
+        return snapshot.store
+
+    def start(self, token: str, library_key: str, edits: List[MetadataEdit],
+              store: ItemStore, lock: bool = True) -> BulkEditJob:
+        """Start applying `edits` in the background"""
+        changes = coalesce(edits)
+        types: Dict[str, int] = {}
+        missing: List[str] = []
+        type_ids, lookup = store.interned["type"], store.strings.values
+        for rating_key in changes:
+            row = store.row_of(rating_key)
+            if row is None:
+                missing.append(rating_key)
+            else:
+                types[rating_key] = PLEX_TYPES.get(lookup[type_ids[row]], 1)
+        for rating_key in missing:
+            del changes[rating_key]
+
+        job = BulkEditJob(
+            id=secrets.token_hex(8),
+            library_key=library_key,
+            total=len(changes) + len(missing),
+            limiter=AdaptiveConcurrencyLimit(self.initial_concurrency, self.max_concurrency, self.target_latency),
+            owner=hash_token(token)
+        )
+        job.finish(missing, NOT_FOUND, "Item not found in library")
+        unchanged = [rating_key for rating_key, item in changes.items() if not item.params(lock)]
+        job.finish(unchanged, APPLIED)
+        for rating_key in unchanged:
+            del changes[rating_key]
+
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_jobs:
+            _, evicted = self.jobs.popitem(last=False)
+            if evicted.task is not None and not evicted.task.done():
+                evicted.task.cancel()
+        job.task = asyncio.create_task(self.run(job, token, changes, types, lock))
+        job.task.add_done_callback(lambda task: self._finalize(job, task))
+        logger.info(
+            f"Started bulk edit {job.id}: {len(edits)} edits to {job.total} items in library {library_key}"
+        )
+        return job
+
+    @staticmethod
+    def _finalize(job: BulkEditJob, task: asyncio.Task):
+        # Tasks cancelled before they started never reach run()'s handlers
+        if task.cancelled() and job.status == "running":
+            job.status = "cancelled"
+            job.finished_at = time.time()
+
+    def cancel(self, job_id: str) -> Optional[BulkEditJob]:
+        job = self.jobs.get(job_id)
+        if job is not None and job.task is not None and not job.task.done():
+            job.task.cancel()
+        return job
+
+    async def run(self, job: BulkEditJob, token: str, changes: Dict[str, ItemChanges],
+                  types: Dict[str, int], lock: bool):
+        # Jobs outlive the request that started them, so drop its deadline
+        deadlines.set_deadline(None)
+        try:
+            async with self.plex.session() as client:
+                # Tag additions rewrite the whole tag list, so read the items' current tags first
+                adding = [rating_key for rating_key, item in changes.items() if item.adds_tags]
+                chunks = [adding[i:i + self.max_batch_size] for i in range(0, len(adding), self.max_batch_size)]
+                current: Dict[str, CurrentTags] = {}
+                await self.each(job, chunks, lambda chunk: self.read_tags(job, token, chunk, current, client))
+
+                writable = {
+                    rating_key: item for rating_key, item in changes.items()
+                    if not item.adds_tags or rating_key in current
+                }
+                batches = plan_batches(writable, types, lock, self.max_batch_size, current)
+                logger.info(f"Bulk edit {job.id}: {len(batches)} write requests for {len(writable)} items")
+                await self.each(job, batches, lambda batch: self.apply(job, token, batch, client))
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except HTTPException as e:
+            logger.error(f"Bulk edit {job.id} failed: {e.detail}")
+            job.status = "failed"
+            job.error = e.detail
+        except Exception as e:
+            logger.error(f"Bulk edit {job.id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            logger.info(
+                f"Bulk edit {job.id} {job.status} after {job.requests} requests: {dict(job.counts)}"
+            )
+
+    async def each(self, job: BulkEditJob, work: List, handle):
+        """Run `handle` on every piece of `work`, within the job's adaptive concurrency limit"""
+        pending = iter(work)
+
+        async def worker():
+            for piece in pending:
+                await job.limiter.acquire()
+                try:
+                    await handle(piece)
+                finally:
+                    await job.limiter.release()
+
+        # A failing worker cancels the others before the job's session closes,
+        # and its own error is raised rather than the task group's
+        try:
+            async with asyncio.TaskGroup() as workers:
+                for _ in range(min(self.max_concurrency, len(work))):
+                    workers.create_task(worker())
+        except ExceptionGroup as group:
+            raise group.exceptions[0]
+
+    async def send(self, job: BulkEditJob, token: str, method: str, path: str, params, client: httpx.AsyncClient
+                   ) -> Tuple[Optional[httpx.Response], Optional[str]]:
+        """
+        Send one request, retrying timeouts and overload responses.
+
+        Returns:
+            The last response (None if Plex could not be reached) and an
+            error message unless it succeeded.
+        """
+        response, error = None, None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+            started = time.monotonic()
+            job.requests += 1
+            try:
+                response = await self.plex.request(method, path, token, params=params, client=client)
+            except httpx.RequestError as e:
+                job.limiter.record(time.monotonic() - started, overloaded=True)
+                response, error = None, f"Failed to connect to Plex server: {str(e) or type(e).__name__}"
+                continue
+
+            overloaded = response.status_code == 429 or response.status_code >= 500
+            job.limiter.record(time.monotonic() - started, overloaded=overloaded)
+            if response.status_code == 401:
+                raise HTTPException(
+                    status_code=401,
+                    detail="Invalid Plex token"
+                )
+            if response.status_code < 300:
+                return response, None
+            error = f"Plex rejected the request (Status: {response.status_code})"
+            if not overloaded:
+                break
+        return response, error
+
+    async def read_tags(self, job: BulkEditJob, token: str, rating_keys: List[str],
+                        current: Dict[str, CurrentTags], client: httpx.AsyncClient):
+        """Read the current labels and genres of `rating_keys` into `current`"""
+        response, error = await self.send(job, token, "GET", f"/library/metadata/{','.join(rating_keys)}", None, client)
+        if error is not None:
+            if response is not None and response.status_code == 404:
+                job.finish(rating_keys, NOT_FOUND, "Item not found in library")
+            else:
+                job.finish(rating_keys, FAILED, f"Could not read current tags: {error}")
+            return
+
+        try:
+            container = self.plex.decode(response)
+        except decoding.PlexDecodeError as e:
+            job.finish(rating_keys, FAILED, f"Could not read current tags: {str(e)}")
+            return
+
+        for metadata in container.get("Metadata") or ():
+            rating_key = str(metadata.get("ratingKey"))
+            if rating_key in rating_keys:
+                current[rating_key] = {
+                    tag: tuple(str(entry["tag"]) for entry in metadata.get(key) or () if "tag" in entry)
+                    for tag, key in TAG_KEYS.items()
+                }
+        job.finish([rating_key for rating_key in rating_keys if rating_key not in current],
+                   NOT_FOUND, "Item not found in library")
+
+    async def apply(self, job: BulkEditJob, token: str, batch: EditBatch, client: httpx.AsyncClient):
+        """Write one batch"""
+        params = [("type", str(batch.item_type)), ("id", ",".join(batch.rating_keys)), *batch.params]
+        _, error = await self.send(job, token, "PUT", f"/library/sections/{job.library_key}/all", params, client)
+        if error is None:
+            job.finish(batch.rating_keys, APPLIED)
+        else:
+            job.finish(batch.rating_keys, FAILED, error)
+
+
+# Create a singleton instance
+bulk_editor = BulkEditor(config.bulk_edit_config, plex_service, change_feed)
@@ -0,0 +1,229 @@
+import asyncio
+import secrets
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Deque, Dict, Iterator, List, Optional, Tuple
+
+from ..config import config
+from ..middleware.rate_limit import hash_token
+from ..models import Library, MediaItem
+from .item_store import ItemStore, StringPool
+
+ADDED = "added"
+UPDATED = "updated"
+REMOVED = "removed"
+
+
+def _item_stamp(item: MediaItem) -> Tuple[int, int]:
+    """
+    Version stamp for an item: its updatedAt (falling back to addedAt) and
+    view count. Plex does not move updatedAt when an item is watched.
+    """
+    return (item.updated_at or item.added_at or 0, item.view_count)
+
+
+def library_fingerprint(library: Library) -> Tuple[str, str]:
+    """A section is only re-listed when its updatedAt or scannedAt moves"""
+    return (library.updated_at, library.scanned_at)
+
+
+@dataclass
+class SectionSnapshot:
+    """Latest known contents of a section plus a bounded log of changes"""
+    # Identifies this snapshot in cursors, so cursors never carry over to
+    # another user's snapshot or to one rebuilt after eviction
+    id: str = field(default_factory=lambda: secrets.token_hex(4))
+    version: int = 0
+    fingerprint: Optional[Tuple[str, str]] = None
+    refreshed_at: float = 0.0
+    store: ItemStore = field(default_factory=ItemStore)
+    stamps: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+    log: Deque[Tuple[int, str, str]] = field(default_factory=deque)
+    # Cursors older than this version can no longer be answered from the log
+    floor: int = 0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+@dataclass
+class ChangeSet:
+    """Changes between a cursor and the current snapshot of a section"""
+    cursor: str
+    reset: bool
+    store: ItemStore
+    added: List[str]
+    updated: List[str]
+    removed: List[str]
+
+    def items(self, rating_keys: List[str]) -> Iterator[MediaItem]:
+        for rating_key in rating_keys:
+            yield self.store.to_model(self.store.row_of(rating_key))
+
+
+class ChangeFeed:
+    """
+    Keeps versioned snapshots of library sections and answers "what changed
+    since cursor X" queries.
+
+    Plex listings are per user: watch state differs, and managed users with
+    content restrictions see fewer items. Snapshots are therefore kept per
+    (hashed token, section) in LRU order, up to `max_snapshots` of them and
+    `max_items` items across all of them.
+
+    A section is only re-listed from Plex when its updatedAt/scannedAt
+    fingerprint changes or the snapshot is older than `max_age_seconds`.
+    New listings are diffed against the previous snapshot by item updatedAt
+    and the differences are appended to a bounded per-section log.
+    """
+
+    def __init__(self, max_log_entries: int, max_age_seconds: float, max_snapshots: int = 64,
+                 max_items: int = 1000000):
+        self.max_log_entries = max_log_entries
+        self.max_age_seconds = max_age_seconds
+        self.max_snapshots = max_snapshots
+        self.max_items = max_items
+        self.strings = StringPool()
+        self.sections: "OrderedDict[Tuple[str, str], SectionSnapshot]" = OrderedDict()
+        # Cursors are only valid for the lifetime of this process
+        self.epoch = secrets.token_hex(4)
+
+    def snapshot(self, key: str, token: str = "") -> SectionSnapshot:
+        """Get the snapshot of section `key` as seen by `token`"""
+        snapshot_key = (hash_token(token), key)
+        snapshot = self.sections.get(snapshot_key)
+        if snapshot is None:
+            snapshot = self.sections[snapshot_key] = SectionSnapshot()
+            self.evict(snapshot)
+        else:
+            self.sections.move_to_end(snapshot_key)
+        return snapshot
+
+    def evict(self, keep: SectionSnapshot):
+        """
+        Drop least recently used snapshots until within `max_snapshots` and
+        `max_items`. `keep` is never dropped, so a single section larger than
+        `max_items` is still served.
+        """
+        items = sum(len(snapshot.store) for snapshot in self.sections.values())
+        for snapshot_key, snapshot in list(self.sections.items()):
+            if len(self.sections) <= self.max_snapshots and items <= self.max_items:
+                break
+            if snapshot is not keep:
+                del self.sections[snapshot_key]
+                items -= len(snapshot.store)
+
+    def is_stale(self, snapshot: SectionSnapshot, library: Library, now: float) -> bool:
+        return (
+            snapshot.fingerprint != library_fingerprint(library)
+            or now - snapshot.refreshed_at > self.max_age_seconds
+        )
+
+    async def refresh(self, library: Library, token: str, fetch_items) -> SectionSnapshot:
+        """
+        Bring `token`'s snapshot for `library` up to date.
+
+        Args:
+            library: The section as currently reported by Plex
+            token: The Plex token the items are listed with
+            fetch_items: Coroutine function returning the section's items
+        """
+        snapshot = self.snapshot(library.key, token)
+        async with snapshot.lock:
+            if self.is_stale(snapshot, library, time.monotonic()):
+                items = await fetch_items()
+                self.apply(snapshot, items)
+                snapshot.fingerprint = library_fingerprint(library)
+                snapshot.refreshed_at = time.monotonic()
+                self.evict(snapshot)
+        return snapshot
+
+    def apply(self, snapshot: SectionSnapshot, items: List[MediaItem]):
+        """Diff a fresh listing against the snapshot and record the changes"""
+        store = ItemStore(self.strings)
+        stamps: Dict[str, Tuple[int, int]] = {}
+        changes: List[Tuple[str, str]] = []
+        for item in items:
+            if item.rating_key in stamps:
+                continue
+            store.append(item)
+            stamp = stamps[item.rating_key] = _item_stamp(item)
+            previous = snapshot.stamps.get(item.rating_key)
+            if previous is None:
+                changes.append((ADDED, item.rating_key))
+            elif previous != stamp:
+                changes.append((UPDATED, item.rating_key))
+        changes.extend((REMOVED, rating_key) for rating_key in snapshot.stamps if rating_key not in stamps)
+
+        snapshot.store = store
+        snapshot.stamps = stamps
+        if changes:
+            snapshot.version += 1
+            snapshot.log.extend((snapshot.version, op, rating_key) for op, rating_key in changes)
+            while len(snapshot.log) > self.max_log_entries:
+                snapshot.floor = snapshot.log.popleft()[0]
+
+    def cursor(self, snapshot: SectionSnapshot) -> str:
+        return f"{self.epoch}{snapshot.id}-{snapshot.version}"
+
+    def parse_cursor(self, snapshot: SectionSnapshot, cursor: Optional[str]) -> Optional[int]:
+        """Get the version of `snapshot` a cursor refers to, or None if it is unusable"""
+        if not cursor:
+            return None
+        prefix, _, version = cursor.rpartition("-")
+        if prefix != f"{self.epoch}{snapshot.id}" or not version.isdigit():
+            return None
+        return int(version)
+
+    def changes_since(self, snapshot: SectionSnapshot, cursor: Optional[str]) -> ChangeSet:
+        """
+        Collapse the log after `cursor` into the net change per item.
+        Missing, foreign or expired cursors get the full contents with `reset` set.
+        """
+        since = self.parse_cursor(snapshot, cursor)
+        if since is None or since < snapshot.floor or since > snapshot.version:
+            return ChangeSet(
+                cursor=self.cursor(snapshot),
+                reset=cursor is not None,
+                store=snapshot.store,
+                added=list(snapshot.stamps),
+                updated=[],
+                removed=[]
+            )
+
+        first_ops: Dict[str, str] = {}
+        last_ops: Dict[str, str] = {}
+        # The log is ordered by version, so scan back from the newest entry
+        for version, op, rating_key in reversed(snapshot.log):
+            if version <= since:
+                break
+            first_ops[rating_key] = op
+            last_ops.setdefault(rating_key, op)
+
+        added, updated, removed = [], [], []
+        for rating_key, last_op in last_ops.items():
+            first_op = first_ops[rating_key]
+            if last_op == REMOVED:
+                if first_op != ADDED:
+                    removed.append(rating_key)
+            elif first_op == ADDED:
+                added.append(rating_key)
+            else:
+                updated.append(rating_key)
+
+        return ChangeSet(
+            cursor=self.cursor(snapshot),
+            reset=False,
+            store=snapshot.store,
+            added=added,
+            updated=updated,
+            removed=removed
+        )
+
+
+# Create a singleton instance
+change_feed = ChangeFeed(
+    max_log_entries=config.changes_config["max_log_entries"],
+    max_age_seconds=config.changes_config["max_age_seconds"],
+    max_snapshots=config.changes_config["max_snapshots"],
+    max_items=config.changes_config["max_items"]
+)
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Optional, Union
+
+import httpx
+from fastapi import HTTPException
+
+# httpx's own per-phase (connect/read/write/pool) timeout, kept as the cap
+# for each phase so a generous deadline never loosens upstream timeouts
+UPSTREAM_PHASE_TIMEOUT = 5.0
+
+
+class DeadlineExceeded(HTTPException):
+    """Raised when a request runs past its deadline"""
+
+    def __init__(self):
+        super().__init__(
+            status_code=504,
+            detail="Request deadline exceeded"
+        )
+
+
+# Absolute time.monotonic() deadline of the current request; None when unbounded
+_current_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+
+def set_deadline(deadline: Optional[float]):
+    """Set the deadline for the current context, returning a reset token"""
+    return _current_deadline.set(deadline)
+
+
+def reset_deadline(token):
+    _current_deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """
+    Get the seconds left before the current request's deadline.
+
+    Returns:
+        Optional[float]: None when the request has no deadline
+
+    Raises:
+        DeadlineExceeded: If the deadline has already passed
+    """
+    deadline = _current_deadline.get()
+    if deadline is None:
+        return None
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded()
+    return left
+
+
+@asynccontextmanager
+async def upstream_deadline():
+    """
+    Bound an upstream call by the current request deadline.
+
+    Yields the httpx timeout to pass to the call: each phase is capped by
+    the time left, and the whole block (including waiting for an upstream
+    slot) is cancelled once the deadline passes.
+    """
+    left = remaining()
+    timeout: Union[httpx.Timeout, object] = httpx.USE_CLIENT_DEFAULT
+    if left is not None:
+        timeout = httpx.Timeout(min(UPSTREAM_PHASE_TIMEOUT, left))
+    try:
+        async with asyncio.timeout(left):
+            yield timeout
+    except TimeoutError:
+        raise DeadlineExceeded() from None
+    except httpx.TimeoutException:
+        # A phase timeout that coincides with the deadline is the deadline
+        remaining()
+        raise
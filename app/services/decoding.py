@@ -0,0 +1,200 @@
+import io
+import json
+from typing import Any, Callable, Dict, List, Optional
+
+from ..models import HomeItem, Library, MediaItem, MediaPart, ServerInfo
+
+# Plex serves every endpoint as either JSON or XML. Both are normalised to the
+# JSON layout (the dict under the top-level "MediaContainer" key) and then
+# mapped into the typed API models. The fastest available backend is picked
+# at import time, with standard library fallbacks.
+
+try:
+    import orjson
+    json_loads: Callable[[bytes], Any] = orjson.loads
+    JSON_BACKEND = "orjson"
+except ImportError:  # pragma: no cover - depends on installed extras
+    try:
+        import msgspec
+        json_loads = msgspec.json.decode
+        JSON_BACKEND = "msgspec"
+    except ImportError:
+        json_loads = json.loads
+        JSON_BACKEND = "json"
+
+try:
+    from lxml import etree as xml_etree
+    XML_BACKEND = "lxml"
+except ImportError:  # pragma: no cover - depends on installed extras
+    import xml.etree.ElementTree as xml_etree
+    XML_BACKEND = "etree"
+
+# Element tags that Plex's JSON representation lists under "Metadata"
+METADATA_TAGS = frozenset({"Video", "Track", "Photo", "Episode", "Movie", "Playlist"})
+
+
+class PlexDecodeError(ValueError):
+    """Raised when a Plex response cannot be decoded"""
+
+
+def decode_json(payload: bytes) -> Dict[str, Any]:
+    """Decode a JSON Plex response"""
+    try:
+        return json_loads(payload)
+    except ValueError as e:
+        raise PlexDecodeError(f"Invalid JSON response: {str(e)}") from e
+
+
+def _child_key(tag: str, node: Dict[str, Any], depth: int) -> str:
+    """Map an XML element to the key Plex uses for it in JSON responses"""
+    if depth == 1 and (tag in METADATA_TAGS or "ratingKey" in node):
+        return "Metadata"
+    return tag
+
+
+def decode_xml(payload: bytes) -> Dict[str, Any]:
+    """
+    Decode an XML Plex response into the JSON layout.
+
+    The document is processed incrementally with iterparse. Each element is
+    cleared once converted, and the siblings before it are removed from its
+    parent, so the parse tree never holds the whole response alongside the
+    decoded result.
+    """
+    stack: List[Dict[str, Any]] = []
+    # Open elements, parallel to `stack`
+    parents: List[Any] = []
+    root: Optional[Dict[str, Any]] = None
+    root_tag = None
+    try:
+        for event, element in xml_etree.iterparse(io.BytesIO(payload), events=("start", "end")):
+            if event == "start":
+                node = dict(element.attrib)
+                if stack:
+                    key = _child_key(element.tag, node, len(stack))
+                    stack[-1].setdefault(key, []).append(node)
+                else:
+                    root, root_tag = node, element.tag
+                stack.append(node)
+                parents.append(element)
+            else:
+                stack.pop()
+                parents.pop()
+                element.clear()
+                if parents:
+                    # lxml is still building the element that just ended, so keep it
+                    del parents[-1][:-1]
+    except SyntaxError as e:
+        # Both ElementTree's ParseError and lxml's XMLSyntaxError derive from SyntaxError
+        raise PlexDecodeError(f"Invalid XML response: {str(e)}") from e
+
+    if root is None:
+        raise PlexDecodeError("Empty XML response")
+    return {root_tag: root}
+
+
+def decode(payload: bytes) -> Dict[str, Any]:
+    """
+    Decode a Plex response body, sniffing the format from its first byte.
+    Returns the MediaContainer dict.
+    """
+    stripped = payload.lstrip()
+    if stripped.startswith(b"<"):
+        data = decode_xml(stripped)
+    else:
+        data = decode_json(stripped)
+
+    container = data.get("MediaContainer") if isinstance(data, dict) else None
+    if not isinstance(container, dict):
+        raise PlexDecodeError("Response does not contain a MediaContainer")
+    return container
+
+
+def _as_bool(value: Any) -> bool:
+    return value in (True, 1, "1", "true")
+
+
+def _as_int(value: Any) -> Optional[int]:
+    if value is None or value == "":
+        return None
+    return int(value)
+
+
+def _as_float(value: Any) -> Optional[float]:
+    if value is None or value == "":
+        return None
+    return float(value)
+
+
+def _as_str(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value)
+
+
+def parse_server_info(container: Dict[str, Any], server_url: str) -> ServerInfo:
+    """Map an /identity MediaContainer to ServerInfo"""
+    return ServerInfo(
+        machine_identifier=str(container.get("machineIdentifier", "")),
+        version=str(container.get("version", "")),
+        claimed=_as_bool(container.get("claimed", False)),
+        server_url=server_url
+    )
+
+
+def parse_library(directory: Dict[str, Any]) -> Library:
+    """Map a /library/sections Directory entry to a Library"""
+    return Library(
+        key=str(directory.get("key", "")),
+        title=str(directory.get("title", "")),
+        type=str(directory.get("type", "")),
+        agent=str(directory.get("agent", "")),
+        scanner=str(directory.get("scanner", "")),
+        language=str(directory.get("language", "")),
+        uuid=str(directory.get("uuid", "")),
+        updated_at=str(directory.get("updatedAt", "")),
+        created_at=str(directory.get("createdAt", "")),
+        scanned_at=str(directory.get("scannedAt", ""))
+    )
+
+
+def parse_item(metadata: Dict[str, Any]) -> MediaItem:
+    """Map a Metadata entry from a section listing to a MediaItem"""
+    media = (metadata.get("Media") or [{}])[0]
+    return MediaItem(
+        rating_key=str(metadata.get("ratingKey", "")),
+        title=str(metadata.get("title", "")),
+        type=str(metadata.get("type", "")),
+        title_sort=_as_str(metadata.get("titleSort")),
+        library_section_id=_as_str(metadata.get("librarySectionID")),
+        year=_as_int(metadata.get("year")),
+        rating=_as_float(metadata.get("rating")),
+        audience_rating=_as_float(metadata.get("audienceRating")),
+        content_rating=_as_str(metadata.get("contentRating")),
+        view_count=_as_int(metadata.get("viewCount")) or 0,
+        duration=_as_int(metadata.get("duration")),
+        added_at=_as_int(metadata.get("addedAt")),
+        updated_at=_as_int(metadata.get("updatedAt")),
+        video_resolution=_as_str(media.get("videoResolution")),
+        video_codec=_as_str(media.get("videoCodec")),
+        audio_codec=_as_str(media.get("audioCodec")),
+        genres=[str(genre["tag"]) for genre in metadata.get("Genre") or () if "tag" in genre],
+        parts=[
+            MediaPart(file=str(part["file"]), size=_as_int(part.get("size")))
+            for media in metadata.get("Media") or ()
+            for part in media.get("Part") or ()
+            if "file" in part
+        ]
+    )
+
+
+def parse_home_item(metadata: Dict[str, Any]) -> HomeItem:
+    """Map a Metadata entry from an on-deck or recently-added listing to a HomeItem"""
+    return HomeItem(
+        **dict(parse_item(metadata)),
+        view_offset=_as_int(metadata.get("viewOffset")),
+        grandparent_title=_as_str(metadata.get("grandparentTitle")),
+        parent_index=_as_int(metadata.get("parentIndex")),
+        index=_as_int(metadata.get("index")),
+        thumb=_as_str(metadata.get("thumb"))
+    )
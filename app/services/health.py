@@ -0,0 +1,166 @@
+import asyncio
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from ..config import config
+from ..logging import setup_logger
+from ..models import CacheHealth, LoopHealth, PoolHealth, ReadinessReport, UpstreamHealth
+from .change_feed import ChangeFeed
+from .loop_monitor import LoopLagMonitor
+from .plex import PlexService, plex_service
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+
+class UpstreamProbe:
+    """
+    Periodically probes the Plex server in the background and caches the
+    result, so readiness checks never call Plex themselves. Probes bypass
+    the upstream concurrency limit so a saturated pool is not mistaken for
+    an unreachable server.
+    """
+
+    def __init__(self, plex: PlexService, token: str, interval: float, timeout: float):
+        self.plex = plex
+        self.token = token
+        self.interval = interval
+        self.timeout = timeout
+        self.reachable: Optional[bool] = None
+        self.latency_ms: Optional[float] = None
+        self.checked_at: Optional[float] = None
+        self.error: Optional[str] = None
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if not self.running:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(self.interval)
+
+    async def probe(self):
+        """Probe Plex once and record whether it answered, and how fast"""
+        started = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(transport=self.plex.transport) as client:
+                response = await client.get(
+                    f"{self.plex.base_url}/identity",
+                    headers=self.plex.get_headers(self.token),
+                    timeout=self.timeout
+                )
+            self.reachable = response.status_code < 500
+            self.error = None if self.reachable else f"Status: {response.status_code}"
+        except httpx.RequestError as e:
+            self.reachable = False
+            self.error = str(e) or type(e).__name__
+        self.latency_ms = (time.perf_counter() - started) * 1000
+        self.checked_at = time.time()
+        if not self.reachable:
+            logger.warning(f"Plex health probe failed: {self.error}")
+
+    def is_stale(self, now: float) -> bool:
+        """Whether the last probe is too old to be trusted (missed several intervals)"""
+        return self.checked_at is None or now - self.checked_at > 3 * self.interval + self.timeout
+
+
+class ReadinessCheck:
+    """
+    Assembles a readiness report from state that background samplers and
+    request handling already maintain. Building a report does no I/O.
+    """
+
+    def __init__(self, monitor: LoopLagMonitor, probe: UpstreamProbe, plex: PlexService,
+                 feed: ChangeFeed, health_config: Dict[str, Any], shedder=None, response_cache=None):
+        self.monitor = monitor
+        self.probe = probe
+        self.plex = plex
+        self.feed = feed
+        self.shedder = shedder
+        self.response_cache = response_cache
+        self.max_loop_lag = health_config["max_loop_lag_ms"] / 1000
+        self.max_upstream_latency_ms = health_config["max_upstream_latency_ms"]
+        self.max_pool_waiting = health_config["max_pool_waiting"]
+
+    def report(self, now: Optional[float] = None) -> ReadinessReport:
+        now = time.time() if now is None else now
+        reasons: List[str] = []
+
+        loop = LoopHealth(
+            lag_ms=self.monitor.lag * 1000,
+            max_lag_ms=self.monitor.max_lag * 1000,
+            sampling=self.monitor.running
+        )
+        if self.max_loop_lag and self.monitor.lag >= self.max_loop_lag:
+            reasons.append(f"Event loop lag {loop.lag_ms:.0f}ms")
+
+        stale = self.probe.running and self.probe.is_stale(now)
+        upstream = UpstreamHealth(
+            reachable=self.probe.reachable,
+            latency_ms=self.probe.latency_ms,
+            checked_at=self.probe.checked_at,
+            stale=stale,
+            error=self.probe.error
+        )
+        if self.probe.reachable is False:
+            reasons.append("Plex server unreachable")
+        elif stale:
+            reasons.append("Plex health probe is stale")
+        elif (self.max_upstream_latency_ms and self.probe.latency_ms is not None
+              and self.probe.latency_ms > self.max_upstream_latency_ms):
+            reasons.append(f"Plex latency {self.probe.latency_ms:.0f}ms")
+
+        pool = PoolHealth(
+            max_concurrency=self.plex.max_concurrency,
+            in_use=self.plex.in_use,
+            waiting=self.plex.waiting,
+            in_flight=self.shedder.in_flight if self.shedder is not None else None,
+            max_in_flight=self.shedder.max_in_flight if self.shedder is not None else None,
+            shed=self.shedder.shed_count if self.shedder is not None else None
+        )
+        if self.max_pool_waiting and self.plex.waiting >= self.max_pool_waiting:
+            reasons.append(f"{self.plex.waiting} requests waiting for Plex")
+        overload = self.shedder.overload_reason() if self.shedder is not None else None
+        if overload:
+            reasons.append(f"Shedding load: {overload}")
+
+        cache = CacheHealth(
+            library_snapshots=sum(1 for snapshot in self.feed.sections.values() if snapshot.version),
+            response_cache_entries=len(self.response_cache) if self.response_cache is not None else None,
+            response_cache_max_entries=self.response_cache.max_entries if self.response_cache is not None else None
+        )
+
+        return ReadinessReport(
+            status="degraded" if reasons else "ready",
+            reasons=reasons,
+            loop=loop,
+            upstream=upstream,
+            pool=pool,
+            cache=cache
+        )
+
+
+# Create a singleton instance
+upstream_probe = UpstreamProbe(
+    plex_service,
+    token=config.plex_token,
+    interval=config.health_config["probe_interval_seconds"],
+    timeout=config.health_config["probe_timeout_seconds"]
+)
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from ..config import config
+from ..logging import setup_logger
+from ..middleware.rate_limit import hash_token
+from ..models import HomeItem, HomeScreen, HomeServerRows
+from .plex import PlexService, plex_service
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+# Per-user listings behind each home screen row
+ROW_PATHS = {
+    "on_deck": "/library/onDeck",
+    "recently_added": "/library/recentlyAdded",
+}
+
+
+def row_fingerprint(items: List[HomeItem]) -> Tuple:
+    """What a row shows: its items, their order and playback progress"""
+    return tuple((item.rating_key, item.view_offset, item.view_count, item.updated_at) for item in items)
+
+
+def screen_tag(rows: Dict[str, HomeServerRows]) -> str:
+    """
+    Content hash of a user's rows on every server, errors included. It only
+    depends on what the rows show, so it stays valid across re-registration,
+    restarts and workers.
+    """
+    fingerprint = tuple(
+        (name, row_fingerprint(server_rows.on_deck), row_fingerprint(server_rows.recently_added), server_rows.error)
+        for name, server_rows in rows.items()
+    )
+    return hashlib.blake2b(repr(fingerprint).encode(), digest_size=12).hexdigest()
+
+
+@dataclass
+class HomeUser:
+    """A user's Plex token and their rows on every server"""
+    token: str
+    last_seen: float
+    rows: Dict[str, HomeServerRows] = field(default_factory=dict)
+    # screen_tag() of the rows, recomputed after every refresh
+    tag: str = ""
+
+
+class HomeRowService:
+    """
+    Keeps on-deck and recently-added rows for every user who has viewed
+    their home screen, across all configured Plex servers.
+
+    Rows are refreshed by a background loop and served from memory, so a
+    page view makes no upstream calls. A refresh only replaces a row when
+    its content actually changed, and a failed refresh keeps the previous
+    rows with the error attached. Each user's rows carry a content hash
+    (their ETag) that changes whenever the rows or their errors do.
+    """
+
+    def __init__(self, servers: Dict[str, PlexService], row_size: int, refresh_interval: float,
+                 refresh_concurrency: int, idle_seconds: float, max_users: int):
+        self.servers = servers
+        self.row_size = row_size
+        self.refresh_interval = refresh_interval
+        self.refresh_slots = asyncio.Semaphore(refresh_concurrency)
+        self.idle_seconds = idle_seconds
+        self.max_users = max_users
+        self.users: "OrderedDict[str, HomeUser]" = OrderedDict()
+        self.task: Optional[asyncio.Task] = None
+
+    @classmethod
+    def from_config(cls, home_config: Dict, plex: PlexService) -> "HomeRowService":
+        """
+        Build the service from the `home` section of config.yaml. Extra
+        servers share the main server's transport, so they are recorded and
+        replayed along with it.
+        """
+        servers = {"default": plex}
+        for name, base_url in (home_config.get("servers") or {}).items():
+            servers[name] = PlexService(base_url, transport=plex.transport)
+        return cls(
+            servers,
+            row_size=home_config["row_size"],
+            refresh_interval=home_config["refresh_interval_seconds"],
+            refresh_concurrency=home_config["refresh_concurrency"],
+            idle_seconds=home_config["idle_seconds"],
+            max_users=home_config["max_users"],
+        )
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        if not self.running:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                await self.refresh_all()
+            except Exception as e:
+                logger.error(f"Home row refresh failed: {str(e)}")
+
+    async def screen(self, token: str) -> Tuple[HomeScreen, str]:
+        """
+        Get a user's home screen and its content tag. Known users are served
+        from memory; a user's first view fetches their rows and registers
+        them for background refreshes.
+        """
+        key = hash_token(token)
+        user = self.users.get(key)
+        if user is None:
+            user = HomeUser(token=token, last_seen=time.time())
+            await self.refresh_user(user, raise_errors=True)
+            self.users[key] = user
+            if len(self.users) > self.max_users:
+                self.users.popitem(last=False)
+            logger.info(f"Registered home rows for a new user ({len(self.users)} users)")
+        else:
+            user.last_seen = time.time()
+            self.users.move_to_end(key)
+        screen = HomeScreen(servers=[user.rows[name] for name in self.servers if name in user.rows])
+        return screen, user.tag
+
+    def forget(self, token: str) -> bool:
+        """Stop keeping rows for a user"""
+        return self.users.pop(hash_token(token), None) is not None
+
+    async def refresh_all(self, now: Optional[float] = None):
+        """Refresh every active user's rows, dropping users who have gone idle"""
+        now = time.time() if now is None else now
+        for key in [key for key, user in self.users.items() if now - user.last_seen > self.idle_seconds]:
+            del self.users[key]
+        users = list(self.users.values())
+        started = time.perf_counter()
+        await asyncio.gather(*(self.refresh_user(user) for user in users))
+        logger.debug(f"Refreshed home rows for {len(users)} users in {time.perf_counter() - started:.2f}s")
+
+    async def refresh_user(self, user: HomeUser, raise_errors: bool = False):
+        results = await asyncio.gather(
+            *(self.fetch_rows(plex, user.token) for plex in self.servers.values()),
+            return_exceptions=True
+        )
+        if raise_errors and all(isinstance(result, BaseException) for result in results):
+            raise results[0]
+        for name, result in zip(self.servers, results):
+            previous = user.rows.get(name) or HomeServerRows(server=name)
+            if isinstance(result, BaseException):
+                error = result.detail if isinstance(result, HTTPException) else str(result)
+                logger.warning(f"Failed to refresh home rows on {name}: {error}")
+                user.rows[name] = previous.model_copy(update={"error": error})
+                continue
+
+            on_deck, recently_added = result
+            changed = (
+                row_fingerprint(on_deck) != row_fingerprint(previous.on_deck)
+                or row_fingerprint(recently_added) != row_fingerprint(previous.recently_added)
+            )
+            if changed:
+                user.rows[name] = HomeServerRows(
+                    server=name, on_deck=on_deck, recently_added=recently_added, refreshed_at=time.time()
+                )
+            else:
+                user.rows[name] = previous.model_copy(update={"refreshed_at": time.time(), "error": None})
+        user.tag = screen_tag(user.rows)
+
+    async def fetch_rows(self, plex: PlexService, token: str) -> Tuple[List[HomeItem], List[HomeItem]]:
+        async with self.refresh_slots:
+            return await asyncio.gather(*(
+                plex.get_home_items(token, path, self.row_size) for path in ROW_PATHS.values()
+            ))
+
+
+# Create a singleton instance
+home_rows = HomeRowService.from_config(config.home_config, plex_service)
@@ -0,0 +1,287 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import secrets
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..config import config
+from ..logging import setup_logger
+from ..middleware.rate_limit import TokenBucket
+from ..models import MediaItem
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+OK = "ok"
+MISSING = "missing"
+EMPTY = "empty"
+TRUNCATED = "truncated"
+UNREADABLE = "unreadable"
+INVALID_HEADER = "invalid_header"
+
+# Leading bytes of common media containers, keyed by file extension
+CONTAINER_SIGNATURES: Dict[str, Tuple[Tuple[int, bytes], ...]] = {
+    ".mkv": ((0, b"\x1a\x45\xdf\xa3"),),
+    ".webm": ((0, b"\x1a\x45\xdf\xa3"),),
+    ".mp4": ((4, b"ftyp"),),
+    ".m4v": ((4, b"ftyp"),),
+    ".mov": ((4, b"ftyp"), (4, b"moov"), (4, b"wide"), (4, b"mdat")),
+    ".avi": ((0, b"RIFF"),),
+    ".ts": ((0, b"\x47"),),
+    ".flac": ((0, b"fLaC"),),
+    ".mp3": ((0, b"ID3"), (0, b"\xff\xfb"), (0, b"\xff\xf3"), (0, b"\xff\xf2")),
+}
+
+
+def stat_size(path: str) -> int:
+    """Get a file's size; run in the stat thread pool"""
+    return os.stat(path).st_size
+
+
+def validate_header(path: str, sample_bytes: int) -> Tuple[bool, str]:
+    """
+    Check a file's container signature and hash its first and last
+    `sample_bytes`. Runs in the process pool, so it must stay a picklable
+    module-level function.
+
+    Returns:
+        Tuple[bool, str]: Whether the header matches the extension, and the
+        partial hash
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        head = f.read(sample_bytes)
+        digest.update(head)
+        f.seek(0, os.SEEK_END)
+        if f.tell() > sample_bytes:
+            f.seek(max(sample_bytes, f.tell() - sample_bytes))
+            digest.update(f.read(sample_bytes))
+
+    signatures = CONTAINER_SIGNATURES.get(os.path.splitext(path)[1].lower())
+    if signatures and not any(head[offset:offset + len(magic)] == magic for offset, magic in signatures):
+        return False, digest.hexdigest()
+    return True, digest.hexdigest()
+
+
+@dataclass(slots=True)
+class FileCheck:
+    """Outcome of checking a single media file"""
+    rating_key: str
+    file: str
+    local_path: str
+    status: str
+    expected_size: Optional[int] = None
+    actual_size: Optional[int] = None
+    detail: Optional[str] = None
+
+
+@dataclass
+class ScanJob:
+    """An integrity scan over the files of one library"""
+    id: str
+    library_key: str
+    validate_headers: bool
+    total: int
+    # Hashed token of the caller who started the scan
+    owner: str = ""
+    status: str = "running"
+    started_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+    checked: int = 0
+    counts: Counter = field(default_factory=Counter)
+    results: List[FileCheck] = field(default_factory=list)
+    error: Optional[str] = None
+    task: Optional[asyncio.Task] = None
+
+
+class IntegrityScanner:
+    """
+    Checks that the files Plex lists exist on locally mounted storage and are
+    not empty, truncated or (optionally) carrying a corrupt header.
+
+    `stat` calls run on a bounded thread pool; header validation and partial
+    hashing run on a process pool so they use every core without holding
+    the GIL of the API process. A fixed number of worker coroutines bounds
+    the work in flight, and an optional token bucket caps files per second
+    to protect the disks.
+    """
+
+    def __init__(self, integrity_config: Dict):
+        self.path_mappings: Dict[str, str] = integrity_config["path_mappings"] or {}
+        self.stat_workers = integrity_config["stat_workers"]
+        self.hash_workers = integrity_config["hash_workers"] or os.cpu_count() or 1
+        self.max_in_flight = integrity_config["max_in_flight"]
+        self.max_files_per_second = integrity_config["max_files_per_second"]
+        self.header_bytes = integrity_config["header_bytes"]
+        self.max_jobs = integrity_config["max_jobs"]
+        self.jobs: "OrderedDict[str, ScanJob]" = OrderedDict()
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+
+    @property
+    def thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.stat_workers, thread_name_prefix="clebarr-stat")
+        return self._thread_pool
+
+    @property
+    def process_pool(self) -> ProcessPoolExecutor:
+        if self._process_pool is None:
+            # Forking a process that runs an event loop and worker threads can
+            # copy held locks into the child, so workers are spawned fresh
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=self.hash_workers,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._process_pool
+
+    def _discard_process_pool(self, pool: ProcessPoolExecutor):
+        """Drop a broken process pool so the next header check starts a new one"""
+        if self._process_pool is pool:
+            self._process_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        """Cancel running scans and release the worker pools"""
+        for job in self.jobs.values():
+            if job.task is not None and not job.task.done():
+                job.task.cancel()
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None
+        if self._process_pool is not None:
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+
+    def local_path(self, path: str) -> str:
+        """Translate a path as seen by Plex into the locally mounted path"""
+        for plex_prefix, local_prefix in self.path_mappings.items():
+            if path.startswith(plex_prefix):
+                return local_prefix + path[len(plex_prefix):]
+        return path
+
+    @staticmethod
+    def files(items: Iterable[MediaItem]) -> List[Tuple[str, str, Optional[int]]]:
+        return [(item.rating_key, part.file, part.size) for item in items for part in item.parts]
+
+    def start(self, library_key: str, items: Iterable[MediaItem], validate_headers: bool = False,
+              owner: str = "") -> ScanJob:
+        """Start a background scan of the files backing `items`, on behalf of `owner`"""
+        files = self.files(items)
+        job = ScanJob(
+            id=secrets.token_hex(8),
+            library_key=library_key,
+            validate_headers=validate_headers,
+            total=len(files),
+            owner=owner
+        )
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_jobs:
+            _, evicted = self.jobs.popitem(last=False)
+            if evicted.task is not None and not evicted.task.done():
+                evicted.task.cancel()
+        job.task = asyncio.create_task(self.run(job, files))
+        job.task.add_done_callback(lambda task: self._finalize(job, task))
+        logger.info(f"Started integrity scan {job.id} of {job.total} files in library {library_key}")
+        return job
+
+    @staticmethod
+    def _finalize(job: ScanJob, task: asyncio.Task):
+        # Tasks cancelled before they started never reach run()'s handlers
+        if task.cancelled() and job.status == "running":
+            job.status = "cancelled"
+            job.finished_at = time.time()
+
+    def cancel(self, job_id: str) -> Optional[ScanJob]:
+        job = self.jobs.get(job_id)
+        if job is not None and job.task is not None and not job.task.done():
+            job.task.cancel()
+        return job
+
+    async def run(self, job: ScanJob, files: List[Tuple[str, str, Optional[int]]]):
+        pending: Iterator[Tuple[str, str, Optional[int]]] = iter(files)
+        throttle = TokenBucket(1, time.monotonic()) if self.max_files_per_second else None
+
+        async def worker():
+            for rating_key, file, expected_size in pending:
+                if throttle is not None:
+                    while wait := throttle.take(self.max_files_per_second, 1, time.monotonic()):
+                        await asyncio.sleep(wait)
+                result = await self.check(rating_key, file, expected_size, job.validate_headers)
+                job.results.append(result)
+                job.counts[result.status] += 1
+                job.checked += 1
+
+        try:
+            # The task group cancels the remaining workers as soon as one fails
+            async with asyncio.TaskGroup() as workers:
+                for _ in range(min(self.max_in_flight, len(files)) or 1):
+                    workers.create_task(worker())
+            job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except ExceptionGroup as group:
+            e = group.exceptions[0]
+            logger.error(f"Integrity scan {job.id} failed: {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            logger.info(f"Integrity scan {job.id} {job.status}: {dict(job.counts)}")
+
+    async def check(self, rating_key: str, file: str, expected_size: Optional[int],
+                    validate_headers: bool) -> FileCheck:
+        """Check a single file"""
+        loop = asyncio.get_running_loop()
+        path = self.local_path(file)
+        result = FileCheck(rating_key=rating_key, file=file, local_path=path, status=OK,
+                           expected_size=expected_size)
+        try:
+            result.actual_size = await loop.run_in_executor(self.thread_pool, stat_size, path)
+        except FileNotFoundError:
+            result.status = MISSING
+            return result
+        except OSError as e:
+            result.status = UNREADABLE
+            result.detail = str(e)
+            return result
+
+        if result.actual_size == 0:
+            result.status = EMPTY
+        elif expected_size is not None and result.actual_size < expected_size:
+            result.status = TRUNCATED
+        elif validate_headers:
+            try:
+                valid, result.detail = await self.validate(path)
+            except OSError as e:
+                result.status = UNREADABLE
+                result.detail = str(e)
+                return result
+            if not valid:
+                result.status = INVALID_HEADER
+        return result
+
+    async def validate(self, path: str) -> Tuple[bool, str]:
+        """
+        Validate a file's header in the process pool. A worker that dies
+        breaks the whole pool, so it is replaced and the file retried once;
+        a second crash is reported as an OSError for the file.
+        """
+        loop = asyncio.get_running_loop()
+        for _ in range(2):
+            pool = self.process_pool
+            try:
+                return await loop.run_in_executor(pool, validate_header, path, self.header_bytes)
+            except BrokenExecutor as e:
+                logger.warning(f"Header validation pool broke while checking {path}: {str(e)}")
+                self._discard_process_pool(pool)
+        raise OSError(f"Header validation worker crashed: {path}")
+
+
+# Create a singleton instance
+integrity_scanner = IntegrityScanner(config.integrity_config)
@@ -0,0 +1,180 @@
+import math
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from ..models import MediaItem, MediaPart
+
+# Sentinel for missing values in integer columns
+MISSING_INT = -(2 ** 63)
+
+
+class StringPool:
+    """
+    Interns repeated strings (agents, codecs, genres...) as small integer ids.
+    Id 0 is reserved for None.
+    """
+    __slots__ = ("ids", "values")
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.values: List[Optional[str]] = [None]
+
+    def intern(self, value: Optional[str]) -> int:
+        if value is None:
+            return 0
+        string_id = self.ids.get(value)
+        if string_id is None:
+            string_id = len(self.values)
+            self.ids[value] = string_id
+            self.values.append(value)
+        return string_id
+
+    def lookup(self, string_id: int) -> Optional[str]:
+        return self.values[string_id]
+
+    def __len__(self) -> int:
+        return len(self.values) - 1
+
+
+@dataclass(slots=True)
+class CompactItem:
+    """Lightweight, validation-free view of a single stored item"""
+    rating_key: str
+    title: str
+    type: str
+    title_sort: Optional[str]
+    library_section_id: Optional[str]
+    year: Optional[int]
+    rating: Optional[float]
+    audience_rating: Optional[float]
+    content_rating: Optional[str]
+    view_count: int
+    duration: Optional[int]
+    added_at: Optional[int]
+    updated_at: Optional[int]
+    video_resolution: Optional[str]
+    video_codec: Optional[str]
+    audio_codec: Optional[str]
+    genres: Tuple[str, ...]
+    parts: Tuple[Tuple[str, Optional[int]], ...]
+
+
+# Columns by storage kind; every field of MediaItem appears in exactly one
+UNIQUE_STRING_FIELDS = ("rating_key", "title", "title_sort")
+INTERNED_FIELDS = ("type", "library_section_id", "content_rating",
+                   "video_resolution", "video_codec", "audio_codec")
+INT_FIELDS = ("year", "view_count", "duration", "added_at", "updated_at")
+FLOAT_FIELDS = ("rating", "audience_rating")
+
+
+class ItemStore:
+    """
+    Column-oriented store for cached media items.
+
+    Numeric fields are kept in typed arrays (struct-of-arrays), repeated
+    strings are interned into a shared StringPool and stored as 32-bit ids,
+    and genre and part lists are flattened into shared arrays with per-item
+    offsets. Items are materialised back into API models on output.
+    """
+
+    def __init__(self, strings: Optional[StringPool] = None):
+        self.strings = strings if strings is not None else StringPool()
+        self.unique: Dict[str, List[Optional[str]]] = {name: [] for name in UNIQUE_STRING_FIELDS}
+        self.interned: Dict[str, array] = {name: array("I") for name in INTERNED_FIELDS}
+        self.ints: Dict[str, array] = {name: array("q") for name in INT_FIELDS}
+        self.floats: Dict[str, array] = {name: array("d") for name in FLOAT_FIELDS}
+        self.genre_ids = array("I")
+        self.genre_offsets = array("I", [0])
+        self.part_files: List[str] = []
+        self.part_sizes = array("q")
+        self.part_offsets = array("I", [0])
+        self.positions: Dict[str, int] = {}
+
+    @classmethod
+    def from_items(cls, items: Iterable[MediaItem], strings: Optional[StringPool] = None) -> "ItemStore":
+        store = cls(strings)
+        for item in items:
+            store.append(item)
+        return store
+
+    def append(self, item: MediaItem) -> int:
+        """Add an item and return its row number"""
+        if item.rating_key in self.positions:
+            raise ValueError(f"Item {item.rating_key} is already stored")
+        row = len(self.positions)
+        for name in UNIQUE_STRING_FIELDS:
+            self.unique[name].append(getattr(item, name))
+        for name in INTERNED_FIELDS:
+            self.interned[name].append(self.strings.intern(getattr(item, name)))
+        for name in INT_FIELDS:
+            value = getattr(item, name)
+            self.ints[name].append(MISSING_INT if value is None else value)
+        for name in FLOAT_FIELDS:
+            value = getattr(item, name)
+            self.floats[name].append(math.nan if value is None else value)
+        self.genre_ids.extend(self.strings.intern(genre) for genre in item.genres)
+        self.genre_offsets.append(len(self.genre_ids))
+        for part in item.parts:
+            self.part_files.append(part.file)
+            self.part_sizes.append(MISSING_INT if part.size is None else part.size)
+        self.part_offsets.append(len(self.part_files))
+        self.positions[item.rating_key] = row
+        return row
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def __contains__(self, rating_key: str) -> bool:
+        return rating_key in self.positions
+
+    def row_of(self, rating_key: str) -> Optional[int]:
+        return self.positions.get(rating_key)
+
+    def genres(self, row: int) -> Tuple[str, ...]:
+        lookup = self.strings.values
+        start, end = self.genre_offsets[row], self.genre_offsets[row + 1]
+        return tuple(lookup[string_id] for string_id in self.genre_ids[start:end])
+
+    def parts(self, row: int) -> Tuple[Tuple[str, Optional[int]], ...]:
+        start, end = self.part_offsets[row], self.part_offsets[row + 1]
+        return tuple(
+            (self.part_files[i], None if self.part_sizes[i] == MISSING_INT else self.part_sizes[i])
+            for i in range(start, end)
+        )
+
+    def _values(self, row: int) -> Dict[str, object]:
+        values: Dict[str, object] = {name: column[row] for name, column in self.unique.items()}
+        lookup = self.strings.values
+        for name, column in self.interned.items():
+            values[name] = lookup[column[row]]
+        for name, column in self.ints.items():
+            value = column[row]
+            values[name] = None if value == MISSING_INT else value
+        for name, column in self.floats.items():
+            value = column[row]
+            values[name] = None if math.isnan(value) else value
+        return values
+
+    def row(self, row: int) -> CompactItem:
+        """Get a lightweight view of a stored item"""
+        return CompactItem(genres=self.genres(row), parts=self.parts(row), **self._values(row))
+
+    def to_model(self, row: int) -> MediaItem:
+        """
+        Materialise a stored item as the API model.
+        Values were validated when the item was stored, so validation is skipped.
+        """
+        return MediaItem.model_construct(
+            genres=list(self.genres(row)),
+            parts=[MediaPart.model_construct(file=file, size=size) for file, size in self.parts(row)],
+            **self._values(row)
+        )
+
+    def get(self, rating_key: str) -> Optional[MediaItem]:
+        row = self.positions.get(rating_key)
+        return None if row is None else self.to_model(row)
+
+    def __iter__(self) -> Iterator[MediaItem]:
+        for row in range(len(self)):
+            yield self.to_model(row)
@@ -0,0 +1,57 @@
+import asyncio
+from typing import Optional
+
+from ..config import config
+from ..logging import setup_logger
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+
+class LoopLagMonitor:
+    """
+    Measures event-loop lag: how late a periodic timer fires compared to
+    when it was scheduled. Sustained lag means callbacks (requests) are
+    queueing behind blocking work.
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        # Lag of the most recent tick, and the largest seen since start
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        """Start sampling on the running event loop"""
+        if not self.running:
+            self.lag = 0.0
+            self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+            self.task = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time() + self.interval
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - scheduled)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+            if self.lag > 1.0:
+                logger.warning(f"Event loop blocked for {self.lag * 1000:.0f}ms")
+
+
+# Create a singleton instance
+loop_monitor = LoopLagMonitor(config.load_shedding_config["lag_interval_ms"] / 1000)
@@ -1,12 +1,38 @@
-from typing import Dict
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, Iterable, List, Optional, TypeVar
 import httpx
 from fastapi import HTTPException
+from pydantic import ValidationError
 
 from ..config import config
+from ..logging import setup_logger
+from ..models import HomeItem, Library, MediaItem
+from . import deadlines, decoding
+from .profiling import span
+from .recording import transport_from_config
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+
+def parse_entries(parse: Callable[[Dict[str, Any]], T], entries: Iterable[Dict[str, Any]], kind: str) -> List[T]:
+    """Parse container entries into models, logging and skipping entries that don't validate"""
+    parsed = []
+    for entry in entries:
+        try:
+            parsed.append(parse(entry))
+        except ValidationError as e:
+            logger.error(f"Skipping invalid {kind} {entry.get('key') or entry.get('ratingKey')}: {str(e)}")
+    return parsed
 
 class PlexService:
-    def __init__(self):
-        self.base_url = config.plex_base_url
+    def __init__(self, base_url: Optional[str] = None, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url or config.plex_base_url
+        # Custom httpx transport, e.g. to record or replay upstream traffic
+        self.transport = transport
         self.client_headers = {
             "X-Plex-Client-Identifier": config.plex_client_config["identifier"],
             "X-Plex-Product": config.plex_client_config["product"],
@@ -15,6 +41,14 @@ class PlexService:
             "X-Plex-Device-Name": config.plex_client_config["device_name"],
             "Accept": "application/json"
         }
+        # Global cap on concurrent upstream requests, shared by every caller
+        self.max_concurrency = config.upstream_config["max_concurrency"]
+        self.upstream_slots = asyncio.Semaphore(self.max_concurrency)
+        # Requests holding and waiting for an upstream slot, for readiness checks
+        self.in_use = 0
+        self.waiting = 0
+        # Page size used when listing library contents
+        self.page_size = config.upstream_config["page_size"]
 
     def get_headers(self, token: str) -> Dict[str, str]:
         """Get headers with authentication token"""
@@ -23,33 +57,226 @@ class PlexService:
             "X-Plex-Token": token
         }
 
+    @asynccontextmanager
+    async def upstream_slot(self):
+        """Hold one of the global upstream slots, tracking pool occupancy"""
+        self.waiting += 1
+        try:
+            await self.upstream_slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.in_use += 1
+        try:
+            yield
+        finally:
+            self.in_use -= 1
+            self.upstream_slots.release()
+
+    async def get(self, path: str, token: str, accept: str = "application/json",
+                  params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """
+        Perform a GET request against the Plex server.
+        Requests are admitted through the global upstream concurrency limit
+        and bounded by the current request's deadline.
+        """
+        headers = {**self.get_headers(token), "Accept": accept}
+        async with deadlines.upstream_deadline() as timeout:
+            async with self.upstream_slot():
+                with span("plex"):
+                    async with httpx.AsyncClient(transport=self.transport) as client:
+                        return await client.get(
+                            f"{self.base_url}{path}", headers=headers, params=params, timeout=timeout
+                        )
+
+    @asynccontextmanager
+    async def session(self):
+        """
+        Open a pooled client for a batch of requests, so they reuse
+        connections instead of opening one per request. Pass it to
+        `request(client=...)`.
+        """
+        limits = httpx.Limits(max_connections=self.max_concurrency, max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(transport=self.transport, limits=limits) as client:
+            yield client
+
+    async def request(self, method: str, path: str, token: str,
+                      params: Optional[Dict[str, Any]] = None,
+                      client: Optional[httpx.AsyncClient] = None) -> httpx.Response:
+        """
+        Perform a request with any method against the Plex server, on
+        `client` when given (see `session()`) or a new client otherwise.
+        Requests are admitted through the global upstream concurrency limit
+        and bounded by the current request's deadline.
+        """
+        async with deadlines.upstream_deadline() as timeout:
+            async with self.upstream_slot():
+                with span("plex"):
+                    if client is not None:
+                        return await client.request(
+                            method, f"{self.base_url}{path}", headers=self.get_headers(token),
+                            params=params, timeout=timeout
+                        )
+                    async with httpx.AsyncClient(transport=self.transport) as client:
+                        return await client.request(
+                            method, f"{self.base_url}{path}", headers=self.get_headers(token),
+                            params=params, timeout=timeout
+                        )
+
+    def decode(self, response: httpx.Response) -> Dict[str, Any]:
+        """
+        Decode a Plex response body (JSON or XML) into its MediaContainer dict
+        using the fastest available backend.
+        """
+        with span("parse"):
+            return decoding.decode(response.content)
+
     async def get_server_identity(self, token: str) -> Dict:
         """Get Plex server identity information"""
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f"{self.base_url}/identity",
-                    headers=self.get_headers(token)
+            response = await self.get("/identity", token)
+            
+            if response.status_code == 200:
+                return self.decode(response)
+            elif response.status_code == 401:
+                raise HTTPException(
+                    status_code=401,
+                    detail="Invalid Plex token"
+                )
+            else:
+                raise HTTPException(
+                    status_code=response.status_code,
+                    detail="Failed to connect to Plex server"
+                )
+                
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to connect to Plex server: {str(e)}"
+            )
+
+    async def get_libraries(self, token: str) -> List[Library]:
+        """Get all library sections"""
+        try:
+            response = await self.get("/library/sections", token)
+            
+            if response.status_code == 200:
+                container = self.decode(response)
+                with span("model"):
+                    return parse_entries(decoding.parse_library, container.get("Directory") or [], "library section")
+            elif response.status_code == 401:
+                raise HTTPException(
+                    status_code=401,
+                    detail="Invalid Plex token"
+                )
+            else:
+                raise HTTPException(
+                    status_code=response.status_code,
+                    detail="Failed to connect to Plex server"
+                )
+                
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to connect to Plex server: {str(e)}"
+            )
+        except decoding.PlexDecodeError as e:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Invalid response from Plex server: {str(e)}"
+            )
+
+    async def get_section_items(self, token: str, key: str) -> List[MediaItem]:
+        """
+        Get all items in a library section.
+        Large sections are fetched in pages of `upstream.page_size` items.
+        """
+        items: List[MediaItem] = []
+        start = 0
+        try:
+            while True:
+                response = await self.get(
+                    f"/library/sections/{key}/all",
+                    token,
+                    params={
+                        "X-Plex-Container-Start": start,
+                        "X-Plex-Container-Size": self.page_size
+                    }
                 )
                 
-                if response.status_code == 200:
-                    return response.json()["MediaContainer"]
-                elif response.status_code == 401:
+                if response.status_code == 401:
                     raise HTTPException(
                         status_code=401,
                         detail="Invalid Plex token"
                     )
-                else:
+                elif response.status_code == 404:
+                    raise HTTPException(
+                        status_code=404,
+                        detail=f"Library {key} not found"
+                    )
+                elif response.status_code != 200:
                     raise HTTPException(
                         status_code=response.status_code,
                         detail="Failed to connect to Plex server"
                     )
-                    
+                
+                container = self.decode(response)
+                page = container.get("Metadata") or []
+                with span("model"):
+                    items.extend(parse_entries(decoding.parse_item, page, "item"))
+                
+                start += len(page)
+                total = int(container.get("totalSize", start))
+                if len(page) < self.page_size or start >= total:
+                    return items
+                
         except httpx.RequestError as e:
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to connect to Plex server: {str(e)}"
             )
+        except decoding.PlexDecodeError as e:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Invalid response from Plex server: {str(e)}"
+            )
+
+    async def get_home_items(self, token: str, path: str, size: int) -> List[HomeItem]:
+        """
+        Get the first `size` items of a per-user listing such as
+        /library/onDeck or /library/recentlyAdded.
+        """
+        try:
+            response = await self.get(
+                path,
+                token,
+                params={"X-Plex-Container-Start": 0, "X-Plex-Container-Size": size}
+            )
+            
+            if response.status_code == 200:
+                container = self.decode(response)
+                with span("model"):
+                    return parse_entries(decoding.parse_home_item, (container.get("Metadata") or [])[:size], "item")
+            elif response.status_code == 401:
+                raise HTTPException(
+                    status_code=401,
+                    detail="Invalid Plex token"
+                )
+            else:
+                raise HTTPException(
+                    status_code=response.status_code,
+                    detail="Failed to connect to Plex server"
+                )
+                
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to connect to Plex server: {str(e)}"
+            )
+        except decoding.PlexDecodeError as e:
+            raise HTTPException(
+                status_code=502,
+                detail=f"Invalid response from Plex server: {str(e)}"
+            )
 
 # Create a singleton instance
-plex_service = PlexService() 
\ No newline at end of file
+plex_service = PlexService(transport=transport_from_config(config.recording_config)) 
\ No newline at end of file
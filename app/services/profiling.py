@@ -0,0 +1,166 @@
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+class TimingRecorder:
+    """Accumulates the duration of named phases for a single request"""
+    __slots__ = ("durations",)
+
+    def __init__(self):
+        self.durations: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float):
+        self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self, total: Optional[float] = None) -> str:
+        """Format the recorded phases as a Server-Timing header value"""
+        entries = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.durations.items()]
+        if total is not None:
+            entries.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(entries)
+
+
+# Recorder for the current request; None whenever timing is disabled
+_current_recorder: ContextVar[Optional[TimingRecorder]] = ContextVar("timing_recorder", default=None)
+
+
+class _Span:
+    __slots__ = ("recorder", "name", "started_at")
+
+    def __init__(self, recorder: TimingRecorder, name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.started_at = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.add(self.name, time.perf_counter() - self.started_at)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str):
+    """
+    Time a phase of the current request.
+
+    When no recorder is active this returns a shared no-op context manager,
+    so instrumented code costs a single context variable lookup.
+    """
+    recorder = _current_recorder.get()
+    if recorder is None:
+        return _NULL_SPAN
+    return _Span(recorder, name)
+
+
+class TimedJSONResponse(JSONResponse):
+    """JSON response that records its rendering time as the `serialize` phase"""
+
+    def render(self, content) -> bytes:
+        with span("serialize"):
+            return super().render(content)
+
+
+class ServerTimingMiddleware:
+    """
+    ASGI middleware that records timing spans for each request and returns
+    them in a Server-Timing response header.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        recorder = TimingRecorder()
+        reset_token = _current_recorder.set(recorder)
+        started_at = time.perf_counter()
+
+        async def send_with_timing(message: Message):
+            if message["type"] == "http.response.start":
+                value = recorder.server_timing(time.perf_counter() - started_at)
+                message["headers"] = [*message.get("headers", []), (b"server-timing", value.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current_recorder.reset(reset_token)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that periodically samples the stacks of all threads
+    from a background thread. Samples are aggregated in the folded-stack
+    format understood by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        self.samples.clear()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="clebarr-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != own_id:
+                    self.samples[self._fold(frame)] += 1
+
+    @staticmethod
+    def _fold(frame) -> str:
+        stack: List[str] = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+            frame = frame.f_back
+        return ";".join(reversed(stack))
+
+    def folded(self) -> str:
+        """Render collected samples as folded stacks, one `stack count` per line"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+
+# Process-wide profiler used by the admin endpoint
+profiler = SamplingProfiler()
@@ -0,0 +1,181 @@
+import asyncio
+import base64
+import gzip
+import json
+import time
+from collections import deque
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from ..logging import setup_logger
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+# Response headers kept in recordings; everything else is dropped
+RECORDED_HEADERS = ("content-type",)
+
+# Query parameters never written to, or matched against, a recording
+SECRET_PARAMS = frozenset({"x-plex-token"})
+
+
+def request_key(method: str, url: httpx.URL) -> Tuple[str, str, str, str]:
+    """Identify a request by method, host, path and query, without credentials"""
+    params = sorted(
+        (name, value) for name, value in url.params.multi_items() if name.lower() not in SECRET_PARAMS
+    )
+    return method.upper(), url.netloc.decode("ascii"), url.path, str(httpx.QueryParams(params))
+
+
+class TrafficRecorder:
+    """
+    Appends upstream exchanges to a gzip-compressed JSON Lines archive.
+    Each line holds the request (method, host, path, query), the response
+    (status, content type, body) and its timing relative to the start of
+    the recording. Plex tokens are never written.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.file = gzip.open(self.path, "at", encoding="utf-8")
+        self.started_at = time.monotonic()
+        self.count = 0
+
+    def record(self, request: httpx.Request, response: httpx.Response, body: bytes,
+               started_at: float, elapsed: float):
+        method, host, path, query = request_key(request.method, request.url)
+        entry = {
+            "method": method,
+            "host": host,
+            "path": path,
+            "query": query,
+            "status": response.status_code,
+            "headers": {name: response.headers[name] for name in RECORDED_HEADERS if name in response.headers},
+            "body": base64.b64encode(body).decode("ascii"),
+            "offset": round(started_at - self.started_at, 6),
+            "elapsed": round(elapsed, 6),
+        }
+        self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.count += 1
+
+    def close(self):
+        if not self.file.closed:
+            self.file.close()
+            logger.info(f"Recorded {self.count} upstream exchanges to {self.path}")
+
+
+def read_archive(path: str | Path) -> Iterator[Dict[str, Any]]:
+    """Iterate over the exchanges in a recording archive"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+class RecordingTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that forwards requests to a real transport and records
+    every exchange. Clients are created per request, so closing a client
+    leaves this transport (and its connection pool) open; call `close()`
+    once at shutdown.
+    """
+
+    def __init__(self, recorder: TrafficRecorder, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.recorder = recorder
+        self.transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started_at = time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        try:
+            body = await response.aread()
+        finally:
+            await response.aclose()
+        self.recorder.record(request, response, body, started_at, time.monotonic() - started_at)
+        # The body is already decoded, so framing and encoding headers no longer apply
+        headers = [
+            (name, value) for name, value in response.headers.multi_items()
+            if name.lower() not in ("content-encoding", "content-length", "transfer-encoding")
+        ]
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=headers,
+            content=body,
+            extensions=response.extensions
+        )
+
+    async def aclose(self):
+        pass
+
+    async def close(self):
+        await self.transport.aclose()
+        self.recorder.close()
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    """
+    httpx transport that answers requests from a recording, without any
+    network access. Requests are matched on method, host, path and query;
+    entries recorded without a host match any host. Repeated requests get
+    the recorded responses in order, wrapping around.
+
+    `speed` scales the recorded response times: 1.0 replays at recorded
+    speed, 2.0 twice as fast, and 0 without any delay.
+    """
+
+    def __init__(self, entries: List[Dict[str, Any]], speed: float = 1.0):
+        self.speed = speed
+        self.responses: Dict[Tuple[str, str, str, str], Deque[Dict[str, Any]]] = {}
+        for entry in entries:
+            key = (entry["method"], entry.get("host", ""), entry["path"], entry["query"])
+            self.responses.setdefault(key, deque()).append(entry)
+        self.served = 0
+        self.missed = 0
+
+    @classmethod
+    def load(cls, path: str | Path, speed: float = 1.0) -> "ReplayTransport":
+        transport = cls(list(read_archive(path)), speed=speed)
+        logger.info(f"Loaded {sum(map(len, transport.responses.values()))} recorded exchanges from {path}")
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        method, host, path, query = key = request_key(request.method, request.url)
+        recorded = self.responses.get(key) or self.responses.get((method, "", path, query))
+        if not recorded:
+            self.missed += 1
+            raise httpx.ConnectError(f"No recorded response for {method} {host}{path}?{query}", request=request)
+
+        entry = recorded[0]
+        recorded.rotate(-1)
+        if self.speed > 0 and entry["elapsed"] > 0:
+            await asyncio.sleep(entry["elapsed"] / self.speed)
+        self.served += 1
+        return httpx.Response(
+            status_code=entry["status"],
+            headers=entry["headers"],
+            content=base64.b64decode(entry["body"])
+        )
+
+    async def aclose(self):
+        pass
+
+    async def close(self):
+        pass
+
+
+def transport_from_config(recording_config: Dict[str, Any]) -> Optional[httpx.AsyncBaseTransport]:
+    """Build the upstream transport for the `recording` section of config.yaml"""
+    # An unquoted `off` in YAML loads as False
+    mode = recording_config["mode"] or "off"
+    if mode == "record":
+        logger.warning(f"Recording upstream Plex traffic to {recording_config['path']}")
+        return RecordingTransport(TrafficRecorder(recording_config["path"]))
+    if mode == "replay":
+        logger.warning(f"Replaying upstream Plex traffic from {recording_config['path']}")
+        return ReplayTransport.load(recording_config["path"], speed=recording_config["speed"])
+    if mode != "off":
+        raise ValueError(f"Unknown recording mode '{mode}'; expected off, record or replay")
+    return None
@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from ..config import config
+from ..logging import setup_logger
+from ..models import Library
+from . import decoding
+from .change_feed import ChangeFeed, change_feed
+from .plex import PlexService, plex_service
+from .smart_index import SectionIndex, compile_rule, select
+
+# Set up logger for this module
+logger = setup_logger(__name__)
+
+# Plex metadata type numbers used when creating collections
+PLEX_TYPES = {"movie": 1, "show": 2, "season": 3, "episode": 4, "artist": 8, "album": 9, "track": 10}
+
+# Playlist kinds by item type
+PLAYLIST_TYPES = {"movie": "video", "show": "video", "season": "video", "episode": "video",
+                  "artist": "audio", "album": "audio", "track": "audio", "photo": "photo"}
+
+
+class SmartCollectionService:
+    """
+    Evaluates rule-based collections against a local index of library items
+    and pushes the results to Plex.
+
+    Item metadata comes from the change feed's section snapshots, which are
+    per user, so rules see the caller's own watch state and only the items
+    they can access. Each snapshot's SectionIndex is rebuilt only when the
+    snapshot's version moves, and dropped once the feed evicts it.
+    """
+
+    def __init__(self, plex: PlexService, feed: ChangeFeed, batch_size: int):
+        self.plex = plex
+        self.feed = feed
+        self.batch_size = batch_size
+        # Indexes by snapshot id
+        self.indexes: Dict[str, Tuple[int, SectionIndex]] = {}
+        self.build_lock = asyncio.Lock()
+
+    async def index(self, token: str, library: Library) -> SectionIndex:
+        snapshot = await self.feed.refresh(library, token, lambda: self.plex.get_section_items(token, library.key))
+        cached = self.indexes.get(snapshot.id)
+        if cached is not None and cached[0] == snapshot.version:
+            return cached[1]
+
+        # Builds are CPU-bound: run them off the event loop, one at a time
+        async with self.build_lock:
+            cached = self.indexes.get(snapshot.id)
+            if cached is None or cached[0] != snapshot.version:
+                started = time.perf_counter()
+                version, store = snapshot.version, snapshot.store
+                index = await asyncio.get_running_loop().run_in_executor(None, SectionIndex, store)
+                cached = self.indexes[snapshot.id] = (version, index)
+                live = {section.id for section in self.feed.sections.values()}
+                for snapshot_id in [snapshot_id for snapshot_id in self.indexes if snapshot_id not in live]:
+                    del self.indexes[snapshot_id]
+                logger.info(
+                    f"Indexed {index.size} items of library {library.key} "
+                    f"in {(time.perf_counter() - started) * 1000:.0f}ms"
+                )
+        return cached[1]
+
+    async def indexes_for(self, token: str, library_keys: List[str]) -> List[Tuple[Library, SectionIndex]]:
+        libraries = {library.key: library for library in await self.plex.get_libraries(token)}
+        missing = [key for key in library_keys if key not in libraries]
+        if missing:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Library {', '.join(missing)} not found"
+            )
+        return [(libraries[key], await self.index(token, libraries[key])) for key in library_keys]
+
+    @staticmethod
+    def evaluate(indexes: List[Tuple[Library, SectionIndex]], rule: Dict[str, Any],
+                 sort: Optional[str] = None, limit: Optional[int] = None) -> List[Tuple[str, str, str]]:
+        """
+        Evaluate a rule over the given section indexes.
+
+        Returns:
+            List[Tuple[str, str, str]]: (library key, rating key, item type) per match
+        """
+        evaluate = compile_rule(rule)
+        matches: List[Tuple[Any, str, str, str]] = []
+        for library, index in indexes:
+            types = index.store.interned["type"]
+            lookup = index.store.strings.values
+            for value, rating_key in select(index, evaluate(index), sort):
+                item_type = lookup[types[index.store.row_of(rating_key)]]
+                matches.append((value, library.key, rating_key, item_type))
+
+        if sort and len(indexes) > 1:
+            descending = sort.endswith(":desc")
+            present = [match for match in matches if match[0] is not None]
+            present.sort(key=lambda match: match[0], reverse=descending)
+            matches = present + [match for match in matches if match[0] is None]
+        if limit is not None:
+            matches = matches[:limit]
+        return [(library_key, rating_key, item_type) for _, library_key, rating_key, item_type in matches]
+
+    def batches(self, rating_keys: List[str]) -> List[List[str]]:
+        return [rating_keys[i:i + self.batch_size] for i in range(0, len(rating_keys), self.batch_size)]
+
+    @staticmethod
+    def items_uri(machine_identifier: str, rating_keys: List[str]) -> str:
+        return (
+            f"server://{machine_identifier}/com.plexapp.plugins.library"
+            f"/library/metadata/{','.join(rating_keys)}"
+        )
+
+    async def write(self, method: str, path: str, token: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        try:
+            response = await self.plex.request(method, path, token, params=params)
+        except httpx.RequestError as e:
+            raise HTTPException(
+                status_code=500,
+                detail=f"Failed to connect to Plex server: {str(e)}"
+            )
+        if response.status_code == 401:
+            raise HTTPException(
+                status_code=401,
+                detail="Invalid Plex token"
+            )
+        if response.status_code not in (200, 201):
+            raise HTTPException(
+                status_code=502,
+                detail=f"Plex rejected {method} {path} (Status: {response.status_code})"
+            )
+        try:
+            return self.plex.decode(response)
+        except decoding.PlexDecodeError:
+            return {}
+
+    async def push(self, token: str, target: str, title: str,
+                   matches: List[Tuple[str, str, str]]) -> List[Dict[str, Any]]:
+        """
+        Create a Plex collection (one per library) or a playlist containing
+        the matched items. The first batch of items creates the container and
+        later batches are appended to it, keeping each request URL bounded.
+        """
+        machine_identifier = (await self.plex.get_server_identity(token))["machineIdentifier"]
+
+        if target == "collection":
+            groups: Dict[str, List[Tuple[str, str]]] = {}
+            for library_key, rating_key, item_type in matches:
+                groups.setdefault(library_key, []).append((rating_key, item_type))
+            created = []
+            for library_key, group in groups.items():
+                item_type = Counter(item_type for _, item_type in group).most_common(1)[0][0]
+                rating_keys = [rating_key for rating_key, _ in group]
+                created.append(await self.push_batches(
+                    token, machine_identifier, rating_keys,
+                    create=("/library/collections", {
+                        "type": PLEX_TYPES.get(item_type, 1), "title": title, "smart": 0, "sectionId": library_key
+                    }),
+                    append_path="/library/collections/{key}/items",
+                    library_key=library_key
+                ))
+            return created
+
+        item_type = Counter(item_type for _, _, item_type in matches).most_common(1)[0][0]
+        return [await self.push_batches(
+            token, machine_identifier, [rating_key for _, rating_key, _ in matches],
+            create=("/playlists", {"type": PLAYLIST_TYPES.get(item_type, "video"), "title": title, "smart": 0}),
+            append_path="/playlists/{key}/items",
+            library_key=None
+        )]
+
+    async def push_batches(self, token: str, machine_identifier: str, rating_keys: List[str],
+                           create: Tuple[str, Dict[str, Any]], append_path: str,
+                           library_key: Optional[str]) -> Dict[str, Any]:
+        batches = self.batches(rating_keys)
+        create_path, create_params = create
+        container = await self.write("POST", create_path, token, {
+            **create_params, "uri": self.items_uri(machine_identifier, batches[0])
+        })
+        created = (container.get("Metadata") or [{}])[0]
+        key = str(created.get("ratingKey", ""))
+        if not key:
+            raise HTTPException(
+                status_code=502,
+                detail="Plex did not return the created collection"
+            )
+        for batch in batches[1:]:
+            await self.write("PUT", append_path.format(key=key), token, {
+                "uri": self.items_uri(machine_identifier, batch)
+            })
+        logger.info(f"Pushed {len(rating_keys)} items to {create_path} {key} in {len(batches)} requests")
+        return {"library_key": library_key, "rating_key": key, "item_count": len(rating_keys)}
+
+
+# Create a singleton instance
+smart_collection_service = SmartCollectionService(
+    plex_service, change_feed, batch_size=config.smart_collections_config["batch_size"]
+)
@@ -0,0 +1,271 @@
+import math
+import re
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from .item_store import MISSING_INT, ItemStore
+
+# Fields usable in rules, by index kind
+CATEGORICAL_FIELDS = ("type", "library_section_id", "content_rating",
+                      "video_resolution", "video_codec", "audio_codec")
+NUMERIC_FIELDS = ("year", "view_count", "duration", "added_at", "updated_at",
+                  "rating", "audience_rating")
+MULTI_VALUE_FIELDS = ("genres",)
+TIMESTAMP_FIELDS = frozenset({"added_at", "updated_at"})
+
+COMPARISON_OPS = ("gt", "gte", "lt", "lte")
+EQUALITY_OPS = ("eq", "ne", "in")
+
+# Relative times such as "-30d" in timestamp comparisons
+RELATIVE_TIME = re.compile(r"^-(\d+)([mhdw])$")
+RELATIVE_UNITS = {"m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+class RuleError(ValueError):
+    """Raised when a smart collection rule is invalid"""
+
+
+def bitmap_from_rows(rows, size: int) -> int:
+    """Build a bitmap (a Python int, bit i = row i) from row numbers"""
+    bits = bytearray((size + 7) // 8)
+    for row in rows:
+        bits[row >> 3] |= 1 << (row & 7)
+    return int.from_bytes(bits, "little")
+
+
+def rows_from_bitmap(bitmap: int) -> List[int]:
+    """List the row numbers set in a bitmap, in ascending order"""
+    rows = []
+    data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, "little")
+    for byte_index, byte in enumerate(data):
+        while byte:
+            low = byte & -byte
+            rows.append((byte_index << 3) + low.bit_length() - 1)
+            byte ^= low
+    return rows
+
+
+class SortedColumn:
+    """
+    A numeric column kept in sorted order, with a bounded number of prefix
+    bitmaps (at most `max_prefixes`, one every `block` positions) so that
+    any range of values becomes a bitmap with one XOR plus at most two
+    partial blocks. Bounding the prefixes keeps memory and build time linear
+    in the section size: N/8 bytes per prefix.
+    """
+
+    def __init__(self, values, size: int, max_prefixes: int = 32, min_block: int = 1024):
+        present = [(value, row) for row, value in enumerate(values) if value is not None]
+        present.sort()
+        self.values = [value for value, _ in present]
+        self.rows = array("I", (row for _, row in present))
+        self.block = max(min_block, math.ceil(len(self.rows) / max_prefixes))
+        self.size = size
+
+        self.prefixes = [0]
+        bits = bytearray((size + 7) // 8)
+        for position, row in enumerate(self.rows, 1):
+            bits[row >> 3] |= 1 << (row & 7)
+            if position % self.block == 0:
+                self.prefixes.append(int.from_bytes(bits, "little"))
+
+    def _prefix(self, position: int) -> int:
+        """Bitmap of the rows at sorted positions [0, position)"""
+        block_index = position // self.block
+        bitmap = self.prefixes[block_index]
+        start = block_index * self.block
+        if position > start:
+            bitmap |= bitmap_from_rows(self.rows[start:position], self.size)
+        return bitmap
+
+    def between(self, low: int, high: int) -> int:
+        """Bitmap of the rows at sorted positions [low, high)"""
+        if low >= high:
+            return 0
+        return self._prefix(high) ^ self._prefix(low)
+
+    def compare(self, op: str, value: float) -> int:
+        if op == "gt":
+            return self.between(bisect_right(self.values, value), len(self.values))
+        if op == "gte":
+            return self.between(bisect_left(self.values, value), len(self.values))
+        if op == "lt":
+            return self.between(0, bisect_left(self.values, value))
+        if op == "lte":
+            return self.between(0, bisect_right(self.values, value))
+        if op == "eq":
+            return self.between(bisect_left(self.values, value), bisect_right(self.values, value))
+        raise RuleError(f"Unsupported operator '{op}' for numeric fields")
+
+
+class SectionIndex:
+    """
+    Precomputed per-field indexes over one section's ItemStore: a bitmap per
+    distinct value for categorical and multi-valued fields, and a sorted
+    column with prefix bitmaps for numeric fields.
+    """
+
+    def __init__(self, store: ItemStore):
+        self.store = store
+        self.size = len(store)
+        self.universe = (1 << self.size) - 1
+        self.categorical: Dict[str, Dict[Optional[str], int]] = {}
+        self.numeric: Dict[str, SortedColumn] = {}
+
+        for name in CATEGORICAL_FIELDS:
+            lookup = store.strings.values
+            rows_by_value: Dict[Optional[str], List[int]] = {}
+            for row, string_id in enumerate(store.interned[name]):
+                rows_by_value.setdefault(lookup[string_id], []).append(row)
+            self.categorical[name] = {
+                value: bitmap_from_rows(rows, self.size) for value, rows in rows_by_value.items()
+            }
+
+        genre_rows: Dict[Optional[str], List[int]] = {}
+        for row in range(self.size):
+            for genre in store.genres(row):
+                genre_rows.setdefault(genre, []).append(row)
+        self.categorical["genres"] = {
+            value: bitmap_from_rows(rows, self.size) for value, rows in genre_rows.items()
+        }
+
+        for name in NUMERIC_FIELDS:
+            column = store.ints.get(name)
+            if column is not None:
+                values = (None if value == MISSING_INT else value for value in column)
+            else:
+                values = (None if math.isnan(value) else value for value in store.floats[name])
+            self.numeric[name] = SortedColumn(list(values), self.size)
+
+    def rating_keys(self, bitmap: int) -> List[str]:
+        keys = self.store.unique["rating_key"]
+        return [keys[row] for row in rows_from_bitmap(bitmap)]
+
+
+def _resolve_value(field: str, value: Any, now: float) -> Any:
+    if field in TIMESTAMP_FIELDS and isinstance(value, str):
+        match = RELATIVE_TIME.match(value.strip())
+        if not match:
+            raise RuleError(f"Invalid relative time '{value}' for {field}; expected e.g. '-30d'")
+        return int(now) - int(match.group(1)) * RELATIVE_UNITS[match.group(2)]
+    if field in NUMERIC_FIELDS:
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise RuleError(f"Field {field} requires a numeric value")
+    return value
+
+
+def compile_rule(rule: Dict[str, Any], now: Optional[float] = None) -> Callable[[SectionIndex], int]:
+    """
+    Compile a rule into a function mapping a SectionIndex to a bitmap of
+    matching rows. Rules are nested JSON objects:
+
+        {"all": [rule, ...]}, {"any": [rule, ...]}, {"not": rule}
+        {"field": "rating", "op": "gt", "value": 7}
+
+    Timestamp fields accept relative values such as "-30d".
+    """
+    now = time.time() if now is None else now
+    if not isinstance(rule, dict):
+        raise RuleError("Each rule must be an object")
+
+    if "all" in rule or "any" in rule:
+        combinator = "all" if "all" in rule else "any"
+        children = rule[combinator]
+        if not isinstance(children, list) or not children:
+            raise RuleError(f"'{combinator}' requires a non-empty list of rules")
+        compiled = [compile_rule(child, now) for child in children]
+        if combinator == "all":
+            def evaluate_all(index: SectionIndex) -> int:
+                bitmap = index.universe
+                for child in compiled:
+                    bitmap &= child(index)
+                    if not bitmap:
+                        break
+                return bitmap
+            return evaluate_all
+
+        def evaluate_any(index: SectionIndex) -> int:
+            bitmap = 0
+            for child in compiled:
+                bitmap |= child(index)
+            return bitmap
+        return evaluate_any
+
+    if "not" in rule:
+        inner = compile_rule(rule["not"], now)
+        return lambda index: index.universe & ~inner(index)
+
+    field, op, value = rule.get("field"), rule.get("op", "eq"), rule.get("value")
+    if field in CATEGORICAL_FIELDS or field in MULTI_VALUE_FIELDS:
+        if op not in EQUALITY_OPS:
+            raise RuleError(f"Unsupported operator '{op}' for field {field}")
+        values = value if op == "in" else [value]
+        if not isinstance(values, list):
+            raise RuleError("'in' requires a list of values")
+        if not all(candidate is None or isinstance(candidate, str) for candidate in values):
+            raise RuleError(f"Field {field} requires string values")
+
+        def evaluate_categorical(index: SectionIndex) -> int:
+            bitmaps = index.categorical[field]
+            bitmap = 0
+            for candidate in values:
+                bitmap |= bitmaps.get(candidate, 0)
+            return index.universe & ~bitmap if op == "ne" else bitmap
+        return evaluate_categorical
+
+    if field in NUMERIC_FIELDS:
+        if op == "in":
+            if not isinstance(value, list):
+                raise RuleError("'in' requires a list of values")
+            resolved_values = [_resolve_value(field, v, now) for v in value]
+            return lambda index: _any(index.numeric[field].compare("eq", v) for v in resolved_values)
+        if op not in COMPARISON_OPS + ("eq", "ne"):
+            raise RuleError(f"Unsupported operator '{op}' for field {field}")
+        resolved = _resolve_value(field, value, now)
+        if op == "ne":
+            return lambda index: index.universe & ~index.numeric[field].compare("eq", resolved)
+        return lambda index: index.numeric[field].compare(op, resolved)
+
+    raise RuleError(f"Unknown field '{field}'")
+
+
+def _any(bitmaps) -> int:
+    result = 0
+    for bitmap in bitmaps:
+        result |= bitmap
+    return result
+
+
+def sort_key(sort: Optional[str]) -> Tuple[Optional[str], bool]:
+    """Parse a sort spec such as 'added_at:desc'"""
+    if not sort:
+        return None, False
+    field, _, direction = sort.partition(":")
+    if field not in NUMERIC_FIELDS:
+        raise RuleError(f"Cannot sort by '{field}'; sortable fields are {', '.join(NUMERIC_FIELDS)}")
+    if direction not in ("", "asc", "desc"):
+        raise RuleError(f"Invalid sort direction '{direction}'")
+    return field, direction == "desc"
+
+
+def select(index: SectionIndex, bitmap: int, sort: Optional[str] = None) -> List[Tuple[Any, str]]:
+    """
+    Get (sort value, rating key) pairs for the rows in `bitmap`.
+    Items without a value for the sort field sort last.
+    """
+    field, descending = sort_key(sort)
+    keys = index.store.unique["rating_key"]
+    matched = rows_from_bitmap(bitmap)
+    if field is None:
+        return [(None, keys[row]) for row in matched]
+
+    column = index.numeric[field]
+    matched_rows = set(matched)
+    ordered = [(value, row) for value, row in zip(column.values, column.rows) if row in matched_rows]
+    if descending:
+        ordered.reverse()
+    with_values = {row for _, row in ordered}
+    ordered.extend((None, row) for row in matched if row not in with_values)
+    return [(value, keys[row]) for value, row in ordered]
@@ -0,0 +1,146 @@
+"""
+Compare Plex response decoding backends on synthetic section and item payloads.
+
+Usage:
+    python -m benchmarks.bench_decoding [--items 50000] [--sections 200] [--repeat 5]
+"""
+import argparse
+import json
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, List
+from xml.sax.saxutils import quoteattr
+
+from app.services import decoding
+
+GENRES = ["Action", "Comedy", "Drama", "Horror", "Science Fiction", "Thriller"]
+
+
+def section_entries(count: int) -> List[Dict]:
+    return [
+        {
+            "key": str(i), "title": f"Library {i}", "type": "movie",
+            "agent": "tv.plex.agents.movie", "scanner": "Plex Movie", "language": "en-US",
+            "uuid": f"uuid-{i}", "updatedAt": 1700000000 + i, "createdAt": 1600000000,
+            "scannedAt": 1700000000 + i,
+        }
+        for i in range(count)
+    ]
+
+
+def item_entries(count: int) -> List[Dict]:
+    return [
+        {
+            "ratingKey": str(i), "title": f"Movie {i}", "type": "movie", "year": 1950 + i % 75,
+            "rating": round(i % 100 / 10, 1), "viewCount": i % 3,
+            "addedAt": 1600000000 + i, "updatedAt": 1700000000 + i, "duration": 5400000,
+            "Media": [{
+                "videoResolution": ["720", "1080", "4k"][i % 3], "videoCodec": "h264",
+                "audioCodec": "aac", "Part": [{"file": f"/media/movies/Movie {i}.mkv", "size": 4 << 30}],
+            }],
+            "Genre": [{"tag": GENRES[i % len(GENRES)]}, {"tag": GENRES[(i + 1) % len(GENRES)]}],
+        }
+        for i in range(count)
+    ]
+
+
+def to_json(key: str, entries: List[Dict]) -> bytes:
+    return json.dumps({"MediaContainer": {"size": len(entries), key: entries}}).encode()
+
+
+def _attrs(entry: Dict) -> str:
+    return " ".join(f"{k}={quoteattr(str(v))}" for k, v in entry.items() if not isinstance(v, list))
+
+
+def to_xml(tag: str, entries: List[Dict]) -> bytes:
+    lines = [f'<?xml version="1.0" encoding="UTF-8"?>\n<MediaContainer size="{len(entries)}">']
+    for entry in entries:
+        children = []
+        for media in entry.get("Media", []):
+            parts = "".join(f"<Part {_attrs(part)} />" for part in media["Part"])
+            children.append(f"<Media {_attrs(media)}>{parts}</Media>")
+        children.extend(f"<Genre {_attrs(genre)} />" for genre in entry.get("Genre", []))
+        lines.append(f"<{tag} {_attrs(entry)}>{''.join(children)}</{tag}>")
+    lines.append("</MediaContainer>")
+    return "\n".join(lines).encode()
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def json_backends() -> Dict[str, Callable[[bytes], object]]:
+    backends = {"json": json.loads}
+    try:
+        import orjson
+        backends["orjson"] = orjson.loads
+    except ImportError:
+        pass
+    try:
+        import msgspec
+        backends["msgspec"] = msgspec.json.decode
+    except ImportError:
+        pass
+    return backends
+
+
+def xml_backends() -> Dict[str, object]:
+    backends = {"etree": ET}
+    try:
+        from lxml import etree
+        backends["lxml"] = etree
+    except ImportError:
+        pass
+    return backends
+
+
+def bench_payload(name: str, json_payload: bytes, xml_payload: bytes, key: str,
+                  mapper: Callable[[Dict], object], repeat: int):
+    print(f"\n{name}: json {len(json_payload) / 1e6:.1f} MB, xml {len(xml_payload) / 1e6:.1f} MB")
+    print(f"{'backend':<28}{'decode (ms)':>14}{'decode+map (ms)':>18}")
+
+    def report(label: str, decode: Callable[[], Dict]):
+        decode_only = timed(decode, repeat)
+        with_models = timed(lambda: [mapper(entry) for entry in decode()[key]], repeat)
+        print(f"{label:<28}{decode_only * 1000:>14.1f}{with_models * 1000:>18.1f}")
+
+    for label, loads in json_backends().items():
+        report(f"json/{label}", lambda loads=loads: loads(json_payload)["MediaContainer"])
+
+    # The previous code path: build the whole tree, reading top-level attributes only
+    report("xml/etree fromstring", lambda: {key: [dict(e.attrib) for e in ET.fromstring(xml_payload)]})
+
+    original = decoding.xml_etree
+    try:
+        for label, module in xml_backends().items():
+            decoding.xml_etree = module
+            report(f"xml/{label} iterparse", lambda: decoding.decode_xml(xml_payload)["MediaContainer"])
+    finally:
+        decoding.xml_etree = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=50000)
+    parser.add_argument("--sections", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"Selected backends: json={decoding.JSON_BACKEND}, xml={decoding.XML_BACKEND}")
+
+    sections = section_entries(args.sections)
+    bench_payload(f"{args.sections} sections", to_json("Directory", sections),
+                  to_xml("Directory", sections), "Directory", decoding.parse_library, args.repeat)
+
+    items = item_entries(args.items)
+    bench_payload(f"{args.items} items", to_json("Metadata", items),
+                  to_xml("Video", items), "Metadata", decoding.parse_item, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Measure the memory cost per cached item: pydantic models vs the compact ItemStore.
+
+Usage:
+    python -m benchmarks.bench_item_memory [--items 100000]
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from app.models import MediaItem
+from app.services.decoding import parse_item
+from app.services.item_store import ItemStore
+
+from .bench_decoding import item_entries
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - started
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=100000)
+    args = parser.parse_args()
+
+    # Decode up front so only the retained representation is measured
+    items = [parse_item(entry) for entry in item_entries(args.items)]
+    # Each representation is built from fresh copies so neither shares strings with `items`
+    payloads = [item.model_dump_json() for item in items]
+    models, model_bytes, model_time = measure(
+        lambda: [MediaItem.model_validate_json(payload) for payload in payloads]
+    )
+    del models
+    store, store_bytes, store_time = measure(
+        lambda: ItemStore.from_items(MediaItem.model_validate_json(payload) for payload in payloads)
+    )
+
+    print(f"{args.items} items")
+    print(f"{'representation':<24}{'bytes/item':>12}{'total (MB)':>12}{'build (s)':>12}")
+    print(f"{'MediaItem list':<24}{model_bytes / args.items:>12.0f}{model_bytes / 1e6:>12.1f}{model_time:>12.2f}")
+    print(f"{'ItemStore':<24}{store_bytes / args.items:>12.0f}{store_bytes / 1e6:>12.1f}{store_time:>12.2f}")
+    print(f"Interned strings: {len(store.strings)}")
+
+    started = time.perf_counter()
+    for _ in store:
+        pass
+    print(f"Materialising all items as MediaItem: {time.perf_counter() - started:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
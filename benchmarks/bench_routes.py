@@ -0,0 +1,135 @@
+"""
+Load-test the /server routes against recorded (or synthetic) Plex traffic, without a Plex server.
+
+Usage:
+    python -m benchmarks.bench_routes [--archive recordings/plex.jsonl.gz] [--speed 1.0]
+                                      [--requests 200] [--concurrency 16]
+
+Without --archive, a synthetic recording with --sections libraries of --items
+items each is generated, with --latency-ms of simulated Plex response time.
+Record a real archive by running Clebarr with `recording.mode: record`.
+"""
+import argparse
+import asyncio
+import base64
+import json
+import statistics
+import time
+from collections import defaultdict
+from typing import Dict, List
+
+import httpx
+from fastapi import FastAPI
+
+from app.routers import server
+from app.services.plex import plex_service
+from app.services.recording import ReplayTransport, request_key
+
+from .bench_decoding import item_entries, section_entries
+
+
+def exchange(path: str, params: Dict, payload: Dict, elapsed: float) -> Dict:
+    # Relative URLs have no host, so the entries match any Plex server
+    method, host, path, query = request_key("GET", httpx.URL(path, params=params))
+    return {
+        "method": method, "host": host, "path": path, "query": query, "status": 200,
+        "headers": {"content-type": "application/json"},
+        "body": base64.b64encode(json.dumps({"MediaContainer": payload}).encode()).decode("ascii"),
+        "offset": 0.0, "elapsed": elapsed,
+    }
+
+
+def synthetic_recording(sections: int, items: int, latency: float) -> List[Dict]:
+    """Recorded exchanges for /identity, /library/sections and every section listing"""
+    entries = [
+        exchange("/identity", {}, {"machineIdentifier": "bench", "version": "1.40.0", "claimed": True}, latency),
+        exchange("/library/sections", {}, {"size": sections, "Directory": section_entries(sections)}, latency),
+    ]
+    metadata = item_entries(items)
+    for key in range(sections):
+        for start in range(0, max(items, 1), plex_service.page_size):
+            page = metadata[start:start + plex_service.page_size]
+            params = {"X-Plex-Container-Start": start, "X-Plex-Container-Size": plex_service.page_size}
+            entries.append(exchange(
+                f"/library/sections/{key}/all", params,
+                {"size": len(page), "totalSize": items, "Metadata": page}, latency
+            ))
+    return entries
+
+
+def route_paths(transport: ReplayTransport) -> List[str]:
+    """The /server routes whose upstream calls are all in the recording"""
+    recorded = {path for _, _, path, _ in transport.responses}
+    paths = [route for route, upstream in (("/server/info", "/identity"),
+                                           ("/server/libraries", "/library/sections")) if upstream in recorded]
+    paths.extend(
+        f"/server/libraries/{path.split('/')[3]}/items"
+        for path in sorted(recorded) if path.startswith("/library/sections/") and path.endswith("/all")
+    )
+    return paths
+
+
+async def run(paths: List[str], requests: int, concurrency: int) -> Dict[str, List[float]]:
+    app = FastAPI()
+    app.include_router(server.router)
+    latencies: Dict[str, List[float]] = defaultdict(list)
+    queue: asyncio.Queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(paths[i % len(paths)])
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench",
+                                 headers={"X-Plex-Token": "bench"}) as client:
+        async def worker():
+            while not queue.empty():
+                path = queue.get_nowait()
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies[path].append(time.perf_counter() - started)
+                if response.status_code != 200:
+                    raise RuntimeError(f"{path} returned {response.status_code}: {response.text[:200]}")
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--archive", help="Recording to replay (default: synthetic)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Replay speed; 0 for no upstream delay")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--sections", type=int, default=3)
+    parser.add_argument("--items", type=int, default=5000)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    if args.archive:
+        transport = ReplayTransport.load(args.archive, speed=args.speed)
+    else:
+        entries = synthetic_recording(args.sections, args.items, args.latency_ms / 1000)
+        transport = ReplayTransport(entries, speed=args.speed)
+    plex_service.transport = transport
+
+    paths = route_paths(transport)
+    started = time.perf_counter()
+    latencies = asyncio.run(run(paths, args.requests, args.concurrency))
+    elapsed = time.perf_counter() - started
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, replay speed {args.speed}")
+    print(f"{'route':<36}{'count':>7}{'mean (ms)':>12}{'p50 (ms)':>11}{'p95 (ms)':>11}{'p99 (ms)':>11}")
+    for path in paths:
+        values = latencies[path]
+        print(f"{path:<36}{len(values):>7}{statistics.mean(values) * 1000:>12.1f}"
+              f"{percentile(values, 0.5) * 1000:>11.1f}{percentile(values, 0.95) * 1000:>11.1f}"
+              f"{percentile(values, 0.99) * 1000:>11.1f}")
+    print(f"\n{args.requests / elapsed:.1f} requests/s; {transport.served} upstream responses replayed, "
+          f"{transport.missed} missing from the recording")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import asyncio
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from app.models import MediaItem, MetadataEdit
+from app.routers.metadata import router
+from app.services.bulk_edit import AdaptiveConcurrencyLimit, BulkEditor, coalesce, plan_batches
+from app.services.change_feed import ChangeFeed
+from app.services.item_store import ItemStore
+from app.services.plex import PlexService
+
+app = FastAPI()
+app.include_router(router)
+
+BULK_EDIT_CONFIG = {
+    "max_batch_size": 100,
+    "initial_concurrency": 2,
+    "max_concurrency": 8,
+    "target_latency_ms": 1000,
+    "max_retries": 2,
+    "max_jobs": 5,
+}
+
+def make_store(count=10):
+    return ItemStore.from_items([
+        MediaItem(rating_key=str(i), title=f"Item {i}", type="movie" if i % 2 else "show")
+        for i in range(count)
+    ])
+
+def make_editor(handler):
+    """An editor writing to a stand-in Plex server"""
+    plex = PlexService("http://plex:32400", transport=httpx.MockTransport(handler))
+    editor = BulkEditor(BULK_EDIT_CONFIG, plex, ChangeFeed(100, 300))
+    editor.retry_backoff = 0
+    return editor
+
+def recording_handler(requests, statuses=None, labels=None):
+    """A stand-in Plex server; `labels` holds the current labels of the items it knows"""
+    statuses = list(statuses or [])
+
+    def handler(request):
+        requests.append(request)
+        if request.method == "GET" and request.url.path.startswith("/library/metadata/"):
+            keys = request.url.path.rsplit("/", 1)[1].split(",")
+            metadata = [
+                {"ratingKey": key, "Label": [{"tag": tag} for tag in labels[key]], "Genre": [{"tag": "Drama"}]}
+                for key in keys if key in labels
+            ]
+            return httpx.Response(200, json={"MediaContainer": {"size": len(metadata), "Metadata": metadata}})
+        return httpx.Response(statuses.pop(0) if statuses else 200)
+    return handler
+
+def test_coalesce_merges_edits_in_order():
+    """Test that later edits to an item override or cancel earlier ones"""
+    changes = coalesce([
+        MetadataEdit(rating_key="1", title="Old", add_labels=["a", "b"]),
+        MetadataEdit(rating_key="2", add_genres=["Drama"]),
+        MetadataEdit(rating_key="1", title="New", remove_labels=["b"], title_sort="New, The"),
+    ])
+    assert list(changes) == ["1", "2"]
+    assert changes["1"].params(lock=True) == (
+        ("title.value", "New"), ("title.locked", "1"),
+        ("titleSort.value", "New, The"), ("titleSort.locked", "1"),
+        ("label[0].tag.tag", "a"), ("label[].tag.tag-", "b"), ("label.locked", "1"),
+    )
+    # Added tags are sent along with the item's current ones, which Plex would otherwise drop
+    assert changes["1"].params(lock=False, current={"label": ("b", "Kids"), "genre": ("Drama",)}) == (
+        ("title.value", "New"), ("titleSort.value", "New, The"),
+        ("label[0].tag.tag", "Kids"), ("label[1].tag.tag", "a"), ("label[].tag.tag-", "b"),
+    )
+    assert changes["2"].params(lock=False) == (("genre[0].tag.tag", "Drama"),)
+
+def test_identical_writes_are_batched():
+    """Test that items are batched per item type and resulting tag list"""
+    edits = [MetadataEdit(rating_key=str(i), add_labels=["Remaster"]) for i in range(250)]
+    edits.append(MetadataEdit(rating_key="999", title="Unique"))
+    changes = coalesce(edits)
+    types = {key: 1 for key in changes}
+    current = {str(i): {"label": ("Kids",)} for i in range(250)}
+    batches = plan_batches(changes, types, lock=True, max_batch_size=100, current=current)
+    assert [len(batch.rating_keys) for batch in batches] == [100, 100, 50, 1]
+
+    # Items with other current tags end up with other tag lists
+    current["0"] = {"label": ("Classics",)}
+    batches = plan_batches(changes, types, lock=True, max_batch_size=100, current=current)
+    assert [len(batch.rating_keys) for batch in batches] == [1, 100, 100, 49, 1]
+    types["1"] = 2
+    assert len(plan_batches(changes, types, lock=True, max_batch_size=100, current=current)) == 6
+
+def test_adaptive_limit():
+    """Test additive increase on fast responses and multiplicative decrease on slow ones"""
+    limit = AdaptiveConcurrencyLimit(initial=4, maximum=8, target_latency=1.0)
+    for _ in range(4):
+        limit.record(0.1, now=10.0)
+    assert limit.limit == pytest.approx(4.9, abs=0.05)
+
+    limit.record(2.0, now=20.0)
+    assert limit.limit == pytest.approx(2.45, abs=0.05)
+    # At most one decrease per round trip
+    limit.record(2.0, now=21.0)
+    assert limit.limit == pytest.approx(2.45, abs=0.05)
+    limit.record(0.5, overloaded=True, now=23.0)
+    assert limit.limit == pytest.approx(1.22, abs=0.05)
+
+    for _ in range(100):
+        limit.record(0.1)
+    assert limit.limit == 8
+
+@pytest.mark.asyncio
+async def test_job_applies_batched_writes():
+    """Test a job end to end: tag reads, batched writes, per-item results and unknown items"""
+    requests = []
+    labels = {"1": ["Kids"], "3": ["Kids"], "5": ["Kids"], "7": ["Kids"], "9": []}
+    editor = make_editor(recording_handler(requests, labels=labels))
+    edits = [MetadataEdit(rating_key=str(i), add_labels=["Remaster"]) for i in range(1, 12, 2)]
+    edits += [MetadataEdit(rating_key="2", title_sort="Show, The"), MetadataEdit(rating_key="missing", title="x")]
+    job = editor.start("test-token", "1", edits, make_store(12))
+    await job.task
+
+    assert job.status == "completed"
+    # One read of current tags, then three writes
+    assert job.requests == 4
+    assert dict(job.counts) == {"not_found": 2, "applied": 6}
+    assert {result.rating_key for result in job.results if result.status == "not_found"} == {"missing", "11"}
+
+    read = requests[0]
+    assert read.method == "GET"
+    assert read.url.path == "/library/metadata/1,3,5,7,9,11"
+    writes = {request.url.params["id"]: request for request in requests[1:]}
+    assert set(writes) == {"1,3,5,7", "9", "2"}
+    kept = writes["1,3,5,7"]
+    assert kept.method == "PUT"
+    assert kept.url.path == "/library/sections/1/all"
+    assert kept.url.params["type"] == "1"
+    assert kept.headers["X-Plex-Token"] == "test-token"
+    assert kept.url.params.get_list("label[0].tag.tag") == ["Kids"]
+    assert kept.url.params.get_list("label[1].tag.tag") == ["Remaster"]
+    assert writes["9"].url.params["label[0].tag.tag"] == "Remaster"
+    assert writes["2"].url.params["type"] == "2"
+    assert writes["2"].url.params["titleSort.value"] == "Show, The"
+
+@pytest.mark.asyncio
+async def test_overloaded_writes_are_retried():
+    """Test that 503s are retried and reduce the limit and other errors fail the batch"""
+    requests = []
+    editor = make_editor(recording_handler(requests, statuses=[503, 200]))
+    job = editor.start("test-token", "1", [MetadataEdit(rating_key="1", title="A")], make_store())
+    await job.task
+    assert job.requests == 2
+    assert dict(job.counts) == {"applied": 1}
+    assert job.limiter.decreased_at > 0
+
+    editor = make_editor(recording_handler(requests, statuses=[400]))
+    job = editor.start("test-token", "1", [MetadataEdit(rating_key="1", title="A")], make_store())
+    await job.task
+    assert job.requests == 1
+    assert [(result.status, result.error) for result in job.results] == [
+        ("failed", "Plex rejected the request (Status: 400)")
+    ]
+
+@pytest.mark.asyncio
+async def test_invalid_token_fails_job():
+    """Test that an invalid token stops the job"""
+    editor = make_editor(recording_handler([], statuses=[401]))
+    job = editor.start("bad-token", "1", [MetadataEdit(rating_key="1", title="A")], make_store())
+    await job.task
+    assert job.status == "failed"
+    assert job.error == "Invalid Plex token"
+
+@pytest.mark.asyncio
+async def test_invalid_token_stops_other_writes():
+    """Test that writes still in flight when the token is rejected are cancelled, not failed"""
+    requests = []
+
+    async def handler(request):
+        requests.append(request)
+        if request.url.params["title.value"] == "Title 0":
+            return httpx.Response(401)
+        await asyncio.sleep(0.05)
+        return httpx.Response(200)
+
+    plex = PlexService("http://plex:32400", transport=httpx.MockTransport(handler))
+    editor = BulkEditor(BULK_EDIT_CONFIG, plex, ChangeFeed(100, 300))
+    edits = [MetadataEdit(rating_key=str(i), title=f"Title {i}") for i in range(6)]
+    job = editor.start("bad-token", "1", edits, make_store())
+    await job.task
+    await asyncio.sleep(0.1)
+    assert job.status == "failed"
+    assert job.error == "Invalid Plex token"
+    assert job.results == []
+
+@pytest.mark.asyncio
+async def test_large_job_concurrency_is_bounded():
+    """Test that thousands of distinct edits run concurrently but within the limit"""
+    active, peak = 0, 0
+
+    async def handler(request):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.001)
+        active -= 1
+        return httpx.Response(200)
+
+    plex = PlexService("http://plex:32400", transport=httpx.MockTransport(handler))
+    editor = BulkEditor(BULK_EDIT_CONFIG, plex, ChangeFeed(100, 300))
+    edits = [MetadataEdit(rating_key=str(i), title=f"Title {i}") for i in range(2000)]
+    started = time.monotonic()
+    job = editor.start("test-token", "1", edits, make_store(2000))
+    await job.task
+    assert dict(job.counts) == {"applied": 2000}
+    assert job.requests == 2000
+    assert 1 < peak <= BULK_EDIT_CONFIG["max_concurrency"]
+    assert time.monotonic() - started < 10
+
+def test_bulk_edit_endpoints(monkeypatch):
+    """Test starting and polling a bulk edit through the API"""
+    editor = make_editor(recording_handler([]))
+    monkeypatch.setattr("app.routers.metadata.bulk_editor", editor)
+    headers = {"X-Plex-Token": "test-token"}
+    body = {"library_key": "1", "edits": [{"rating_key": "1", "title": "A"}, {"rating_key": "nope", "title": "B"}]}
+
+    with TestClient(app) as client, \
+         patch.object(editor, "library_store", AsyncMock(return_value=make_store())):
+        response = client.post("/metadata/bulk-edits", json=body, headers=headers)
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+        assert response.json()["total"] == 2
+
+        for _ in range(50):
+            report = client.get(f"/metadata/bulk-edits/{job_id}", headers=headers).json()
+            if report["status"] != "running":
+                break
+            time.sleep(0.01)
+
+        assert report["status"] == "completed"
+        assert report["counts"] == {"applied": 1, "not_found": 1}
+        report = client.get(f"/metadata/bulk-edits/{job_id}?status=not_found", headers=headers).json()
+        assert [result["rating_key"] for result in report["results"]] == ["nope"]
+        assert [job["id"] for job in client.get("/metadata/bulk-edits", headers=headers).json()] == [job_id]
+        assert client.get("/metadata/bulk-edits/unknown", headers=headers).status_code == 404
+
+        # Other tokens can't see or cancel the job
+        other = {"X-Plex-Token": "other-token"}
+        assert client.get("/metadata/bulk-edits", headers=other).json() == []
+        assert client.get(f"/metadata/bulk-edits/{job_id}", headers=other).status_code == 404
+        assert client.delete(f"/metadata/bulk-edits/{job_id}", headers=other).status_code == 404
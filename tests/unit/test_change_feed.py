@@ -0,0 +1,158 @@
+import json
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from app.models import Library, MediaItem
+from app.routers.server import router
+from app.services.change_feed import ChangeFeed
+from app.services.plex import plex_service
+
+app = FastAPI()
+app.include_router(router)
+client = TestClient(app)
+
+def make_item(key, updated_at=1, view_count=0):
+    return MediaItem(rating_key=key, title=f"Item {key}", type="movie", updated_at=updated_at, view_count=view_count)
+
+def make_library(updated_at="1"):
+    return Library(
+        key="1", title="Movies", type="movie", agent="agent", scanner="scanner",
+        language="en", uuid="uuid", updated_at=updated_at, created_at="0", scanned_at=updated_at
+    )
+
+def test_initial_listing_returns_everything():
+    """Test that a missing cursor returns the full section as added"""
+    feed = ChangeFeed(max_log_entries=100, max_age_seconds=300)
+    snapshot = feed.snapshot("1")
+    feed.apply(snapshot, [make_item("a"), make_item("b")])
+
+    changes = feed.changes_since(snapshot, None)
+    assert changes.reset is False
+    assert changes.added == ["a", "b"]
+    assert changes.cursor == f"{feed.epoch}{snapshot.id}-1"
+
+def test_changes_since_cursor():
+    """Test that only the net changes after the cursor are returned"""
+    feed = ChangeFeed(max_log_entries=100, max_age_seconds=300)
+    snapshot = feed.snapshot("1")
+    feed.apply(snapshot, [make_item("a"), make_item("b"), make_item("c")])
+    cursor = feed.cursor(snapshot)
+
+    # b updated, c removed, d added
+    feed.apply(snapshot, [make_item("a"), make_item("b", 2), make_item("d")])
+    # d updated again, e added then removed, c re-added
+    feed.apply(snapshot, [make_item("a"), make_item("b", 2), make_item("d", 2), make_item("e")])
+    feed.apply(snapshot, [make_item("a"), make_item("b", 2), make_item("c"), make_item("d", 2)])
+
+    changes = feed.changes_since(snapshot, cursor)
+    assert sorted(changes.added) == ["d"]
+    assert sorted(changes.updated) == ["b", "c"]
+    assert changes.removed == []
+    assert [item.updated_at for item in changes.items(changes.added)] == [2]
+
+def test_unchanged_listing_keeps_version():
+    """Test that identical listings do not create a new version"""
+    feed = ChangeFeed(max_log_entries=100, max_age_seconds=300)
+    snapshot = feed.snapshot("1")
+    feed.apply(snapshot, [make_item("a")])
+    feed.apply(snapshot, [make_item("a")])
+    assert snapshot.version == 1
+    assert feed.changes_since(snapshot, feed.cursor(snapshot)).added == []
+
+@pytest.mark.parametrize("cursor", ["bogus", "00000000-1", "expired"])
+def test_unusable_cursor_resets(cursor):
+    """Test that foreign or expired cursors trigger a full resync"""
+    feed = ChangeFeed(max_log_entries=1, max_age_seconds=300)
+    snapshot = feed.snapshot("1")
+    feed.apply(snapshot, [make_item("a")])
+    if cursor == "expired":
+        cursor = feed.cursor(snapshot)
+    feed.apply(snapshot, [make_item("a"), make_item("b"), make_item("c")])
+
+    changes = feed.changes_since(snapshot, cursor)
+    assert changes.reset is True
+    assert sorted(changes.added) == ["a", "b", "c"]
+
+@pytest.mark.asyncio
+async def test_refresh_skips_unchanged_library():
+    """Test that a section is only re-listed when its fingerprint moves"""
+    feed = ChangeFeed(max_log_entries=100, max_age_seconds=300)
+    fetch_items = AsyncMock(return_value=[make_item("a")])
+
+    await feed.refresh(make_library("1"), "token", fetch_items)
+    await feed.refresh(make_library("1"), "token", fetch_items)
+    assert fetch_items.await_count == 1
+
+    await feed.refresh(make_library("2"), "token", fetch_items)
+    assert fetch_items.await_count == 2
+
+@pytest.mark.asyncio
+async def test_snapshots_are_per_token():
+    """Test that each token gets its own listing, watch state and cursors"""
+    feed = ChangeFeed(max_log_entries=100, max_age_seconds=300, max_snapshots=2)
+    owner = await feed.refresh(make_library(), "owner", AsyncMock(return_value=[make_item("a", view_count=3)]))
+    managed = await feed.refresh(make_library(), "managed", AsyncMock(return_value=[]))
+    assert owner is not managed
+    assert owner.store.to_model(owner.store.row_of("a")).view_count == 3
+    assert managed.stamps == {}
+    # A cursor from one token's snapshot is not valid for another's
+    assert feed.changes_since(managed, feed.cursor(owner)).reset is True
+
+    await feed.refresh(make_library(), "third", AsyncMock(return_value=[]))
+    assert len(feed.sections) == 2
+    assert feed.snapshot("1", "owner") is not owner
+
+@pytest.mark.asyncio
+async def test_snapshots_are_bounded_by_total_items():
+    """Test that least recently used snapshots are dropped once the item budget is exceeded"""
+    feed = ChangeFeed(max_log_entries=100, max_age_seconds=300, max_items=5)
+    items = lambda *keys: AsyncMock(return_value=[make_item(key) for key in keys])
+    first = await feed.refresh(make_library(), "first", items("a", "b"))
+    await feed.refresh(make_library(), "second", items("a", "b"))
+    feed.snapshot("1", "first")
+    assert len(feed.sections) == 2
+
+    # The new listing pushes the total to six, so the least recently used snapshot goes
+    third = await feed.refresh(make_library(), "third", items("a", "b"))
+    assert list(feed.sections.values()) == [first, third]
+
+    # A snapshot that grows past the budget on its own is kept
+    await feed.refresh(make_library("2"), "third", items(*"abcdefg"))
+    assert list(feed.sections.values()) == [third]
+
+def test_watch_state_changes_are_updates():
+    """Test that a changed view count is reported even though updatedAt stays put"""
+    feed = ChangeFeed(max_log_entries=100, max_age_seconds=300)
+    snapshot = feed.snapshot("1")
+    feed.apply(snapshot, [make_item("a")])
+    cursor = feed.cursor(snapshot)
+    feed.apply(snapshot, [make_item("a", view_count=1)])
+    assert feed.changes_since(snapshot, cursor).updated == ["a"]
+
+def test_changes_endpoint():
+    """Test streaming changes as NDJSON"""
+    with patch.object(plex_service, "get_libraries", AsyncMock(return_value=[make_library("10")])), \
+         patch.object(plex_service, "get_section_items", AsyncMock(return_value=[make_item("a")])):
+        response = client.get(
+            "/server/libraries/1/changes",
+            headers={"X-Plex-Token": "test-token"}
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert lines[0]["op"] == "added"
+    assert lines[0]["item"]["rating_key"] == "a"
+    assert "cursor" in lines[-1]
+
+def test_changes_endpoint_unknown_library():
+    """Test changes for an unknown library"""
+    with patch.object(plex_service, "get_libraries", AsyncMock(return_value=[make_library()])):
+        response = client.get(
+            "/server/libraries/99/changes",
+            headers={"X-Plex-Token": "test-token"}
+        )
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Library 99 not found"
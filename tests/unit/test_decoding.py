@@ -0,0 +1,187 @@
+import json
+import httpx
+import pytest
+from types import SimpleNamespace
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.routers.server import router
+from app.services import decoding
+from app.services.plex import PlexService
+
+app = FastAPI()
+app.include_router(router)
+client = TestClient(app)
+
+ITEMS_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<MediaContainer size="2" totalSize="2" librarySectionID="1">
+    <Video ratingKey="10" title="Inception" type="movie" year="2010" rating="8.7" viewCount="2" addedAt="1700000000" updatedAt="1700000100">
+        <Media videoResolution="1080" videoCodec="h264" audioCodec="aac">
+            <Part file="/media/movies/Inception.mkv" size="1000" />
+        </Media>
+        <Genre tag="Action" />
+        <Genre tag="Science Fiction" />
+    </Video>
+    <Video ratingKey="11" title="Heat" type="movie" year="1995" addedAt="1700000200" updatedAt="1700000300" />
+</MediaContainer>"""
+
+ITEMS_JSON = json.dumps({
+    "MediaContainer": {
+        "size": 2,
+        "totalSize": 2,
+        "librarySectionID": 1,
+        "Metadata": [
+            {
+                "ratingKey": "10", "title": "Inception", "type": "movie", "year": 2010,
+                "rating": 8.7, "viewCount": 2, "addedAt": 1700000000, "updatedAt": 1700000100,
+                "Media": [{
+                    "videoResolution": "1080", "videoCodec": "h264", "audioCodec": "aac",
+                    "Part": [{"file": "/media/movies/Inception.mkv", "size": 1000}]
+                }],
+                "Genre": [{"tag": "Action"}, {"tag": "Science Fiction"}]
+            },
+            {
+                "ratingKey": "11", "title": "Heat", "type": "movie", "year": 1995,
+                "addedAt": 1700000200, "updatedAt": 1700000300
+            }
+        ]
+    }
+}).encode()
+
+def make_response(status_code, content):
+    response = MagicMock()
+    response.status_code = status_code
+    response.content = content
+    return response
+
+def test_decode_xml_matches_json_layout():
+    """Test that XML and JSON payloads decode to the same items"""
+    xml_items = [decoding.parse_item(m) for m in decoding.decode(ITEMS_XML)["Metadata"]]
+    json_items = [decoding.parse_item(m) for m in decoding.decode(ITEMS_JSON)["Metadata"]]
+    assert xml_items == json_items
+
+    item = json_items[0]
+    assert item.rating_key == "10"
+    assert item.year == 2010
+    assert item.rating == 8.7
+    assert item.view_count == 2
+    assert item.video_resolution == "1080"
+    assert item.genres == ["Action", "Science Fiction"]
+    assert json_items[1].view_count == 0
+    assert json_items[1].genres == []
+    assert item.parts[0].file == "/media/movies/Inception.mkv"
+    assert item.parts[0].size == 1000
+
+@pytest.mark.parametrize("backend", ["lxml.etree", "xml.etree.ElementTree"])
+def test_decode_xml_releases_handled_elements(backend, monkeypatch):
+    """Test that converted elements don't accumulate in the parse tree"""
+    xml_etree = pytest.importorskip(backend)
+    roots, sizes = [], []
+
+    def iterparse(source, events):
+        for event, element in xml_etree.iterparse(source, events=events):
+            if not roots:
+                roots.append(element)
+            yield event, element
+            sizes.append(len(roots[0]))
+
+    monkeypatch.setattr(decoding, "xml_etree", SimpleNamespace(iterparse=iterparse))
+    videos = b"".join(b'<Video ratingKey="%d"><Media><Part file="/%d.mkv" /></Media></Video>' % (i, i)
+                      for i in range(5000))
+    container = decoding.decode(b"<MediaContainer>" + videos + b"</MediaContainer>")
+    assert [item["ratingKey"] for item in container["Metadata"]] == [str(i) for i in range(5000)]
+    assert container["Metadata"][-1]["Media"][0]["Part"][0]["file"] == "/4999.mkv"
+    # Only the elements of the chunk being parsed are held at once
+    assert max(sizes) < 1000
+
+def test_decode_libraries(mock_libraries_response):
+    """Test decoding a library section listing"""
+    container = decoding.decode(mock_libraries_response.encode())
+    libraries = [decoding.parse_library(d) for d in container["Directory"]]
+    assert [library.title for library in libraries] == ["Movies", "TV Shows"]
+
+def test_decode_server_info():
+    """Test claimed flag decoding for both formats"""
+    xml = decoding.decode(b'<MediaContainer machineIdentifier="id" version="1.0" claimed="1" />')
+    js = decoding.decode(b'{"MediaContainer": {"machineIdentifier": "id", "version": "1.0", "claimed": true}}')
+    assert decoding.parse_server_info(xml, "http://plex") == decoding.parse_server_info(js, "http://plex")
+    assert decoding.parse_server_info(xml, "http://plex").claimed is True
+
+@pytest.mark.parametrize("payload", [b"<MediaContainer", b"{not json", b'{"foo": 1}', b""])
+def test_decode_invalid_payload(payload):
+    """Test that malformed responses raise PlexDecodeError"""
+    with pytest.raises(decoding.PlexDecodeError):
+        decoding.decode(payload)
+
+def test_get_library_items_success():
+    """Test successful item listing"""
+    mock_client = AsyncMock()
+    mock_client.__aenter__.return_value.get.return_value = make_response(200, ITEMS_JSON)
+
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        response = client.get(
+            "/server/libraries/1/items",
+            headers={"X-Plex-Token": "test-token"}
+        )
+
+    assert response.status_code == 200
+    data = response.json()
+    assert [item["rating_key"] for item in data] == ["10", "11"]
+    assert data[0]["genres"] == ["Action", "Science Fiction"]
+
+def test_get_library_items_paging(monkeypatch):
+    """Test that large sections are fetched page by page"""
+    from app.services.plex import plex_service
+    monkeypatch.setattr(plex_service, "page_size", 1)
+    page = lambda key: json.dumps({"MediaContainer": {"totalSize": 2, "Metadata": [
+        {"ratingKey": key, "title": f"Item {key}", "type": "movie"}
+    ]}}).encode()
+
+    mock_client = AsyncMock()
+    mock_get = mock_client.__aenter__.return_value.get
+    mock_get.side_effect = [make_response(200, page("1")), make_response(200, page("2"))]
+
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        response = client.get(
+            "/server/libraries/1/items",
+            headers={"X-Plex-Token": "test-token"}
+        )
+
+    assert response.status_code == 200
+    assert [item["rating_key"] for item in response.json()] == ["1", "2"]
+    starts = [call.kwargs["params"]["X-Plex-Container-Start"] for call in mock_get.call_args_list]
+    assert starts == [0, 1]
+
+def test_get_library_items_not_found():
+    """Test item listing for an unknown library"""
+    mock_client = AsyncMock()
+    mock_client.__aenter__.return_value.get.return_value = make_response(404, b"")
+
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        response = client.get(
+            "/server/libraries/99/items",
+            headers={"X-Plex-Token": "test-token"}
+        )
+
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Library 99 not found"
+
+@pytest.mark.asyncio
+async def test_invalid_entries_are_skipped():
+    """Test that entries failing validation are skipped rather than failing the whole listing"""
+    def handler(request):
+        if request.url.path == "/library/sections":
+            directories = [
+                {"key": key, "title": "Movies", "type": "movie", "agent": "agent", "scanner": "scanner",
+                 "language": language, "uuid": "uuid", "updatedAt": 1, "createdAt": 0, "scannedAt": 1}
+                for key, language in (("1", "en"), ("2", ""))
+            ]
+            return httpx.Response(200, json={"MediaContainer": {"Directory": directories}})
+        metadata = [{"ratingKey": "10", "title": "Heat", "type": "movie"},
+                    {"ratingKey": "11", "title": "", "type": "movie"}]
+        return httpx.Response(200, json={"MediaContainer": {"totalSize": 2, "Metadata": metadata}})
+
+    plex = PlexService("http://plex:32400", transport=httpx.MockTransport(handler))
+    assert [library.key for library in await plex.get_libraries("test-token")] == ["1"]
+    assert [item.rating_key for item in await plex.get_section_items("test-token", "1")] == ["10"]
+    assert [item.rating_key for item in await plex.get_home_items("test-token", "/library/onDeck", 10)] == ["10"]
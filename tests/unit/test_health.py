@@ -0,0 +1,110 @@
+import asyncio
+import httpx
+import pytest
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.main import app
+from app.middleware.load_shedding import LoadShedder, ResponseCache
+from app.services.change_feed import ChangeFeed
+from app.services.health import ReadinessCheck, UpstreamProbe
+from app.services.loop_monitor import LoopLagMonitor
+from app.services.plex import plex_service
+
+client = TestClient(app)
+
+HEALTH_CONFIG = {
+    "max_loop_lag_ms": 100,
+    "max_upstream_latency_ms": 1000,
+    "max_pool_waiting": 2,
+}
+
+def make_check():
+    monitor = LoopLagMonitor(interval=0.1)
+    probe = UpstreamProbe(plex_service, token="test-token", interval=10, timeout=1)
+    shedder = LoadShedder(default_timeout=5, max_timeout=10, routes={}, max_in_flight=4,
+                          max_loop_lag_ms=500, monitor=monitor)
+    return ReadinessCheck(monitor, probe, plex_service, ChangeFeed(100, 300), HEALTH_CONFIG,
+                          shedder=shedder, response_cache=ResponseCache(10, 1024))
+
+def test_ready_endpoint():
+    """Test that a fresh worker reports ready without probing Plex"""
+    with patch("httpx.AsyncClient") as mock_client:
+        response = client.get("/health/ready")
+        mock_client.assert_not_called()
+    assert response.status_code == 200
+    data = response.json()
+    assert data["status"] == "ready"
+    assert data["reasons"] == []
+    assert data["upstream"]["reachable"] is None
+    assert data["pool"]["max_concurrency"] == plex_service.max_concurrency
+
+def test_degraded_endpoint(monkeypatch):
+    """Test that a degraded worker answers 503 with the reasons"""
+    monkeypatch.setattr("app.main.upstream_probe.reachable", False)
+    monkeypatch.setattr("app.main.upstream_probe.error", "Connection refused")
+    response = client.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["reasons"] == ["Plex server unreachable"]
+
+def test_degraded_reasons():
+    """Test each condition that marks a worker degraded"""
+    check = make_check()
+    assert check.report().status == "ready"
+
+    check.monitor.lag = 0.2
+    check.probe.reachable, check.probe.latency_ms, check.probe.checked_at = True, 1500.0, 0.0
+    check.shedder.in_flight = 4
+    report = check.report(now=1.0)
+    assert report.status == "degraded"
+    assert report.reasons == [
+        "Event loop lag 200ms",
+        "Plex latency 1500ms",
+        "Shedding load: 4 requests in flight"
+    ]
+    assert report.pool.in_flight == 4
+
+def test_stale_probe():
+    """Test that a probe loop that stopped reporting is treated as degraded"""
+    check = make_check()
+    check.probe.reachable, check.probe.latency_ms, check.probe.checked_at = True, 10.0, 0.0
+    check.probe.task = MagicMock(done=MagicMock(return_value=False))
+    assert check.report(now=5.0).status == "ready"
+    report = check.report(now=100.0)
+    assert report.reasons == ["Plex health probe is stale"]
+    assert report.upstream.stale is True
+
+@pytest.mark.asyncio
+async def test_probe_records_result():
+    """Test that probes record reachability and latency"""
+    probe = UpstreamProbe(plex_service, token="test-token", interval=10, timeout=1)
+    mock_client = AsyncMock()
+    mock_client.__aenter__.return_value.get.return_value = MagicMock(status_code=200)
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        await probe.probe()
+    assert probe.reachable is True
+    assert probe.latency_ms is not None
+    assert probe.checked_at is not None
+
+    mock_client.__aenter__.return_value.get.side_effect = httpx.ConnectError("Connection refused")
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        await probe.probe()
+    assert probe.reachable is False
+    assert probe.error == "Connection refused"
+
+@pytest.mark.asyncio
+async def test_pool_occupancy_is_tracked(monkeypatch):
+    """Test that upstream slot holders and waiters are counted"""
+    monkeypatch.setattr(plex_service, "upstream_slots", asyncio.Semaphore(plex_service.max_concurrency))
+    assert (plex_service.in_use, plex_service.waiting) == (0, 0)
+    release = asyncio.Event()
+
+    async def hold():
+        async with plex_service.upstream_slot():
+            await release.wait()
+
+    holders = [asyncio.create_task(hold()) for _ in range(plex_service.max_concurrency + 2)]
+    await asyncio.sleep(0.01)
+    assert (plex_service.in_use, plex_service.waiting) == (plex_service.max_concurrency, 2)
+    release.set()
+    await asyncio.gather(*holders)
+    assert (plex_service.in_use, plex_service.waiting) == (0, 0)
@@ -0,0 +1,157 @@
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from unittest.mock import AsyncMock, MagicMock
+from app.models import HomeItem
+from app.routers.home import router
+from app.services.decoding import parse_home_item
+from app.services.home import HomeRowService
+from app.services.plex import PlexService
+from app.services.recording import ReplayTransport
+
+app = FastAPI()
+app.include_router(router)
+client = TestClient(app)
+
+def make_item(key, view_offset=None):
+    return HomeItem(rating_key=key, title=f"Item {key}", type="episode", view_offset=view_offset)
+
+def make_server(rows=None):
+    """A stand-in PlexService returning fixed rows per listing path"""
+    rows = rows if rows is not None else {
+        "/library/onDeck": [make_item("1", 1000)],
+        "/library/recentlyAdded": [make_item("2"), make_item("3")],
+    }
+    server = MagicMock()
+
+    async def get_home_items(token, path, size):
+        if isinstance(rows, Exception):
+            raise rows
+        return rows[path][:size]
+
+    server.get_home_items = AsyncMock(side_effect=get_home_items)
+    server.rows = rows
+    return server
+
+def make_service(servers, **overrides):
+    options = {
+        "row_size": 10,
+        "refresh_interval": 60,
+        "refresh_concurrency": 2,
+        "idle_seconds": 100,
+        "max_users": 10,
+    }
+    options.update(overrides)
+    return HomeRowService(servers, **options)
+
+def test_extra_servers_share_the_transport():
+    """Test that extra servers go through the main server's (recording or replay) transport"""
+    transport = ReplayTransport([])
+    service = HomeRowService.from_config({
+        "servers": {"basement": "http://10.0.0.5:32400"}, "row_size": 10, "refresh_interval_seconds": 60,
+        "refresh_concurrency": 2, "idle_seconds": 100, "max_users": 10,
+    }, PlexService("http://plex:32400", transport=transport))
+    assert service.servers["basement"].base_url == "http://10.0.0.5:32400"
+    assert service.servers["basement"].transport is transport
+
+def test_parse_home_item():
+    """Test mapping an on-deck entry, including playback state"""
+    item = parse_home_item({
+        "ratingKey": 10, "title": "Pilot", "type": "episode", "viewOffset": "60000",
+        "grandparentTitle": "The Show", "parentIndex": 1, "index": 1, "thumb": "/library/metadata/10/thumb/1"
+    })
+    assert item.view_offset == 60000
+    assert item.grandparent_title == "The Show"
+    assert (item.parent_index, item.index) == (1, 1)
+
+@pytest.mark.asyncio
+async def test_page_views_are_served_from_memory():
+    """Test that only a user's first view calls Plex"""
+    server = make_server()
+    service = make_service({"default": server})
+    screen, tag = await service.screen("token-a")
+    assert [item.rating_key for item in screen.servers[0].on_deck] == ["1"]
+    assert [item.rating_key for item in screen.servers[0].recently_added] == ["2", "3"]
+    assert server.get_home_items.await_count == 2
+
+    for _ in range(5):
+        assert (await service.screen("token-a"))[1] == tag
+    assert server.get_home_items.await_count == 2
+
+@pytest.mark.asyncio
+async def test_tag_follows_content():
+    """Test that the tag only changes with the rows, and is the same after re-registration"""
+    server = make_server()
+    service = make_service({"default": server})
+    _, tag = await service.screen("token-a")
+
+    await service.refresh_all()
+    assert (await service.screen("token-a"))[1] == tag
+
+    server.rows["/library/onDeck"] = [make_item("1", 2000)]
+    await service.refresh_all()
+    screen, new_tag = await service.screen("token-a")
+    assert new_tag != tag
+    assert screen.servers[0].on_deck[0].view_offset == 2000
+
+    # A fresh service (a restart, another worker) agrees on the tag
+    assert (await make_service({"default": server}).screen("token-a"))[1] == new_tag
+    service.forget("token-a")
+    assert (await service.screen("token-a"))[1] == new_tag
+
+@pytest.mark.asyncio
+async def test_failed_refresh_keeps_previous_rows():
+    """Test that a server outage keeps serving the last good rows"""
+    healthy, flaky = make_server(), make_server()
+    service = make_service({"default": healthy, "basement": flaky})
+    _, tag = await service.screen("token-a")
+
+    flaky.get_home_items.side_effect = HTTPException(status_code=500, detail="Failed to connect to Plex server")
+    await service.refresh_all()
+    screen, failed_tag = await service.screen("token-a")
+    # Refresh errors change the tag, so 304s don't hide them
+    assert failed_tag != tag
+    assert [rows.server for rows in screen.servers] == ["default", "basement"]
+    assert screen.servers[1].error == "Failed to connect to Plex server"
+    assert [item.rating_key for item in screen.servers[1].on_deck] == ["1"]
+    assert screen.servers[0].error is None
+
+@pytest.mark.asyncio
+async def test_invalid_token_is_not_registered():
+    """Test that a first view failing everywhere raises and keeps no state"""
+    service = make_service({"default": make_server(HTTPException(status_code=401, detail="Invalid Plex token"))})
+    with pytest.raises(HTTPException) as exc_info:
+        await service.screen("bad-token")
+    assert exc_info.value.status_code == 401
+    assert len(service.users) == 0
+
+@pytest.mark.asyncio
+async def test_idle_and_excess_users_are_dropped():
+    """Test that idle users stop being refreshed and the user count is capped"""
+    server = make_server()
+    service = make_service({"default": server}, max_users=2)
+    for token in ("a", "b", "c"):
+        await service.screen(token)
+    assert len(service.users) == 2
+
+    calls = server.get_home_items.await_count
+    last_seen = max(user.last_seen for user in service.users.values())
+    await service.refresh_all(now=last_seen + 1000)
+    assert len(service.users) == 0
+    assert server.get_home_items.await_count == calls
+
+def test_home_endpoints(monkeypatch):
+    """Test the ETag round trip and forgetting a user"""
+    monkeypatch.setattr("app.routers.home.home_rows", make_service({"default": make_server()}))
+    headers = {"X-Plex-Token": "test-token"}
+
+    response = client.get("/home", headers=headers)
+    assert response.status_code == 200
+    assert response.json()["servers"][0]["server"] == "default"
+    etag = response.headers["etag"]
+
+    response = client.get("/home", headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+
+    assert client.delete("/home", headers=headers).status_code == 204
+    assert client.delete("/home", headers=headers).status_code == 404
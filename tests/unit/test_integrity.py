@@ -0,0 +1,199 @@
+import asyncio
+import time
+import pytest
+from concurrent.futures import Executor, Future
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from app.models import MediaItem, MediaPart
+from app.routers.integrity import router
+from app.services.integrity import FileCheck, IntegrityScanner, validate_header
+from app.services.plex import plex_service
+
+app = FastAPI()
+app.include_router(router)
+
+MKV_HEADER = b"\x1a\x45\xdf\xa3" + b"\x00" * 60
+
+def make_scanner(**overrides):
+    integrity_config = {
+        "path_mappings": {},
+        "stat_workers": 4,
+        "hash_workers": 1,
+        "max_in_flight": 4,
+        "max_files_per_second": 0,
+        "header_bytes": 16,
+        "max_jobs": 2,
+    }
+    integrity_config.update(overrides)
+    return IntegrityScanner(integrity_config)
+
+@pytest.fixture
+def media_dir(tmp_path):
+    """Local media files in various states"""
+    (tmp_path / "ok.mkv").write_bytes(MKV_HEADER)
+    (tmp_path / "empty.mkv").write_bytes(b"")
+    (tmp_path / "short.mkv").write_bytes(MKV_HEADER[:10])
+    (tmp_path / "corrupt.mkv").write_bytes(b"\x00" * 64)
+    return tmp_path
+
+def make_items(files):
+    return [
+        MediaItem(rating_key=str(i), title=name, type="movie", parts=[MediaPart(file=f"/plex/{name}", size=size)])
+        for i, (name, size) in enumerate(files)
+    ]
+
+def test_path_mappings():
+    """Test that Plex paths are translated to local mounts"""
+    scanner = make_scanner(path_mappings={"/data/media": "/mnt/media"})
+    assert scanner.local_path("/data/media/movies/a.mkv") == "/mnt/media/movies/a.mkv"
+    assert scanner.local_path("/other/a.mkv") == "/other/a.mkv"
+
+def test_validate_header(media_dir):
+    """Test container signature validation"""
+    valid, digest = validate_header(str(media_dir / "ok.mkv"), 16)
+    assert valid is True
+    assert len(digest) == 32
+    assert validate_header(str(media_dir / "corrupt.mkv"), 16)[0] is False
+
+@pytest.mark.asyncio
+async def test_scan_classifies_files(media_dir):
+    """Test a full scan over files in every state"""
+    scanner = make_scanner(path_mappings={"/plex": str(media_dir)})
+    items = make_items([
+        ("ok.mkv", 64), ("empty.mkv", 64), ("short.mkv", 64),
+        ("corrupt.mkv", 64), ("missing.mkv", 64)
+    ])
+    try:
+        job = scanner.start("1", items, validate_headers=True)
+        await job.task
+    finally:
+        scanner.shutdown()
+
+    assert job.status == "completed"
+    assert job.checked == job.total == 5
+    statuses = {result.file.rsplit("/", 1)[1]: result.status for result in job.results}
+    assert statuses == {
+        "ok.mkv": "ok",
+        "empty.mkv": "empty",
+        "short.mkv": "truncated",
+        "corrupt.mkv": "invalid_header",
+        "missing.mkv": "missing"
+    }
+
+@pytest.mark.asyncio
+async def test_scan_throttle(media_dir):
+    """Test that files per second are capped"""
+    scanner = make_scanner(path_mappings={"/plex": str(media_dir)}, max_files_per_second=50)
+    items = make_items([("ok.mkv", 64)] * 6)
+    started = time.monotonic()
+    job = scanner.start("1", items)
+    await job.task
+    scanner.shutdown()
+    assert job.counts["ok"] == 6
+    assert time.monotonic() - started >= 0.09
+
+@pytest.mark.asyncio
+async def test_old_jobs_are_evicted(media_dir):
+    """Test that only `max_jobs` scans are retained"""
+    scanner = make_scanner()
+    jobs = [scanner.start("1", []) for _ in range(3)]
+    await asyncio.gather(*(job.task for job in jobs), return_exceptions=True)
+    assert list(scanner.jobs) == [job.id for job in jobs[1:]]
+    assert jobs[0].status == "cancelled"
+
+class BrokenPool(Executor):
+    """A process pool whose workers have died"""
+    def __init__(self):
+        self.shut_down = False
+
+    def submit(self, fn, *args, **kwargs):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A child process terminated abruptly"))
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.shut_down = True
+
+@pytest.mark.asyncio
+async def test_broken_process_pool_is_replaced(media_dir):
+    """Test that a crashed header validation pool is rebuilt and the file retried"""
+    scanner = make_scanner()
+    broken = BrokenPool()
+    scanner._process_pool = broken
+    try:
+        result = await scanner.check("1", str(media_dir / "ok.mkv"), 64, validate_headers=True)
+        assert result.status == "ok"
+        assert broken.shut_down
+        assert scanner._process_pool is not broken
+
+        # A pool that keeps breaking marks the file unreadable instead of failing the scan
+        with patch.object(IntegrityScanner, "process_pool", property(lambda self: broken)):
+            result = await scanner.check("1", str(media_dir / "ok.mkv"), 64, validate_headers=True)
+        assert result.status == "unreadable"
+    finally:
+        scanner.shutdown()
+
+@pytest.mark.asyncio
+async def test_failed_scan_stops_other_workers(media_dir):
+    """Test that workers still running when the scan fails are cancelled"""
+    scanner = make_scanner()
+
+    async def check(rating_key, file, expected_size, validate_headers):
+        if file.endswith("bad.mkv"):
+            raise RuntimeError("boom")
+        await asyncio.sleep(0.05)
+        return FileCheck(rating_key=rating_key, file=file, local_path=file, status="ok")
+
+    items = make_items([("bad.mkv", 64)] + [("ok.mkv", 64)] * 7)
+    with patch.object(scanner, "check", check):
+        job = scanner.start("1", items)
+        await job.task
+        await asyncio.sleep(0.1)
+
+    assert job.status == "failed"
+    assert job.error == "boom"
+    assert job.results == []
+
+def test_scan_endpoints(media_dir, monkeypatch):
+    """Test starting, polling and filtering a scan through the API"""
+    scanner = make_scanner(path_mappings={"/plex": str(media_dir)})
+    monkeypatch.setattr("app.routers.integrity.integrity_scanner", scanner)
+    items = make_items([("ok.mkv", 64), ("missing.mkv", 64)])
+    headers = {"X-Plex-Token": "test-token"}
+
+    with TestClient(app) as client, \
+         patch.object(plex_service, "get_section_items", AsyncMock(return_value=items)):
+        response = client.post("/integrity/scans", json={"library_key": "1"}, headers=headers)
+        assert response.status_code == 202
+        job_id = response.json()["id"]
+
+        for _ in range(50):
+            report = client.get(f"/integrity/scans/{job_id}", headers=headers).json()
+            if report["status"] != "running":
+                break
+            time.sleep(0.01)
+
+        assert report["status"] == "completed"
+        assert report["counts"] == {"ok": 1, "missing": 1}
+        assert [result["status"] for result in report["results"]] == ["missing"]
+
+        report = client.get(f"/integrity/scans/{job_id}?include_ok=true", headers=headers).json()
+        assert len(report["results"]) == 2
+
+        assert [job["id"] for job in client.get("/integrity/scans", headers=headers).json()] == [job_id]
+
+        # Other tokens can't see or cancel the scan
+        other = {"X-Plex-Token": "other-token"}
+        assert client.get("/integrity/scans", headers=other).json() == []
+        assert client.get(f"/integrity/scans/{job_id}", headers=other).status_code == 404
+        assert client.delete(f"/integrity/scans/{job_id}", headers=other).status_code == 404
+
+    scanner.shutdown()
+
+def test_scan_not_found():
+    """Test polling an unknown scan"""
+    client = TestClient(app)
+    response = client.get("/integrity/scans/unknown", headers={"X-Plex-Token": "test-token"})
+    assert response.status_code == 404
@@ -0,0 +1,60 @@
+import pytest
+from app.models import MediaItem, MediaPart
+from app.services.item_store import ItemStore, StringPool
+
+def make_item(key, **overrides):
+    values = {
+        "rating_key": key,
+        "title": f"Movie {key}",
+        "type": "movie",
+        "year": 2010,
+        "rating": 7.5,
+        "view_count": 1,
+        "added_at": 1700000000,
+        "updated_at": 1700000100,
+        "video_resolution": "1080",
+        "video_codec": "h264",
+        "audio_codec": "aac",
+        "genres": ["Action", "Drama"]
+    }
+    values.update(overrides)
+    return MediaItem(**values)
+
+def test_round_trip_to_model():
+    """Test that stored items serialize back to identical API models"""
+    items = [
+        make_item("1"),
+        make_item("2", year=None, rating=None, video_codec=None, genres=[]),
+        make_item("3", title_sort="Three", content_rating="R", duration=5400000,
+                  parts=[MediaPart(file="/media/3.mkv", size=100), MediaPart(file="/media/3b.mkv")])
+    ]
+    store = ItemStore.from_items(items)
+    assert len(store) == 3
+    assert list(store) == items
+    assert store.get("2") == items[1]
+    assert store.get("missing") is None
+
+def test_row_view():
+    """Test the lightweight row view"""
+    store = ItemStore.from_items([make_item("1")])
+    row = store.row(0)
+    assert row.rating_key == "1"
+    assert row.genres == ("Action", "Drama")
+    assert row.rating == 7.5
+    assert row.parts == ()
+    with pytest.raises(AttributeError):
+        row.extra = True
+
+def test_strings_are_interned():
+    """Test that repeated values share a single pool entry"""
+    strings = StringPool()
+    store = ItemStore.from_items([make_item(str(i)) for i in range(100)], strings)
+    # movie, 1080, h264, aac, Action, Drama
+    assert len(strings) == 6
+    assert len(store.genre_ids) == 200
+
+def test_duplicate_items_rejected():
+    """Test that an item cannot be stored twice"""
+    store = ItemStore.from_items([make_item("1")])
+    with pytest.raises(ValueError):
+        store.append(make_item("1"))
@@ -20,6 +20,7 @@ async def test_get_libraries_success(mock_libraries_response):
     mock_response_obj = MagicMock()
     mock_response_obj.status_code = 200
     mock_response_obj.text = mock_libraries_response
+    mock_response_obj.content = mock_libraries_response.encode()
     
     mock_client = AsyncMock()
     mock_client.__aenter__.return_value.get.return_value = mock_response_obj
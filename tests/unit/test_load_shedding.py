@@ -0,0 +1,205 @@
+import asyncio
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock
+from app.config import DEFAULT_LOAD_SHEDDING_CONFIG
+from app.middleware.load_shedding import LoadShedder, LoadSheddingMiddleware, ResponseCache
+from app.services import deadlines
+from app.services.loop_monitor import LoopLagMonitor
+from app.services.plex import plex_service
+
+def make_shedder(**overrides):
+    options = {
+        "default_timeout": 5,
+        "max_timeout": 10,
+        "routes": {"/slow": 0.05},
+        "max_in_flight": 10,
+        "max_loop_lag_ms": 100,
+        "monitor": LoopLagMonitor(interval=0.01),
+    }
+    options.update(overrides)
+    return LoadShedder(**options)
+
+def make_client(shedder, cache=None):
+    """Create a test client for a minimal app behind the load shedder"""
+    app = FastAPI()
+    state = {"delay": 0.0}
+
+    @app.get("/items/{key}")
+    async def get_item(key: str):
+        await asyncio.sleep(state["delay"])
+        return {"key": key}
+
+    @app.get("/slow")
+    async def slow():
+        await asyncio.sleep(1)
+        return {"done": True}
+
+    @app.get("/deadline")
+    async def deadline():
+        return {"remaining": deadlines.remaining()}
+
+    if cache is None:
+        cache = ResponseCache(max_entries=10, max_body_bytes=1024)
+    app.add_middleware(LoadSheddingMiddleware, shedder=shedder, cache=cache, exempt_paths=["/health"])
+    return TestClient(app), state
+
+def test_timeout_from_header_and_route():
+    """Test choosing a request's timeout"""
+    shedder = make_shedder()
+    assert shedder.timeout_for("/items/{key}") == 5
+    assert shedder.timeout_for("/slow") == 0.05
+    assert shedder.timeout_for("/items/{key}", "2.5") == 2.5
+    assert shedder.timeout_for("/items/{key}", "60") == 10
+    assert shedder.timeout_for("/items/{key}", "soon") == 5
+    assert make_shedder(default_timeout=0).timeout_for("/items/{key}") is None
+
+def test_section_listing_routes_get_long_deadlines():
+    """Test that routes which may list a whole section outlast the default timeout"""
+    shedder = LoadShedder.from_config(DEFAULT_LOAD_SHEDDING_CONFIG, LoopLagMonitor(interval=0.1))
+    for route in ("/server/libraries/{key}/items", "/server/libraries/{key}/changes",
+                  "/integrity/scans", "/metadata/bulk-edits",
+                  "/collections/smart", "/collections/evaluate"):
+        assert shedder.timeout_for(route) == shedder.max_timeout
+    assert shedder.timeout_for("/server/info") == shedder.default_timeout
+
+def test_deadline_is_propagated():
+    """Test that handlers see the request deadline"""
+    client, _ = make_client(make_shedder())
+    remaining = client.get("/deadline", headers={"X-Request-Timeout": "2"}).json()["remaining"]
+    assert 1.5 < remaining <= 2
+
+def test_deadline_exceeded_returns_504():
+    """Test that work past its deadline is cancelled"""
+    client, _ = make_client(make_shedder())
+    started = time.monotonic()
+    response = client.get("/slow")
+    assert response.status_code == 504
+    assert response.json() == {"detail": "Request deadline exceeded"}
+    assert time.monotonic() - started < 0.5
+
+def test_deadline_exceeded_serves_stale_response():
+    """Test that a timed-out GET is answered from the cache when possible"""
+    client, state = make_client(make_shedder())
+    assert client.get("/items/1").json() == {"key": "1"}
+
+    state["delay"] = 1
+    response = client.get("/items/1", headers={"X-Request-Timeout": "0.05"})
+    assert response.status_code == 200
+    assert response.json() == {"key": "1"}
+    assert response.headers["warning"] == '110 - "Response is Stale"'
+
+def test_overload_sheds_requests():
+    """Test that requests beyond the in-flight limit are shed"""
+    shedder = make_shedder()
+    cache = ResponseCache(max_entries=10, max_body_bytes=1024)
+    client, _ = make_client(shedder, cache)
+    headers = {"X-Plex-Token": "a"}
+    assert client.get("/items/1", headers=headers).status_code == 200
+
+    shedder.in_flight = shedder.max_in_flight
+    response = client.get("/items/1", headers=headers)
+    assert response.status_code == 200
+    assert "warning" in response.headers
+
+    # Cached responses are kept per token
+    response = client.get("/items/1", headers={"X-Plex-Token": "b"})
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert client.get("/health").status_code == 404
+    assert shedder.shed_count == 2
+
+def test_loop_lag_sheds_requests():
+    """Test that requests are shed while the event loop lags"""
+    shedder = make_shedder()
+    client, _ = make_client(shedder)
+    shedder.monitor.lag = 0.5
+    assert client.get("/items/2").status_code == 503
+    shedder.monitor.lag = 0.0
+    assert client.get("/items/2").status_code == 200
+
+def test_cache_bounds():
+    """Test that large bodies are not cached and old entries are evicted"""
+    cache = ResponseCache(max_entries=2, max_body_bytes=12)
+    client, _ = make_client(make_shedder(), cache)
+    client.get("/items/1")
+    client.get("/items/22222222")
+    assert len(cache) == 1
+    client.get("/items/2")
+    client.get("/items/3")
+    assert [key[1] for key in cache._entries] == ["/items/2", "/items/3"]
+
+@pytest.mark.asyncio
+async def test_client_disconnect_cancels_work():
+    """Test that the application is cancelled when the client goes away"""
+    cancelled = asyncio.Event()
+
+    async def app(scope, receive, send):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    messages = [{"type": "http.request", "body": b"", "more_body": False}, {"type": "http.disconnect"}]
+
+    async def receive():
+        await asyncio.sleep(0.01)
+        return messages.pop(0)
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    shedder = make_shedder()
+    middleware = LoadSheddingMiddleware(app, shedder, ResponseCache(10, 1024))
+    scope = {"type": "http", "method": "GET", "path": "/items/1", "headers": [], "query_string": b""}
+    await asyncio.wait_for(middleware(scope, receive, send), timeout=1)
+    assert cancelled.is_set()
+    assert sent == []
+    assert shedder.in_flight == 0
+
+@pytest.mark.asyncio
+async def test_upstream_calls_respect_deadline():
+    """Test that a stalled Plex call fails once the deadline passes"""
+    async def stalled_get(*args, **kwargs):
+        assert kwargs["timeout"].read <= 0.1
+        await asyncio.sleep(10)
+
+    with patch("httpx.AsyncClient") as mock_client:
+        mock_client.return_value.__aenter__.return_value.get = stalled_get
+        reset_token = deadlines.set_deadline(time.monotonic() + 0.1)
+        try:
+            with pytest.raises(deadlines.DeadlineExceeded) as exc_info:
+                await plex_service.get("/identity", "test-token")
+        finally:
+            deadlines.reset_deadline(reset_token)
+    assert exc_info.value.status_code == 504
+
+@pytest.mark.asyncio
+async def test_expired_deadline_skips_upstream_call():
+    """Test that no upstream call is made once the deadline has passed"""
+    with patch("httpx.AsyncClient") as mock_client:
+        get = mock_client.return_value.__aenter__.return_value.get = AsyncMock()
+        reset_token = deadlines.set_deadline(time.monotonic() - 1)
+        try:
+            with pytest.raises(deadlines.DeadlineExceeded):
+                await plex_service.get("/identity", "test-token")
+        finally:
+            deadlines.reset_deadline(reset_token)
+        get.assert_not_called()
+
+@pytest.mark.asyncio
+async def test_loop_lag_monitor():
+    """Test that blocking the event loop is measured as lag"""
+    monitor = LoopLagMonitor(interval=0.01)
+    monitor.start()
+    await asyncio.sleep(0.02)
+    time.sleep(0.1)
+    await asyncio.sleep(0.02)
+    await monitor.stop()
+    assert monitor.max_lag >= 0.05
+    assert not monitor.running
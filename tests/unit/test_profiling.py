@@ -0,0 +1,106 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch, MagicMock, AsyncMock
+from app.routers import admin, server
+from app.services.profiling import (
+    SamplingProfiler, ServerTimingMiddleware, TimingRecorder, span, _NULL_SPAN
+)
+
+app = FastAPI()
+app.add_middleware(ServerTimingMiddleware)
+app.include_router(server.router)
+app.include_router(admin.router)
+client = TestClient(app)
+
+def test_span_is_noop_without_recorder():
+    """Test that spans outside a timed request share a no-op context manager"""
+    assert span("plex") is _NULL_SPAN
+    with span("plex"):
+        pass
+
+def test_server_timing_format():
+    """Test Server-Timing header formatting"""
+    recorder = TimingRecorder()
+    recorder.add("plex", 0.010)
+    recorder.add("plex", 0.005)
+    recorder.add("parse", 0.001)
+    assert recorder.server_timing(0.02) == "plex;dur=15.00, parse;dur=1.00, total;dur=20.00"
+
+def test_libraries_server_timing_header(mock_libraries_response):
+    """Test that the libraries endpoint reports its phases"""
+    mock_response_obj = MagicMock()
+    mock_response_obj.status_code = 200
+    mock_response_obj.text = mock_libraries_response
+    mock_response_obj.content = mock_libraries_response.encode()
+
+    mock_client = AsyncMock()
+    mock_client.__aenter__.return_value.get.return_value = mock_response_obj
+
+    with patch("httpx.AsyncClient", return_value=mock_client):
+        response = client.get(
+            "/server/libraries",
+            headers={"X-Plex-Token": "test-token"}
+        )
+
+    assert response.status_code == 200
+    phases = [entry.split(";")[0] for entry in response.headers["Server-Timing"].split(", ")]
+    assert phases == ["plex", "parse", "model", "serialize", "total"]
+
+def test_sampling_profiler_collects_folded_stacks():
+    """Test that the profiler produces folded stack samples"""
+    profiler = SamplingProfiler(interval=0.001)
+    profiler.start()
+    deadline = time.monotonic() + 0.05
+    while time.monotonic() < deadline:
+        pass
+    profiler.stop()
+
+    lines = profiler.folded().splitlines()
+    assert lines
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) > 0
+    assert "test_sampling_profiler_collects_folded_stacks" in "\n".join(lines)
+
+def test_profile_endpoint_disabled():
+    """Test that the profiler endpoint is unavailable unless enabled"""
+    response = client.post("/admin/profile?seconds=1", headers={"X-Plex-Token": "test-token"})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Profiling is disabled"
+
+def test_profile_endpoint_missing_token():
+    """Test profiler endpoint without token"""
+    response = client.post("/admin/profile?seconds=1")
+    assert response.status_code == 401
+
+def test_profile_endpoint(monkeypatch):
+    """Test a short profiling session"""
+    monkeypatch.setitem(admin.config.profiling_config, "admin_enabled", True)
+    response = client.post(
+        "/admin/profile?seconds=0.05&interval_ms=1",
+        headers={"X-Plex-Token": admin.config.plex_token}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+
+def test_profile_endpoint_duration_limit(monkeypatch):
+    """Test that overly long profiling sessions are rejected"""
+    monkeypatch.setitem(admin.config.profiling_config, "admin_enabled", True)
+    response = client.post("/admin/profile?seconds=3600", headers={"X-Plex-Token": admin.config.plex_token})
+    assert response.status_code == 400
+
+def test_profile_endpoint_requires_server_token(monkeypatch):
+    """Test that other Plex tokens can't run the profiler"""
+    monkeypatch.setitem(admin.config.profiling_config, "admin_enabled", True)
+    response = client.post("/admin/profile?seconds=0.05", headers={"X-Plex-Token": admin.config.plex_token + "-other"})
+    assert response.status_code == 403
+
+def test_profile_endpoint_interval_lower_bound(monkeypatch):
+    """Test that sub-millisecond sampling intervals are rejected"""
+    monkeypatch.setitem(admin.config.profiling_config, "admin_enabled", True)
+    response = client.post(
+        "/admin/profile?seconds=0.05&interval_ms=0.0001",
+        headers={"X-Plex-Token": admin.config.plex_token}
+    )
+    assert response.status_code == 422
@@ -0,0 +1,111 @@
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from app.middleware.rate_limit import RateLimiter, RateLimitMiddleware, hash_token
+
+def make_client(limiter):
+    """Create a test client for a minimal app behind the rate limiter"""
+    app = FastAPI()
+
+    @app.get("/items/{key}")
+    async def get_item(key: str):
+        return {"key": key}
+
+    @app.get("/health")
+    async def health():
+        return {"status": "healthy"}
+
+    app.add_middleware(RateLimitMiddleware, limiter=limiter, exempt_paths=["/health"])
+    return TestClient(app)
+
+def test_bucket_allows_burst_then_rejects():
+    """Test that a bucket admits `burst` requests before rejecting"""
+    limiter = RateLimiter(rate=1, burst=3, max_keys=10)
+    assert [limiter.acquire("a", "/r", now=0.0) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert limiter.acquire("a", "/r", now=0.0) == pytest.approx(1.0)
+
+def test_bucket_refills_over_time():
+    """Test that tokens are refilled at the configured rate"""
+    limiter = RateLimiter(rate=2, burst=1, max_keys=10)
+    assert limiter.acquire("a", "/r", now=0.0) == 0.0
+    assert limiter.acquire("a", "/r", now=0.25) == pytest.approx(0.25)
+    assert limiter.acquire("a", "/r", now=0.5) == 0.0
+
+def test_keys_and_routes_are_independent():
+    """Test that buckets are kept per client key and per route"""
+    limiter = RateLimiter(rate=1, burst=1, max_keys=10)
+    assert limiter.acquire("a", "/r1", now=0.0) == 0.0
+    assert limiter.acquire("a", "/r2", now=0.0) == 0.0
+    assert limiter.acquire("b", "/r1", now=0.0) == 0.0
+    assert limiter.acquire("a", "/r1", now=0.0) > 0
+
+def test_route_overrides():
+    """Test per-route limits override the defaults"""
+    limiter = RateLimiter(rate=10, burst=10, max_keys=10, routes={"/slow": {"rate": 1, "burst": 2}})
+    assert limiter.limits_for("/slow") == (1.0, 2.0)
+    assert limiter.limits_for("/other") == (10.0, 10.0)
+
+def test_key_state_is_bounded():
+    """Test that the least recently used buckets are evicted"""
+    limiter = RateLimiter(rate=1, burst=1, max_keys=2)
+    limiter.acquire("a", "/r", now=0.0)
+    limiter.acquire("b", "/r", now=0.0)
+    limiter.acquire("a", "/r", now=0.0)
+    limiter.acquire("c", "/r", now=0.0)
+    assert len(limiter) == 2
+    # "b" was evicted, so it starts again with a full bucket
+    assert limiter.acquire("b", "/r", now=0.0) == 0.0
+
+def test_invalid_limits():
+    """Test that non-positive rates are rejected"""
+    with pytest.raises(ValueError):
+        RateLimiter(rate=0, burst=1, max_keys=10)
+
+def test_token_is_hashed():
+    """Test that the raw token never appears in the limiter key"""
+    assert "secret" not in hash_token("secret")
+    assert hash_token("secret") == hash_token("secret")
+
+def test_middleware_returns_retry_after():
+    """Test that rejected requests get a 429 with Retry-After"""
+    client = make_client(RateLimiter(rate=0.5, burst=1, max_keys=10))
+    headers = {"X-Plex-Token": "test-token"}
+    assert client.get("/items/1", headers=headers).status_code == 200
+
+    response = client.get("/items/2", headers=headers)
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "2"
+    assert response.json()["detail"] == "Rate limit exceeded"
+
+    # A different token has its own bucket
+    assert client.get("/items/1", headers={"X-Plex-Token": "other"}).status_code == 200
+
+def test_middleware_exempt_paths():
+    """Test that exempt paths are never limited"""
+    client = make_client(RateLimiter(rate=1, burst=1, max_keys=10))
+    for _ in range(5):
+        assert client.get("/health").status_code == 200
+
+def test_unmatched_paths_share_a_bucket():
+    """Test that unknown paths can't each claim a fresh bucket"""
+    limiter = RateLimiter(rate=0.5, burst=1, max_keys=10)
+    client = make_client(limiter)
+    headers = {"X-Plex-Token": "test-token"}
+    assert client.get("/random-1", headers=headers).status_code == 404
+    assert client.get("/random-2", headers=headers).status_code == 429
+    assert client.get("/items/1", headers=headers).status_code == 200
+    assert len(limiter) == 2
+
+def test_address_bucket_covers_every_token():
+    """Test that sending a new token on every request does not escape the limits"""
+    limiter = RateLimiter(rate=10, burst=10, max_keys=10, address_rate=0.5, address_burst=2)
+    client = make_client(limiter)
+    statuses = [client.get("/items/1", headers={"X-Plex-Token": f"random-{i}"}).status_code for i in range(4)]
+    assert statuses == [200, 200, 429, 429]
+    # Rejected requests never reach the token buckets, so they can't churn them
+    assert len(limiter) == 2
+
+def test_address_bucket_disabled_by_default():
+    """Test that the address bucket admits everything unless configured"""
+    limiter = RateLimiter(rate=1, burst=1, max_keys=10)
+    assert all(limiter.acquire_address("10.0.0.1", now=0.0) == 0.0 for _ in range(100))
@@ -0,0 +1,117 @@
+import time
+import httpx
+import pytest
+from app.services.plex import PlexService
+from app.services.recording import (
+    RecordingTransport, ReplayTransport, TrafficRecorder, read_archive, transport_from_config
+)
+
+SECTIONS = (
+    b'{"MediaContainer": {"size": 1, "Directory": [{"key": "1", "title": "Movies", "type": "movie", '
+    b'"agent": "agent", "scanner": "scanner", "language": "en", "uuid": "uuid", '
+    b'"updatedAt": 1, "createdAt": 0, "scannedAt": 1}]}}'
+)
+
+def plex_handler(request):
+    """A stand-in Plex server"""
+    if request.url.path == "/library/sections":
+        return httpx.Response(200, headers={"content-type": "application/json", "x-plex-extra": "1"}, content=SECTIONS)
+    return httpx.Response(404, content=b"Not found")
+
+@pytest.fixture
+def archive(tmp_path):
+    return tmp_path / "recordings" / "plex.jsonl.gz"
+
+async def record(archive):
+    transport = RecordingTransport(TrafficRecorder(archive), httpx.MockTransport(plex_handler))
+    plex = PlexService("http://plex:32400", transport=transport)
+    libraries = await plex.get_libraries("secret-token")
+    response = await plex.get("/missing", "secret-token", params={"X-Plex-Token": "secret-token", "b": 2, "a": 1})
+    await transport.close()
+    return libraries, response
+
+@pytest.mark.asyncio
+async def test_recording_captures_exchanges(archive):
+    """Test that exchanges are recorded with timing and without credentials"""
+    libraries, response = await record(archive)
+    assert [library.key for library in libraries] == ["1"]
+    assert response.status_code == 404
+
+    entries = list(read_archive(archive))
+    assert [(entry["method"], entry["path"], entry["query"], entry["status"]) for entry in entries] == [
+        ("GET", "/library/sections", "", 200),
+        ("GET", "/missing", "a=1&b=2", 404),
+    ]
+    assert entries[0]["headers"] == {"content-type": "application/json"}
+    assert entries[0]["elapsed"] >= 0
+    assert b"secret-token" not in archive.read_bytes()
+    assert "secret-token" not in str(entries)
+
+@pytest.mark.asyncio
+async def test_replay_serves_recording(archive):
+    """Test that a replayed recording answers PlexService without a network"""
+    await record(archive)
+    transport = ReplayTransport.load(archive, speed=0)
+    plex = PlexService("http://plex:32400", transport=transport)
+    libraries = await plex.get_libraries("another-token")
+    assert [library.title for library in libraries] == ["Movies"]
+    response = await plex.get("/missing", "another-token", params={"a": 1, "b": 2})
+    assert response.status_code == 404
+    assert transport.served == 2
+
+    with pytest.raises(httpx.ConnectError):
+        await plex.get("/identity", "another-token")
+    # Requests to another server don't match this server's recording
+    with pytest.raises(httpx.ConnectError):
+        await PlexService("http://elsewhere:32400", transport=transport).get("/library/sections", "another-token")
+    assert transport.missed == 2
+
+@pytest.mark.asyncio
+async def test_replay_matches_host():
+    """Test that identical paths on different servers are replayed separately"""
+    entries = [
+        {"method": "GET", "host": host, "path": "/identity", "query": "", "status": status,
+         "headers": {}, "body": "", "offset": 0.0, "elapsed": 0.0}
+        for host, status in (("plex:32400", 200), ("basement:32400", 503))
+    ] + [{"method": "GET", "path": "/library/sections", "query": "", "status": 204,
+          "headers": {}, "body": "", "offset": 0.0, "elapsed": 0.0}]
+    async with httpx.AsyncClient(transport=ReplayTransport(entries, speed=0)) as client:
+        assert (await client.get("http://plex:32400/identity")).status_code == 200
+        assert (await client.get("http://basement:32400/identity")).status_code == 503
+        # Entries without a host match any server
+        assert (await client.get("http://anywhere/library/sections")).status_code == 204
+
+@pytest.mark.asyncio
+async def test_replay_speed():
+    """Test that recorded response times are scaled by the replay speed"""
+    entry = {
+        "method": "GET", "path": "/identity", "query": "", "status": 200,
+        "headers": {}, "body": "", "offset": 0.0, "elapsed": 0.2,
+    }
+    async with httpx.AsyncClient(transport=ReplayTransport([entry], speed=4)) as client:
+        started = time.monotonic()
+        await client.get("http://plex/identity")
+        assert 0.04 <= time.monotonic() - started < 0.15
+
+@pytest.mark.asyncio
+async def test_repeated_requests_cycle():
+    """Test that repeated requests get the recorded responses in order"""
+    entries = [
+        {"method": "GET", "path": "/identity", "query": "", "status": status,
+         "headers": {}, "body": "", "offset": 0.0, "elapsed": 0.0}
+        for status in (200, 503)
+    ]
+    async with httpx.AsyncClient(transport=ReplayTransport(entries, speed=0)) as client:
+        statuses = [(await client.get("http://plex/identity")).status_code for _ in range(3)]
+    assert statuses == [200, 503, 200]
+
+def test_transport_from_config(archive):
+    """Test building the upstream transport from config"""
+    assert transport_from_config({"mode": "off"}) is None
+    assert transport_from_config({"mode": False}) is None
+    recording = transport_from_config({"mode": "record", "path": str(archive), "speed": 1.0})
+    assert isinstance(recording, RecordingTransport)
+    recording.recorder.close()
+    assert isinstance(transport_from_config({"mode": "replay", "path": str(archive), "speed": 1.0}), ReplayTransport)
+    with pytest.raises(ValueError):
+        transport_from_config({"mode": "rewind"})
@@ -0,0 +1,216 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from unittest.mock import patch, AsyncMock, MagicMock
+from app.models import Library, MediaItem
+from app.routers.collections import router
+from app.services.change_feed import ChangeFeed
+from app.services.item_store import ItemStore
+from app.services.plex import plex_service
+from app.services.smart_collections import SmartCollectionService
+from app.services.smart_index import (
+    RuleError, SectionIndex, SortedColumn, bitmap_from_rows, compile_rule, rows_from_bitmap, select
+)
+
+app = FastAPI()
+app.include_router(router)
+client = TestClient(app)
+
+NOW = 1_700_000_000
+DAY = 86400
+
+def make_library(key="1"):
+    return Library(
+        key=key, title="Movies", type="movie", agent="agent", scanner="scanner",
+        language="en", uuid="uuid", updated_at="1", created_at="0", scanned_at="1"
+    )
+
+def make_items():
+    return [
+        MediaItem(rating_key="1", title="A", type="movie", video_resolution="4k", view_count=0,
+                  audience_rating=8.1, added_at=NOW - 2 * DAY, genres=["Drama"]),
+        MediaItem(rating_key="2", title="B", type="movie", video_resolution="4k", view_count=3,
+                  audience_rating=9.0, added_at=NOW - 5 * DAY, genres=["Action"]),
+        MediaItem(rating_key="3", title="C", type="movie", video_resolution="1080", view_count=0,
+                  audience_rating=7.5, added_at=NOW - 40 * DAY, genres=["Drama", "Action"]),
+        MediaItem(rating_key="4", title="D", type="movie", video_resolution="4k", view_count=0,
+                  added_at=NOW - 10 * DAY),
+    ]
+
+@pytest.fixture
+def index():
+    return SectionIndex(ItemStore.from_items(make_items()))
+
+def matching(index, rule):
+    return index.rating_keys(compile_rule(rule, now=NOW)(index))
+
+def test_bitmap_round_trip():
+    """Test converting between row lists and bitmaps"""
+    rows = [0, 3, 8, 9, 1000]
+    assert rows_from_bitmap(bitmap_from_rows(rows, 1001)) == rows
+    assert rows_from_bitmap(0) == []
+
+def test_categorical_and_genre_rules(index):
+    """Test equality, negation and membership on categorical fields"""
+    assert matching(index, {"field": "video_resolution", "op": "eq", "value": "4k"}) == ["1", "2", "4"]
+    assert matching(index, {"field": "video_resolution", "op": "ne", "value": "4k"}) == ["3"]
+    assert matching(index, {"field": "genres", "op": "eq", "value": "Drama"}) == ["1", "3"]
+    assert matching(index, {"field": "genres", "op": "in", "value": ["Action", "Comedy"]}) == ["2", "3"]
+
+def test_numeric_and_relative_time_rules(index):
+    """Test numeric comparisons, including relative timestamps"""
+    assert matching(index, {"field": "audience_rating", "op": "gt", "value": 8}) == ["1", "2"]
+    assert matching(index, {"field": "audience_rating", "op": "lte", "value": 8.1}) == ["1", "3"]
+    assert matching(index, {"field": "added_at", "op": "gte", "value": "-30d"}) == ["1", "2", "4"]
+    assert matching(index, {"field": "view_count", "op": "in", "value": [3, 7]}) == ["2"]
+
+def test_combined_rules(index):
+    """Test all/any/not combinations"""
+    rule = {"all": [
+        {"field": "video_resolution", "value": "4k"},
+        {"field": "added_at", "op": "gte", "value": "-30d"},
+        {"field": "view_count", "value": 0},
+        {"not": {"field": "genres", "value": "Action"}}
+    ]}
+    assert matching(index, rule) == ["1", "4"]
+    rule = {"any": [
+        {"field": "audience_rating", "op": "gte", "value": 9},
+        {"field": "video_resolution", "value": "1080"}
+    ]}
+    assert matching(index, rule) == ["2", "3"]
+
+@pytest.mark.parametrize("rule", [
+    {"field": "unknown", "value": 1},
+    {"field": "genres", "op": "gt", "value": "Drama"},
+    {"field": "rating", "op": "gt", "value": "high"},
+    {"field": "added_at", "op": "gte", "value": "last month"},
+    {"all": []},
+    ["not", "a", "dict"],
+    {"field": "type", "op": "eq", "value": ["movie"]},
+    {"field": "genres", "op": "in", "value": [["Drama"]]},
+])
+def test_invalid_rules(rule):
+    """Test that malformed rules are rejected"""
+    with pytest.raises(RuleError):
+        compile_rule(rule, now=NOW)
+
+def test_sorted_column_ranges():
+    """Test range bitmaps across blocks, with the number of prefixes bounded"""
+    values = [(row * 7919) % 1000 if row % 5 else None for row in range(5000)]
+    column = SortedColumn(values, len(values), max_prefixes=8, min_block=1)
+    assert len(column.prefixes) <= 9
+    for op, value, expected in [
+        ("gt", 500, lambda v: v > 500), ("gte", 500, lambda v: v >= 500),
+        ("lt", 123, lambda v: v < 123), ("lte", 123, lambda v: v <= 123), ("eq", 42, lambda v: v == 42),
+    ]:
+        rows = [row for row, v in enumerate(values) if v is not None and expected(v)]
+        assert rows_from_bitmap(column.compare(op, value)) == rows
+
+def test_select_sorts_missing_last(index):
+    """Test sorting matches, with items missing the sort value last"""
+    bitmap = index.universe
+    assert [key for _, key in select(index, bitmap, "audience_rating:desc")] == ["2", "1", "3", "4"]
+    assert [key for _, key in select(index, bitmap, "added_at")] == ["3", "4", "2", "1"]
+    with pytest.raises(RuleError):
+        select(index, bitmap, "title")
+
+def test_evaluate_across_libraries():
+    """Test merging, sorting and limiting matches from several sections"""
+    first = SectionIndex(ItemStore.from_items(make_items()[:2]))
+    second = SectionIndex(ItemStore.from_items(make_items()[2:]))
+    indexes = [(make_library("1"), first), (make_library("2"), second)]
+    matches = SmartCollectionService.evaluate(
+        indexes, {"field": "view_count", "value": 0}, sort="added_at:desc", limit=2
+    )
+    assert matches == [("1", "1", "movie"), ("2", "4", "movie")]
+
+def test_large_section_evaluation_is_fast():
+    """Test that a multi-condition rule over a large section evaluates quickly"""
+    items = [
+        MediaItem(rating_key=str(i), title=f"Item {i}", type="movie",
+                  video_resolution="4k" if i % 4 == 0 else "1080", view_count=i % 3,
+                  audience_rating=(i % 100) / 10, added_at=NOW - (i % 90) * DAY)
+        for i in range(20000)
+    ]
+    index = SectionIndex(ItemStore.from_items(items))
+    evaluate = compile_rule({"all": [
+        {"field": "video_resolution", "value": "4k"},
+        {"field": "added_at", "op": "gte", "value": "-30d"},
+        {"field": "view_count", "value": 0},
+        {"field": "audience_rating", "op": "gt", "value": 7}
+    ]}, now=NOW)
+
+    started = time.perf_counter()
+    rows = rows_from_bitmap(evaluate(index))
+    assert time.perf_counter() - started < 0.5
+    expected = [
+        i for i in range(20000)
+        if i % 4 == 0 and i % 90 <= 30 and i % 3 == 0 and (i % 100) / 10 > 7
+    ]
+    assert rows == expected
+
+def ok_response(rating_key):
+    response = MagicMock(status_code=200)
+    response.content = f'{{"MediaContainer": {{"Metadata": [{{"ratingKey": "{rating_key}"}}]}}}}'.encode()
+    return response
+
+@pytest.fixture
+def service():
+    feed = ChangeFeed(max_log_entries=100, max_age_seconds=300)
+    return SmartCollectionService(plex_service, feed, batch_size=2)
+
+@pytest.mark.asyncio
+async def test_push_collection_in_batches(service):
+    """Test that a collection is created with the first batch and extended with the rest"""
+    request = AsyncMock(return_value=ok_response("900"))
+    with patch.object(plex_service, "request", request), \
+         patch.object(plex_service, "get_server_identity", AsyncMock(return_value={"machineIdentifier": "abc"})):
+        matches = [("1", key, "movie") for key in ["1", "2", "3", "4", "5"]]
+        created = await service.push("test-token", "collection", "New 4K", matches)
+
+    assert created == [{"library_key": "1", "rating_key": "900", "item_count": 5}]
+    calls = request.await_args_list
+    assert [(call.args[0], call.args[1]) for call in calls] == [
+        ("POST", "/library/collections"),
+        ("PUT", "/library/collections/900/items"),
+        ("PUT", "/library/collections/900/items"),
+    ]
+    assert calls[0].kwargs["params"]["sectionId"] == "1"
+    assert calls[0].kwargs["params"]["uri"].endswith("/library/metadata/1,2")
+    assert calls[2].kwargs["params"]["uri"].endswith("/library/metadata/5")
+
+@pytest.mark.asyncio
+async def test_push_playlist(service):
+    """Test that a playlist spans libraries"""
+    request = AsyncMock(return_value=ok_response("77"))
+    with patch.object(plex_service, "request", request), \
+         patch.object(plex_service, "get_server_identity", AsyncMock(return_value={"machineIdentifier": "abc"})):
+        created = await service.push("test-token", "playlist", "Mix", [("1", "1", "movie"), ("2", "9", "episode")])
+
+    assert created == [{"library_key": None, "rating_key": "77", "item_count": 2}]
+    assert request.await_args.args[:2] == ("POST", "/playlists")
+    assert request.await_args.kwargs["params"]["type"] == "video"
+
+def test_evaluate_endpoint(monkeypatch):
+    """Test a dry-run evaluation through the API"""
+    service = SmartCollectionService(plex_service, ChangeFeed(max_log_entries=100, max_age_seconds=300), 500)
+    monkeypatch.setattr("app.routers.collections.smart_collection_service", service)
+    headers = {"X-Plex-Token": "test-token"}
+    with patch.object(plex_service, "get_libraries", AsyncMock(return_value=[make_library()])), \
+         patch.object(plex_service, "get_section_items", AsyncMock(return_value=make_items())) as get_items:
+        body = {"libraries": ["1"], "rule": {"field": "video_resolution", "value": "4k"}, "sort": "audience_rating:desc"}
+        response = client.post("/collections/evaluate", json=body, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["count"] == 3
+        assert response.json()["rating_keys"] == ["2", "1", "4"]
+
+        # The snapshot and index are reused by later evaluations
+        client.post("/collections/evaluate", json=body, headers=headers)
+        assert get_items.await_count == 1
+
+        response = client.post("/collections/evaluate", json={"libraries": ["1"], "rule": {"field": "nope"}}, headers=headers)
+        assert response.status_code == 400
+
+        response = client.post("/collections/evaluate", json={"libraries": ["9"], "rule": {}}, headers=headers)
+        assert response.status_code == 404